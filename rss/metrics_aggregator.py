@@ -0,0 +1,184 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import json
+import argparse
+import multiprocessing
+import numpy as np
+
+"""
+Aggregates the metrics files of any number of experiment directories. Files
+are found with a lazy directory walk, parsed in parallel and folded into
+per-model (adaptive, rational, irrational) statistics in a single streaming
+pass, so memory stays bounded no matter how many runs there are. Writes:
+	- summary.csv:  count, mean, std, min, quartiles and max per model/metric
+	- boxplot.json: box-plot statistics per metric and model, read by plotting.py
+
+	usage: metrics_aggregator.py DIR [DIR ...] --out results/
+"""
+
+# Every metrics file has one line "<name> <safety> <efficiency> ...".
+METRICS = ["safety", "efficiency"]
+MODELS = ["adaptive", "rational", "irrational"]
+
+def file_model(filename):
+	"""
+	Prediction model the run used, from its file name (None if unknown).
+	"""
+	if "irrational" in filename:
+		return "irrational"
+	if "rational" in filename:
+		return "rational"
+	if "adaptive" in filename:
+		return "adaptive"
+	return None
+
+def find_metrics_files(dirs, pattern="metrics", exclude="p0"):
+	"""
+	Lazily yields every metrics file under the directories.
+	"""
+	for top in dirs:
+		for root, _, files in os.walk(top):
+			for filename in files:
+				if pattern in filename and not (exclude and exclude in filename):
+					yield os.path.join(root, filename)
+
+def parse_metrics_file(path):
+	"""
+	Returns (model, [metric values]) of one run, None if it can't be used.
+	"""
+	model = file_model(os.path.basename(path))
+	if model is None:
+		return None
+	try:
+		with open(path) as f:
+			data = f.readline().split()
+		return model, [float(v) for v in data[1:1+len(METRICS)]]
+	except (IOError, ValueError):
+		return None
+
+class StreamingStats(object):
+	"""
+	Count, mean, std (Welford), min and max of a stream of values, plus a
+	fixed-size uniform reservoir sample for quartiles and box plots. The
+	quartiles are exact while fewer than reservoir_size values were seen.
+	"""
+
+	def __init__(self, reservoir_size=10000, seed=0):
+		self.count = 0
+		self.mean = 0.0
+		self.m2 = 0.0
+		self.min = np.inf
+		self.max = -np.inf
+		self.reservoir = np.zeros(reservoir_size)
+		self.rng = np.random.RandomState(seed)
+
+	def add(self, value):
+		self.count += 1
+		delta = value - self.mean
+		self.mean += delta/self.count
+		self.m2 += delta*(value - self.mean)
+		self.min = min(self.min, value)
+		self.max = max(self.max, value)
+
+		if self.count <= len(self.reservoir):
+			self.reservoir[self.count-1] = value
+		else:
+			slot = self.rng.randint(self.count)
+			if slot < len(self.reservoir):
+				self.reservoir[slot] = value
+
+	def sample(self):
+		return self.reservoir[:min(self.count, len(self.reservoir))]
+
+	def std(self):
+		return np.sqrt(self.m2/(self.count - 1)) if self.count > 1 else 0.0
+
+	def summary(self):
+		q1, median, q3 = np.percentile(self.sample(), [25, 50, 75])
+		return {"count": self.count, "mean": self.mean, "std": self.std(),
+			"min": self.min, "q1": q1, "median": median, "q3": q3, "max": self.max}
+
+	def boxplot(self, max_fliers=200):
+		"""
+		Statistics in the format of matplotlib's Axes.bxp (whiskers at 1.5 IQR).
+		"""
+		sample = self.sample()
+		q1, median, q3 = np.percentile(sample, [25, 50, 75])
+		iqr = q3 - q1
+		inside = sample[(sample >= q1 - 1.5*iqr) & (sample <= q3 + 1.5*iqr)]
+		fliers = sample[(sample < q1 - 1.5*iqr) | (sample > q3 + 1.5*iqr)]
+		return {"mean": self.mean, "med": median, "q1": q1, "q3": q3,
+			"whislo": inside.min(), "whishi": inside.max(),
+			"fliers": sorted(fliers.tolist())[:max_fliers]}
+
+def aggregate(dirs, jobs=None, reservoir_size=10000, pattern="metrics", exclude="p0"):
+	"""
+	Parses every metrics file under dirs (file names containing pattern but
+	not exclude) with a pool of workers and returns
+	{model: {metric: StreamingStats}} and the number of skipped files.
+	"""
+	stats = dict((model, dict((metric, StreamingStats(reservoir_size)) for metric in METRICS))
+		for model in MODELS)
+	skipped = 0
+
+	pool = multiprocessing.Pool(jobs)
+	try:
+		for result in pool.imap_unordered(parse_metrics_file, find_metrics_files(dirs, pattern, exclude),
+				chunksize=64):
+			if result is None or len(result[1]) < len(METRICS):
+				skipped += 1
+				continue
+			model, values = result
+			for metric, value in zip(METRICS, values):
+				stats[model][metric].add(value)
+	finally:
+		pool.close()
+		pool.join()
+
+	return stats, skipped
+
+def write_results(stats, out_dir):
+	if not os.path.isdir(out_dir):
+		os.makedirs(out_dir)
+
+	columns = ["count", "mean", "std", "min", "q1", "median", "q3", "max"]
+	with open(os.path.join(out_dir, "summary.csv"), "w") as f:
+		f.write(",".join(["model", "metric"] + columns) + "\n")
+		for model in MODELS:
+			for metric in METRICS:
+				if stats[model][metric].count == 0:
+					continue
+				summary = stats[model][metric].summary()
+				f.write(",".join([model, metric] + ["%g" % summary[c] for c in columns]) + "\n")
+
+	boxplots = dict((metric, dict((model, stats[model][metric].boxplot())
+		for model in MODELS if stats[model][metric].count > 0)) for metric in METRICS)
+	with open(os.path.join(out_dir, "boxplot.json"), "w") as f:
+		json.dump(boxplots, f, indent=1)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Aggregate experiment metrics per prediction model.")
+	parser.add_argument("dirs", nargs="+", help="experiment directories (searched recursively)")
+	parser.add_argument("--out", default="results", help="directory for summary.csv and boxplot.json")
+	parser.add_argument("--jobs", type=int, default=None, help="parser processes (default: all cores)")
+	parser.add_argument("--reservoir", type=int, default=10000,
+		help="values kept per model and metric for quartiles")
+	parser.add_argument("--pattern", default="metrics", help="metrics file names contain this")
+	parser.add_argument("--exclude", default="p0", help="skip file names containing this")
+	args = parser.parse_args()
+
+	stats, skipped = aggregate(args.dirs, args.jobs, args.reservoir, args.pattern, args.exclude)
+	write_results(stats, args.out)
+
+	print "----------------------------------------------"
+	print "%-11s %-11s %7s %9s %9s %9s" % ("model", "metric", "runs", "mean", "std", "median")
+	for model in MODELS:
+		for metric in METRICS:
+			s = stats[model][metric]
+			if s.count > 0:
+				print "%-11s %-11s %7d %9.3f %9.3f %9.3f" % (model, metric, s.count,
+					s.mean, s.std(), s.summary()["median"])
+	if skipped:
+		print "Skipped", skipped, "unreadable metrics files."
+	print "Results written to", args.out
@@ -3,13 +3,17 @@ from __future__ import division
 import rospy
 import sys, select, os
 import numpy as np
-import time
-import copy
 import math
 
-from geometry_msgs.msg import PoseStamped, Pose, Point, Quaternion, Pose2D, Vector3
-from nav_msgs.msg import OccupancyGrid
-from crazyflie_human.msg import OccupancyGridTime, ProbabilityGrid
+from crazyflie_human.srv import QueryOccupancy, EvaluateTrajectories
+
+# Shared helpers live next to the main nodes in src/.
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src/")
+
+import grid_msg_utils
+import region_query
+import collision_risk
+import grid_pyramid
 
 class MultiHumanPrediction(object):
 	"""
@@ -60,20 +64,38 @@ class MultiHumanPrediction(object):
 		# resolution (m/cell)
 		self.res = rospy.get_param("pred/resolution")
 
+		# threshold of the summary's union mask and first-time layers
+		self.prob_thresh = rospy.get_param("pred/prob_thresh")
+
 		# compute the timestep (seconds/cell)
 		self.deltat = self.res/self.human_vel
 
 		# number of humans in your space
 		self.num_humans = rospy.get_param("pred/num_humans")
 
-		# stores the occu_grid_time for each human
+		# stores the (fwd_tsteps) x (height x width) grids of each human and
+		# the stamp of their first grid
 		self.all_occu_grids = [None]*self.num_humans
+		self.all_grid_times = [None]*self.num_humans
 		self.noisyOR_occu_grid = None
 
 		# measurements of gridworld
 		self.sim_height = int(rospy.get_param("pred/sim_height"))
 		self.sim_width = int(rospy.get_param("pred/sim_width"))
 
+		# sequence number of the published grids, and summed-area tables of
+		# the latest ones for region queries
+		self.merge_seq = 0
+		self.region_index = region_query.RegionIndex(rospy.get_param("state/lower"), 
+			rospy.get_param("state/upper"), self.res, self.sim_height, self.sim_width)
+
+		# max-pooled versions of the merged grids at coarser resolutions
+		self.pyramid = grid_pyramid.GridPyramid(self.res, self.sim_height, self.sim_width, 
+			rospy.get_param("pred/pyramid_resolutions", []))
+
+		# collision risk of robot paths under the latest merged grids
+		self.collision_risk = collision_risk.CollisionRisk(rospy.get_param("state/lower"), 
+			rospy.get_param("state/upper"), self.res, self.sim_height, self.sim_width)
 
 		# TODO This is for debugging.
 		print "----- Running multi-prediction for: ----------"
@@ -88,10 +110,25 @@ class MultiHumanPrediction(object):
 		for human_num in range(self.num_humans):
 			# subscribe to the info of the human walking around the space
 			self.human_subs[human_num] = rospy.Subscriber('/occupancy_grid_time'+str(human_num+1), 
-				OccupancyGridTime, self.human_grid_callback, queue_size=1)
+				grid_msg_utils.NumpyOccupancyGridTime, self.human_grid_callback, queue_size=1)
 
 		# occupancy grid publisher & small publishers for visualizing the start/goal
-		self.occu_pub = rospy.Publisher('/occupancy_grid_time', OccupancyGridTime, queue_size=1)
+		self.occu_pub = rospy.Publisher('/occupancy_grid_time', grid_msg_utils.NumpyOccupancyGridTime, queue_size=1)
+
+		# max over the horizon, union mask and first time above prob_thresh
+		self.summary_pub = rospy.Publisher('/occupancy_summary', grid_msg_utils.NumpyOccupancySummary, queue_size=1)
+
+		# total predicted occupancy in boxes over time intervals
+		self.query_srv = rospy.Service('/query_occupancy', QueryOccupancy, 
+			lambda request: region_query.handle_query(self.region_index, request))
+
+		# one topic per pyramid level, coarsest last
+		self.pyramid_pubs = [rospy.Publisher('/occupancy_grid_time_level'+str(i+1), 
+			grid_msg_utils.NumpyOccupancyGridTime, queue_size=1) for i in range(len(self.pyramid.levels))]
+
+		# collision probability of batches of robot paths
+		self.risk_srv = rospy.Service('/evaluate_trajectories', EvaluateTrajectories, 
+			lambda request: collision_risk.handle_evaluate(self.collision_risk, request))
 
 	def human_grid_callback(self, msg):
 		"""
@@ -102,13 +139,20 @@ class MultiHumanPrediction(object):
 		# the /occupancy_grid_time topic
 		if self.num_humans == 1:
 			self.occu_pub.publish(msg)
+			if len(msg.gridarray) > 0:
+				grids = grid_msg_utils.message_to_grids(msg)
+				deltat = (msg.gridarray[1].header.stamp - msg.gridarray[0].header.stamp).to_sec() \
+					if len(msg.gridarray) > 1 else self.deltat
+				self.publish_summary(grids, msg.object_num, msg.gridarray[0].header.stamp, deltat)
+				self.update_queries(grids, msg.gridarray[0].header.stamp, deltat)
+				self.publish_pyramid(grids, msg.object_num, msg.gridarray[0].header.stamp, deltat)
 		else:
 			# human num takes values 1 --> NUM_HUMAN
 			# but if no human_num is provided, make sure to index right
-			if msg.object_num == 0:
-				self.all_occu_grids[0] = msg.gridarray
-			else: 
-				self.all_occu_grids[msg.object_num-1] = msg.gridarray
+			idx = 0 if msg.object_num == 0 else msg.object_num-1
+			if len(msg.gridarray) > 0:
+				self.all_grid_times[idx] = msg.gridarray[0].header.stamp
+			self.all_occu_grids[idx] = grid_msg_utils.message_to_grids(msg)
 
 	def update_noisyOR_grid(self):
 		"""
@@ -121,33 +165,27 @@ class MultiHumanPrediction(object):
 			return
 
 		curr_time = rospy.Time.now()
-		all_grids_copy = copy.deepcopy(self.all_occu_grids)
 		grid_len = self.sim_height*self.sim_width
 
-		noisyNOR_grid = np.array([[1.0]*grid_len]*self.fwd_tsteps)
-		noisyOR_grid = np.array([[0.0]*grid_len]*self.fwd_tsteps)
+		noisyNOR_grid = np.ones((self.fwd_tsteps, grid_len))
 
 		s = rospy.Time().now()
 
-		for occu_grid in all_grids_copy:
+		for occu_grid, grid_time in zip(list(self.all_occu_grids), list(self.all_grid_times)):
 			if occu_grid is not None:
-				grid_time = occu_grid[0].header.stamp
+				occu_grid_data = np.zeros((self.fwd_tsteps, grid_len))
+				num_grids = min(self.fwd_tsteps, occu_grid.shape[0])
+				occu_grid_data[:num_grids] = occu_grid[:num_grids]
 
 				# shift old data to align
 				if grid_time.to_sec() < (curr_time.to_sec() - self.deltat):
 					d = int(math.floor((curr_time.to_sec() - grid_time.to_sec())/self.deltat))
-					future_times = int(self.fwd_tsteps)
-					for k in range(future_times-d-1):
-						occu_grid[k].data = occu_grid[k+d].data
-					for k in range(future_times-d, future_times-1):
-						occu_grid[k].data = [0.0]*grid_len
-
-				occu_grid_data = np.array([[0.0]*grid_len]*self.fwd_tsteps)
-				for k in range(self.fwd_tsteps):
-					occu_grid_data[k] = occu_grid[k].data
+					d = min(d, self.fwd_tsteps)
+					occu_grid_data[:self.fwd_tsteps-d] = occu_grid_data[d:]
+					occu_grid_data[self.fwd_tsteps-d:] = 0.0
 
 				# accumulate the noisy-NOR
-				noisyNOR_grid = noisyNOR_grid*(1 - np.array(occu_grid_data))
+				noisyNOR_grid *= 1 - occu_grid_data
 			else:
 				print "[multi_human_prediction]: occu_grid is None"
 
@@ -160,37 +198,45 @@ class MultiHumanPrediction(object):
 		# convert to ROS message and publish over topic
 		self.noisyOR_occu_grid = self.noisyOR_to_message(noisyOR_grid, curr_time)
 		self.occu_pub.publish(self.noisyOR_occu_grid)
+		self.publish_summary(noisyOR_grid, 0, curr_time, self.deltat)
+		self.update_queries(noisyOR_grid, curr_time, self.deltat)
+		self.publish_pyramid(noisyOR_grid, 0, curr_time, self.deltat)
 
-	def noisyOR_to_message(self, noisyOR_grid, curr_time):
+	def update_queries(self, grids, stamp, deltat):
 		"""
-		Converts noisyOR grid into OccupancyGridTime structure to ROS msg
+		Makes the just published grids the latest ones region queries and
+		collision risk evaluations answer.
 		"""
-		timed_grid = OccupancyGridTime()
-		timed_grid.gridarray = [None]*self.fwd_tsteps
-		timed_grid.object_num = 0
+		self.merge_seq += 1
+		self.region_index.update(self.merge_seq, grids, stamp.to_sec(), deltat)
+		self.collision_risk.update(grids, stamp.to_sec(), deltat)
 
-		for t in range(self.fwd_tsteps):
-			grid_msg = ProbabilityGrid()
-
-			# Set up the header.
-			grid_msg.header.stamp = curr_time + rospy.Duration(t*self.deltat)
-			grid_msg.header.frame_id = "/world"
+	def publish_pyramid(self, grids, object_num, stamp, deltat):
+		"""
+		Publishes the max-pooled grids of every pyramid level someone listens to.
+		"""
+		for level, pub in zip(self.pyramid.levels, self.pyramid_pubs):
+			if pub.get_num_connections() > 0:
+				pub.publish(grid_msg_utils.grids_to_message(level.pool(grids), object_num, 
+					stamp, deltat, level.res, level.width, level.height))
 
-			# .info is a nav_msgs/MapMetaData message. 
-			grid_msg.resolution = self.res
-			grid_msg.width = self.sim_width
-			grid_msg.height = self.sim_height
+	def publish_summary(self, grids, object_num, stamp, deltat):
+		"""
+		Publishes the per-cell summary of the merged grids (the first at stamp,
+		deltat apart), if anyone listens.
+		"""
+		if self.summary_pub.get_num_connections() == 0:
+			return
 
-			# Rotated maps are not supported... 
-			origin_x=0.0 
-			origin_y=0.0 
-			grid_msg.origin = Pose(Point(origin_x, origin_y, 0), Quaternion(0, 0, 0, 1))
+		self.summary_pub.publish(grid_msg_utils.summary_to_message(grids, self.prob_thresh, object_num, 
+			stamp, deltat, self.res, self.sim_width, self.sim_height))
 
-			# convert to list of doubles from 0-1
-			grid_msg.data = list(noisyOR_grid[t])
-			timed_grid.gridarray[t] = grid_msg
- 
-		return timed_grid
+	def noisyOR_to_message(self, noisyOR_grid, curr_time):
+		"""
+		Converts noisyOR grid into OccupancyGridTime structure to ROS msg
+		"""
+		return grid_msg_utils.grids_to_message(noisyOR_grid, 0, curr_time, 
+			self.deltat, self.res, self.sim_width, self.sim_height)
 
  
 if __name__ == '__main__':
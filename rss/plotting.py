@@ -1,47 +1,18 @@
 #!/usr/bin/env python2.7
 import os
-import numpy as np
+import sys
+import json
 import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.cbook as cbook
 
 if __name__ == '__main__':
 
-	path = '/home/abajcsy/GitHub/meta_fastrack/ros/src/data_logger/data/coffee'
-
-	adapt_safe = np.array([None]*16)
-	adapt_eff = np.array([None]*16)
-	irr_safe = np.array([None]*16)
-	irr_eff = np.array([None]*16)
-	rat_safe = np.array([None]*16)
-	rat_eff = np.array([None]*16)
-	ai = 0; ri = 0; ii = 0
-
-	for filename in os.listdir(path):
-		if "metrics" in filename and "p0" not in filename:
-			with open(path+"/"+filename) as f:
-				line = f.readlines()[0]
-	        	data = line.split(" ")
-	        	if "adaptive" in filename:
-	        		adapt_safe[ai] = float(data[1])
-	        		adapt_eff[ai] = float(data[2])
-	        		ai += 1
-	        	elif "rational" in filename and "irrational" not in filename:
-	        		rat_safe[ri] = float(data[1])
-	        		rat_eff[ri] = float(data[2])
-	        		ri += 1
-	        	elif "irrational" in filename:
-	        		irr_safe[ii] = float(data[1])
-	        		irr_eff[ii] = float(data[2])
-	        		ii += 1
-
-	# fake up some data
-
-	diff_irr_eff = adapt_eff - irr_eff
-	diff_rat_eff = adapt_eff - rat_eff
-
-	diff_irr_safe = adapt_safe - irr_safe
-	diff_rat_safe = adapt_safe - rat_safe
+	# box-plot statistics written by metrics_aggregator.py
+	results = sys.argv[1] if len(sys.argv) > 1 else "results"
+	with open(os.path.join(results, "boxplot.json")) as f:
+		boxplots = json.load(f)
+	models = ["adaptive", "rational", "irrational"]
 
 	# basic plot
 	"""
@@ -89,26 +60,34 @@ if __name__ == '__main__':
 	text = {'usetex' : 'true'}
 	matplotlib.rc('text', usetex=True)
 	matplotlib.rc('font', **font)
-	data = [adapt_safe, rat_safe, irr_safe]
-
 	labels = [r'$\beta$ inference', r'$\beta$ high confidence', r'$\beta$ low confidence']
 
+	# models without any runs have no statistics, leave them out
+	shown = [i for i, m in enumerate(models) if m in boxplots.get("safety", {})]
+	for i, m in enumerate(models):
+		if i not in shown:
+			print "No runs for the", m, "model, not plotting it"
+	if not shown:
+		sys.exit(1)
+	data = [boxplots["safety"][models[i]] for i in shown]
+	labels = [labels[i] for i in shown]
+
 	fig, axes = plt.subplots(nrows=1, ncols=1) #figsize=(9, 4))
 	# adding horizontal grid lines
 	axes.yaxis.grid(True,  color="grey", alpha=0.5, linewidth=1, linestyle="-")
 
 	boxprops = dict(linestyle='--', linewidth=3, color='red')
 	# rectangular box plot
-	bplot1 = axes.boxplot(data,
+	bplot1 = axes.bxp(data,
 			vert=True,  # vertical box alignment
 			patch_artist=True  # fill with color
 			)  # will be used to label x-ticks
 	axes.set_title('Minimum Distance from Robot to Human')
-	plt.xticks([1, 2, 3], labels)
+	plt.xticks(range(1, len(data) + 1), labels)
 
 	# fill with colors
-	colors = [orangeC, darkGrey, greyC]
-	colors2 = [darkOrange, "black", darkGrey]
+	colors = [[orangeC, darkGrey, greyC][i] for i in shown]
+	colors2 = [[darkOrange, "black", darkGrey][i] for i in shown]
 	for patch, color, outline in zip(bplot1['boxes'], colors, colors2):
 		patch.set_facecolor(color)
 		patch.set_linewidth(2)
@@ -1,14 +1,21 @@
 #!/usr/bin/env python2.7
 import rospy
+import sys, os
 import numpy as np
 import time
 
 from std_msgs.msg import ColorRGBA
 from nav_msgs.msg import OccupancyGrid
 from geometry_msgs.msg import  Vector3
-from crazyflie_human.msg import OccupancyGridTime, ProbabilityGrid
+from crazyflie_human.msg import ProbabilityGrid
 from visualization_msgs.msg import Marker, MarkerArray
 
+# Shared helpers live next to the main nodes in src/.
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src/")
+
+import grid_msg_utils
+import static_markers
+
 class PredictionVisualizer(object):
 	"""
 	This class visualizies predictions of a human's motion in 
@@ -23,10 +30,7 @@ class PredictionVisualizer(object):
 		self.load_parameters()
 		self.register_callbacks()
 
-		rate = rospy.Rate(100) 
-		while not rospy.is_shutdown():
-			self.world_pub.publish(self.world_marker)
-			rate.sleep()
+		rospy.spin()
 
 	def load_parameters(self):
 		"""
@@ -69,19 +73,17 @@ class PredictionVisualizer(object):
 		self.visualization_delta = 0.05
 		self.prev_t = rospy.Time().now()
 
-		# visualize 
-		world_xy = [low[0] + self.real_width/2.0, low[1] + self.real_height/2.0]
-		world_color = [0.1, 0, 0.9]
-		world_scale = [self.real_width, self.real_height, self.real_z]
-		self.world_marker = self.state_to_marker(xy=world_xy, color=world_color, alpha=0.5, scale=world_scale)
-
 	def register_callbacks(self):
 		"""
 		Sets up publishers and subscribers
 		"""
-		self.occu_sub = rospy.Subscriber('/occupancy_grid_time', OccupancyGridTime, self.occu_grid_callback, queue_size=1)	
+		self.occu_sub = rospy.Subscriber('/occupancy_grid_time', grid_msg_utils.NumpyOccupancyGridTime, self.occu_grid_callback, queue_size=1)	
 		self.grid_vis_pub = rospy.Publisher('/occu_grid_marker', Marker, queue_size=0)
-		self.world_pub = rospy.Publisher('/world_marker', Marker, queue_size=10)
+
+		# the world never moves, so it is latched and only republished 
+		# when the bounds of the space change
+		self.world_pub = static_markers.LatchedMarkerPublisher('/world_marker', Marker, 
+			self.make_world_marker, ["state/lower", "state/upper"])
 		
 	def occu_grid_callback(self, msg):
 		# convert the message into the data structure
@@ -111,10 +113,7 @@ class PredictionVisualizer(object):
 		Converts occugrid message into structure
 		"""
 
-		self.occupancy_grids = [None]*self.fwd_tsteps
-
-		for i, grid in enumerate(msg.gridarray):
-			self.occupancy_grids[i] = grid.data
+		self.occupancy_grids = grid_msg_utils.message_to_grids(msg)
 
 	def visualize_occugrid(self, time):
 		"""
@@ -273,6 +272,20 @@ class PredictionVisualizer(object):
 			return interpolated_grid
 
 
+	def make_world_marker(self, low, up):
+		"""
+		Makes a translucent cube spanning the experimental space
+		"""
+		low = low or self.real_lower
+		up = up or self.real_upper
+		real_width = up[0] - low[0]
+		real_height = up[1] - low[1]
+
+		world_xy = [low[0] + real_width/2.0, low[1] + real_height/2.0]
+		world_color = [0.1, 0, 0.9]
+		world_scale = [real_width, real_height, up[2] - low[2]]
+		return self.state_to_marker(xy=world_xy, color=world_color, alpha=0.5, scale=world_scale)
+
 	def state_to_marker(self, xy=[0,0], color=[1.0,0.0,0.0], alpha=1.0, scale=[0.1464 , 0.1464, 0.1464]):
 		"""
 		Converts xy position to marker type to vizualize human
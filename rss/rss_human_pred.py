@@ -8,18 +8,24 @@ import pickle
 
 from std_msgs.msg import String, Float32, ColorRGBA
 from nav_msgs.msg import OccupancyGrid
-from geometry_msgs.msg import PoseStamped, Pose, Point, Quaternion, Pose2D, Vector3
+from geometry_msgs.msg import PoseStamped, Pose2D, Vector3
 from visualization_msgs.msg import Marker, MarkerArray
-from crazyflie_human.msg import OccupancyGridTime, ProbabilityGrid
 
 # Get the path of this file, go up two directories, and add that to our 
 # Python path so that we can import the pedestrian_prediction module.
 sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../../")
+# Shared helpers live next to the main nodes in src/.
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../src/")
 
 from pedestrian_prediction.pp.mdp import GridWorldMDP
 from pedestrian_prediction.pp.mdp.expanded import GridWorldExpanded
 from pedestrian_prediction.pp.inference import hardmax as inf
 
+import grid_msg_utils
+import static_markers
+import flight_recorder
+import velocity_filter
+
 Actions = GridWorldMDP.Actions
 
 class HumanPrediction(object):
@@ -40,36 +46,18 @@ class HumanPrediction(object):
 		self.load_parameters()
 		self.register_callbacks()
 
-		# make a marker array for all the goals
-		marker_array = MarkerArray()
-		for g in self.real_goals:
-			marker = self.state_to_marker(xy=g, color=self.color)
-			marker_array.markers.append(marker)
-
-		# Re-number the marker IDs
-		id = 0
-		for m in marker_array.markers:
-			m.id = id
-			id += 1
-
-		rate = rospy.Rate(100) 
+		rate = rospy.Rate(10) 
 
 		while not rospy.is_shutdown():
 			if sys.stdin in select.select([sys.stdin], [], [], 0)[0]:
 				line = raw_input()
 				break
 
-			# plot start/goal markers for visualization
-			# self.start_pub.publish(self.state_to_marker(xy=self.real_start, color=[0.0, 1.0, 0.0]))
-			self.goal_pub.publish(marker_array)
-
 			rate.sleep()
 
-		#time_file = "/home/hysys9/crazyflie_human_ws/src/crazyflie_human/src/human"+self.human_number+"times.p"
-		#pred_file = "/home/hysys9/crazyflie_human_ws/src/crazyflie_human/src/human"+self.human_number+"pred_times.p"
-		#pickle.dump(self.times, open(time_file, 'wb'))
-		#pickle.dump(self.pred_times, open(pred_file, 'wb'))
-		#print "Write human_pred debugging info to files."
+		# write out whatever the flight recorder still has queued
+		if self.recorder is not None:
+			self.recorder.close()
 
 	def load_parameters(self):
 		"""
@@ -156,11 +144,25 @@ class HumanPrediction(object):
 		# compute the timestep (seconds/cell)
 		self.deltat = self.res/self.human_vel
 
+		# constant-velocity Kalman filter of the human, its speed (not the
+		# raw jittery poses) drives the adaptive deltat
+		self.vel_filter = velocity_filter.ConstantVelocityFilter(
+			accel_std=rospy.get_param("pred/filter_accel_std", 2.0),
+			meas_std=rospy.get_param("pred/filter_meas_std", 0.02))
+
 		# debugging variables
 		self.start_t = None
 		self.times = None
 		self.pred_times = None 
 
+		# optionally record poses, posteriors and predictions (pred/record_dir)
+		self.recorder = None
+		record_dir = rospy.get_param("pred/record_dir", "")
+		if record_dir:
+			self.recorder = flight_recorder.FlightRecorder(
+				flight_recorder.run_directory(record_dir, "human"+self.human_number))
+			rospy.on_shutdown(self.recorder.close)
+
 		# TODO This is for debugging.
 		print "----- Running prediction for one human : -----"
 		print "	- human: ", self.human_number
@@ -180,11 +182,19 @@ class HumanPrediction(object):
 
 		# occupancy grid publisher & small publishers for visualizing the start/goal
 		self.occu_pub = rospy.Publisher('/occupancy_grid_time'+self.human_number, 
-			OccupancyGridTime, queue_size=1)
+			grid_msg_utils.NumpyOccupancyGridTime, queue_size=1)
 		self.beta_pub = rospy.Publisher('/beta_topic'+self.human_number, 
 			Float32, queue_size=1)
-		self.goal_pub = rospy.Publisher('/goal_markers'+self.human_number, MarkerArray, queue_size=10)
-		self.start_pub = rospy.Publisher('/start_marker', Marker, queue_size=10)
+
+		# start/goal markers never move, so they are latched and only
+		# republished when their params change
+		human_prefix = "pred/human"+self.human_number
+		self.goal_pub = static_markers.LatchedMarkerPublisher('/goal_markers'+self.human_number, 
+			MarkerArray, self.goals_to_marker_array, 
+			[human_prefix+"_real_goals", human_prefix+"_color"])
+		self.start_pub = static_markers.LatchedMarkerPublisher('/start_marker'+self.human_number, 
+			Marker, lambda start: self.state_to_marker(xy=start or self.real_start, color=[0.0, 1.0, 0.0]), 
+			[human_prefix+"_real_start"])
 		self.grid_vis_pub = rospy.Publisher('/occu_grid_marker'+self.human_number, 
 			Marker, queue_size=10)
 		self.marker_pub = rospy.Publisher('/human_marker'+self.human_number, 
@@ -198,6 +208,9 @@ class HumanPrediction(object):
 		"""
 		curr_time = rospy.Time.now()
 		xypose = self.make_valid_state([msg.pose.position.x, msg.pose.position.y])
+		if self.recorder is not None:
+			self.recorder.record("pose", curr_time.to_sec(), [msg.pose.position.x, msg.pose.position.y])
+		self.vel_filter.update(xypose, curr_time.to_sec())
 
 		# if this is the first human state message, just record the time and pose
 		if self.prev_t is None:
@@ -253,15 +266,30 @@ class HumanPrediction(object):
 			if self.occupancy_grids is not None:
 				self.occu_pub.publish(self.grid_to_message())
 				self.visualize_occugrid(3)
+				self.record_prediction(curr_time)
 
-			# adjust the deltat based on the observed measurements
-			if self.prev_pos is not None:
-				self.human_vel = np.linalg.norm((np.array(xypose) - np.array(self.prev_pos)))/time_diff
+			# adjust the deltat based on the filtered speed of the human
+			self.human_vel = self.vel_filter.speed()
+			if self.human_vel > 0:
 				self.deltat = np.minimum(np.maximum(self.res/self.human_vel,0.05),0.2)
+			else:
+				self.deltat = 0.2
 
 			self.prev_pos = xypose	
 			
 
+	def record_prediction(self, stamp):
+		"""
+		Hands the posterior and the published occupancy stack to the flight
+		recorder (which writes them on its own thread).
+		"""
+		if self.recorder is None:
+			return
+		t = stamp.to_sec()
+		self.recorder.record("posterior", t, self.dest_beta_prob)
+		self.recorder.record("occupancy", t, self.occupancy_grids[:self.fwd_tsteps])
+		self.recorder.record("deltat", t, self.deltat)
+
 	def make_valid_state(self, xypose):
 		"""
 		Takes human state measurement, checks if its inside of the world grid, and 
@@ -537,39 +565,25 @@ class HumanPrediction(object):
 		"""
 		Converts OccupancyGridTime structure to ROS msg
 		"""
-		timed_grid = OccupancyGridTime()
-		timed_grid.gridarray = [None]*self.fwd_tsteps
-		timed_grid.object_num = int(self.human_number) 
-
-		curr_time = rospy.Time.now()
-
-		for t in range(self.fwd_tsteps):
-			grid_msg = ProbabilityGrid()
-
-			# Set up the header.
-			grid_msg.header.stamp = curr_time + rospy.Duration(t*self.deltat)
-			grid_msg.header.frame_id = "/world"
+		grids = self.occupancy_grids[:self.fwd_tsteps]
 
-			# .info is a nav_msgs/MapMetaData message. 
-			grid_msg.resolution = self.res
-			grid_msg.width = self.sim_width
-			grid_msg.height = self.sim_height
+		# Assert that all occupancies are in [0, 1] and each grid sums to 1.
+		assert grids.max() <= 1.0 +1e-8 and grids.min() >= 0.0 - 1e-8
+		assert (np.abs(grids.sum(axis=1) - 1.0) < 1e-8).all()
 
-			# Rotated maps are not supported... 
-			origin_x=0.0 
-			origin_y=0.0 
-			grid_msg.origin = Pose(Point(origin_x, origin_y, 0), Quaternion(0, 0, 0, 1))
+		return grid_msg_utils.grids_to_message(grids, self.human_number, 
+			rospy.Time.now(), self.deltat, self.res, self.sim_width, self.sim_height)
 
-			# Assert that all occupancies are in [0, 1].
-			assert self.occupancy_grids[t].max() <= 1.0 +1e-8 and self.occupancy_grids[t].min() >= 0.0 - 1e-8
-			assert abs(self.occupancy_grids[t].sum() - 1.0) < 1e-8
-
-			# convert to list of doubles from 0-1
-			grid_msg.data = list(self.occupancy_grids[t])
-
-			timed_grid.gridarray[t] = grid_msg
- 
-		return timed_grid
+	def goals_to_marker_array(self, goals, color):
+		"""
+		Makes a marker array with one (uniquely numbered) marker per goal
+		"""
+		marker_array = MarkerArray()
+		for i, g in enumerate(goals or []):
+			marker = self.state_to_marker(xy=g, color=color or self.color)
+			marker.id = i
+			marker_array.markers.append(marker)
+		return marker_array
 
 	def state_to_marker(self, xy=[0,0], color=[1.0,0.0,0.0]):
 		"""
@@ -0,0 +1,208 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import numpy as np
+
+"""
+Adaptive support for the beta (rationality) posterior. Instead of a fixed
+list of betas, each costing one full propagation per step, a small set of
+support points (at most budget) follows the posterior: points around the
+most likely beta are split to resolve it better, points with negligible
+mass are dropped and points that end up too close together are merged.
+Anchor points (e.g. the model's lowest and highest beta) are never
+dropped or moved, so the support cannot collapse around the peak and a
+human whose rationality changes can still be picked up at the extremes.
+Spacing is measured in log(beta). Every change moves probability mass
+between columns of the (goal x beta) posterior without changing any
+goal's total mass.
+"""
+
+class AdaptiveBetaGrid(object):
+	"""
+	Refines the beta support points of a (goal x beta) posterior after
+	every inference step.
+	"""
+
+	def __init__(self, budget, min_beta=0.01, max_beta=100.0, split_mass=0.5,
+			drop_mass=0.01, min_spacing=0.1, anchors=()):
+		"""
+			- budget: most support points to keep (propagations per step)
+			- min_beta, max_beta: range the support points stay in
+			- split_mass: a point holding more mass than this gets new
+						points halfway to its neighbors
+			- drop_mass: points holding less mass than this are dropped
+			- min_spacing: closest two points may get, in log(beta)
+			- anchors: betas that always stay in the support (they count
+						towards the budget)
+		"""
+		self.budget = budget
+		self.log_min = np.log(min_beta)
+		self.log_max = np.log(max_beta)
+		self.split_mass = split_mass
+		self.drop_mass = drop_mass
+		self.min_spacing = min_spacing
+		self.anchors = np.log(np.sort(np.asarray(anchors, dtype=float)))
+
+	def refine(self, betas, dest_beta_prob):
+		"""
+		Returns the new betas (sorted list) and the (goal x beta) posterior
+		moved onto them.
+		"""
+		betas = np.asarray(betas, dtype=float)
+		order = np.argsort(betas)
+		betas = betas[order]
+		table = np.asarray(dest_beta_prob, dtype=float)[:, order]
+
+		# anchors missing from the support come back with no mass
+		log_betas = np.log(betas)
+		missing = [a for a in self.anchors if not np.isclose(log_betas, a).any()]
+		if missing:
+			log_betas = np.concatenate([log_betas, missing])
+			table = np.hstack([table, np.zeros((table.shape[0], len(missing)))])
+			order = np.argsort(log_betas)
+			log_betas, table = log_betas[order], table[:, order]
+
+		log_betas, new_table = self.merge(log_betas, table)
+		log_betas, new_table = self.drop(log_betas, new_table)
+		log_betas, new_table = self.split(log_betas, new_table)
+
+		# points that did not move keep their exact values
+		betas = np.exp(np.union1d(np.log(betas), self.anchors))
+		new_betas = np.exp(log_betas)
+		nearest = np.abs(new_betas[:, None] - betas[None, :]).argmin(axis=1)
+		unmoved = np.isclose(new_betas, betas[nearest], rtol=1e-9, atol=0.0)
+		new_betas[unmoved] = betas[nearest[unmoved]]
+		return [float(b) for b in new_betas], new_table
+
+	def is_anchor(self, log_betas):
+		"""
+		Which of the points are anchors.
+		"""
+		return np.isclose(log_betas[:, None], self.anchors[None, :]).any(axis=1)
+
+	def merge(self, log_betas, table):
+		"""
+		Merges neighbors closer than min_spacing into one point at their
+		mass-weighted mean (at the anchor if one of them is an anchor).
+		"""
+		while len(log_betas) > 1:
+			anchor = self.is_anchor(log_betas)
+			gaps = np.where(anchor[:-1] & anchor[1:], np.inf, np.diff(log_betas))
+			i = int(np.argmin(gaps))
+			if gaps[i] >= self.min_spacing:
+				break
+			mass = table[:, i:i+2].sum(axis=0)
+			weights = mass/mass.sum() if mass.sum() > 0 else np.array([0.5, 0.5])
+			if anchor[i:i+2].any():
+				weights = anchor[i:i+2].astype(float)
+			log_betas = np.concatenate([log_betas[:i], [weights.dot(log_betas[i:i+2])], log_betas[i+2:]])
+			table = np.hstack([table[:, :i], table[:, i:i+2].sum(axis=1, keepdims=True), table[:, i+2:]])
+		return log_betas, table
+
+	def drop(self, log_betas, table):
+		"""
+		Drops the points with less than drop_mass (keeping at least two) and
+		the least likely points beyond the budget, their mass goes to the 
+		nearest remaining point. When the most likely point will be split,
+		the budget keeps room for its new points, and the most likely point
+		and its neighbors (which the split interpolates from) go first.
+		Anchors are always kept.
+		"""
+		mass = table.sum(axis=0)/max(table.sum(), 1e-300)
+		best = int(np.argmax(mass))
+		reserve = 0
+		priority = -mass
+		if mass[best] >= self.split_mass:
+			reserve = len(self.split_points(log_betas, best))
+			priority = np.where(np.abs(np.arange(len(mass)) - best) <= 1, priority - 1.0, priority)
+		anchor = self.is_anchor(log_betas)
+		priority = np.where(anchor, priority - 2.0, priority)
+
+		ranked = np.argsort(priority, kind="mergesort")
+		limit = max(self.budget - reserve, min((priority < -1.0).sum(), self.budget), 2)
+		keep = np.zeros(len(mass), dtype=bool)
+		keep[ranked[:limit]] = True
+		keep &= mass >= self.drop_mass
+		keep[ranked[:2]] = True
+		keep[best] = True
+		keep |= anchor
+		if keep.all():
+			return log_betas, table
+
+		kept = np.flatnonzero(keep)
+		nearest = kept[np.abs(log_betas[:, None] - log_betas[kept][None, :]).argmin(axis=1)]
+		new_table = np.zeros((table.shape[0], len(kept)))
+		for col, target in enumerate(nearest):
+			new_table[:, np.searchsorted(kept, target)] += table[:, col]
+		return log_betas[kept], new_table
+
+	def split_points(self, log_betas, best):
+		"""
+		(new point, neighbor or None) of every side of point best that has
+		room for a new point: halfway to its neighbor, or one spacing beyond
+		it at the ends of the support.
+		"""
+		spacing = np.diff(log_betas).mean() if len(log_betas) > 1 else 1.0
+		points = []
+		for side in [-1, 1]:
+			neighbor = best + side
+			if 0 <= neighbor < len(log_betas):
+				point = 0.5*(log_betas[best] + log_betas[neighbor])
+			else:
+				point = np.clip(log_betas[best] + side*spacing, self.log_min, self.log_max)
+				neighbor = None
+			if np.abs(point - log_betas[best]) >= self.min_spacing and \
+					np.abs(log_betas - point).min() >= self.min_spacing:
+				points.append((point, neighbor))
+		return points
+
+	def cell_widths(self, log_betas):
+		"""
+		Width in log(beta) of every point's cell (halfway to its neighbors,
+		as far out as in at the ends of the support).
+		"""
+		if len(log_betas) < 2:
+			return np.ones(len(log_betas))
+		gaps = np.diff(log_betas)
+		return 0.5*(np.r_[gaps[0], gaps] + np.r_[gaps, gaps[-1]])
+
+	def split(self, log_betas, table):
+		"""
+		Adds new points around the most likely point while the budget allows.
+		Their mass comes out of the most likely point's column only, every
+		other column is left unchanged. A new point takes the quarter of the
+		gap next to it out of the split point's cell, at the log density 
+		interpolated halfway to the neighbor (mirrored at the ends of the
+		support), capped so the split point keeps at least an equal share.
+		"""
+		mass = table.sum(axis=0)/max(table.sum(), 1e-300)
+		best = int(np.argmax(mass))
+		if mass[best] < self.split_mass:
+			return log_betas, table
+
+		points = self.split_points(log_betas, best)[:max(self.budget - len(log_betas), 0)]
+		if not points:
+			return log_betas, table
+
+		widths = self.cell_widths(log_betas)
+		density = table/widths
+		best_column = table[:, best]
+		columns = []
+		for point, neighbor in points:
+			if neighbor is None:
+				# an end of the support: mirror the neighbor on the other side
+				neighbor = best - 1 if point > log_betas[best] else best + 1
+			if 0 <= neighbor < len(log_betas):
+				other = density[:, neighbor]
+				half_gap = 0.5*np.abs(log_betas[neighbor] - log_betas[best])
+			else:
+				other = density[:, best]
+				half_gap = 0.5*widths[best]
+			share = np.sqrt(density[:, best]*other)*0.5*half_gap
+			columns.append(np.minimum(share, best_column/(len(points) + 1)))
+
+		table = table.copy()
+		table[:, best] = best_column - np.sum(columns, axis=0)
+		log_betas = np.concatenate([log_betas, [p for p, _ in points]])
+		table = np.hstack([table, np.column_stack(columns)])
+		order = np.argsort(log_betas)
+		return log_betas[order], table[:, order]
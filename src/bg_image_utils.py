@@ -0,0 +1,159 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import struct
+import hashlib
+import numpy as np
+from io import BytesIO
+
+from visualization_msgs.msg import Marker
+
+"""
+Builds the background image CubeList marker with array operations and caches
+it on disk already serialized, so publishers can send the bytes as they are.
+"""
+
+# Size of one pixel cube (m) at full resolution.
+PIXEL_SCALE = 0.1
+
+def default_image_path():
+	"""
+	Path of the testbed image shipped in config/.
+	"""
+	return os.path.join(os.path.dirname(os.path.realpath(__file__)),
+		"..", "config", "testbed_downsized.png")
+
+def default_cache_dir():
+	"""
+	Caches live in ROS_HOME (~/.ros by default) next to the ROS logs.
+	"""
+	return os.environ.get("ROS_HOME", os.path.join(os.path.expanduser("~"), ".ros"))
+
+class SerializedMarker(Marker):
+	"""
+	Marker whose wire format was computed ahead of time. Publishing it on a
+	regular Marker topic writes the cached bytes instead of re-serializing
+	every point and color.
+	"""
+
+	def __init__(self, data):
+		super(SerializedMarker, self).__init__()
+		self.serialized_data = data
+
+	def serialize(self, buff):
+		buff.write(self.serialized_data)
+
+def downsample(image, lod):
+	"""
+	Averages lod x lod blocks of pixels, dropping the partial blocks at the
+	bottom and right edges of the image. lod = 1 keeps every pixel.
+	"""
+	if lod <= 1:
+		return image
+	rows = (image.shape[0] // lod) * lod
+	cols = (image.shape[1] // lod) * lod
+	blocks = image[:rows, :cols].reshape(rows//lod, lod, cols//lod, lod, -1)
+	return blocks.mean(axis=(1, 3))
+
+def border_mask(shape):
+	"""
+	Boolean mask of the outermost rows and columns of an image.
+	"""
+	mask = np.zeros(shape[:2], dtype=bool)
+	mask[0, :] = mask[-1, :] = True
+	mask[:, 0] = mask[:, -1] = True
+	return mask
+
+def image_to_marker_bytes(image, lod=1, border_only=False, frame_id="/world"):
+	"""
+	Serializes the image as a CUBE_LIST Marker with one cube per (lod x lod)
+	block of pixels. The points and colors are written straight from NumPy
+	arrays, so no Point/ColorRGBA objects are ever created.
+	"""
+	full_height, full_width = image.shape[:2]
+	if np.issubdtype(image.dtype, np.integer):
+		image = image/255.0
+	image = downsample(image, lod)
+	height, width = image.shape[:2]
+
+	# cube centers, in the same row-major order as the original pixel loop
+	# (x follows the image rows, y the image columns)
+	rows, cols = np.meshgrid(np.arange(height), np.arange(width), indexing="ij")
+	mask = border_mask(image.shape) if border_only else np.ones((height, width), dtype=bool)
+	centers_x = (rows[mask]*lod + (lod - 1)/2.0 - full_height/2.0)*PIXEL_SCALE
+	centers_y = (cols[mask]*lod + (lod - 1)/2.0 - full_width/2.0)*PIXEL_SCALE
+
+	points = np.zeros((len(centers_x), 3), dtype="<f8")
+	points[:, 0] = centers_x
+	points[:, 1] = centers_y
+
+	colors = np.ones((len(centers_x), 4), dtype="<f4")
+	colors[:, :3] = image[mask][:, :3]
+
+	# Serialize everything but the points and colors with genpy. With empty
+	# points, colors, text and mesh_resource the message ends with
+	# 4 x uint32 lengths and the mesh_use_embedded_materials bool.
+	image_msg = Marker()
+	image_msg.header.frame_id = frame_id
+	image_msg.ns = "image_cube_list"
+	image_msg.id = 0
+	image_msg.type = image_msg.CUBE_LIST
+	image_msg.pose.orientation.x = 0.0
+	image_msg.pose.orientation.y = 0.0
+	image_msg.pose.orientation.z = -0.707
+	image_msg.pose.orientation.w = 0.707
+	image_msg.scale.x = PIXEL_SCALE*lod
+	image_msg.scale.y = PIXEL_SCALE*lod
+	image_msg.scale.z = 0.01
+
+	buff = BytesIO()
+	image_msg.serialize(buff)
+	empty = buff.getvalue()
+	tail_len = 4*4 + 1
+	assert empty[-tail_len:-1] == b"\x00"*16, "unexpected Marker layout"
+
+	num = struct.pack("<I", len(points))
+	return b"".join([empty[:-tail_len], num, points.tobytes(),
+		num, colors.tobytes(), empty[-tail_len+8:]])
+
+def cache_key(image_path, lod, border_only):
+	"""
+	Changes whenever the image file, the level of detail or the Marker
+	definition changes.
+	"""
+	stat = os.stat(image_path)
+	key = "%s:%d:%d:%d:%s:%s" % (os.path.realpath(image_path), stat.st_size,
+		int(stat.st_mtime), lod, border_only, Marker._md5sum)
+	return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+def load_image_marker(image_path=None, lod=1, border_only=False, cache_dir=None):
+	"""
+	Returns a SerializedMarker of the background image, reading it from the
+	disk cache if possible and building (and caching) it otherwise.
+	"""
+	image_path = image_path or default_image_path()
+	cache_dir = cache_dir or default_cache_dir()
+	lod = max(1, int(lod))
+
+	name = "bg_image_%s.msg" % cache_key(image_path, lod, border_only)
+	cache_path = os.path.join(cache_dir, name)
+
+	if os.path.exists(cache_path):
+		with open(cache_path, "rb") as f:
+			return SerializedMarker(f.read())
+
+	# only pay for matplotlib when the cache is cold
+	import matplotlib.image as mpimg
+	data = image_to_marker_bytes(mpimg.imread(image_path), lod, border_only)
+
+	try:
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		tmp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+		with open(tmp_path, "wb") as f:
+			f.write(data)
+		os.rename(tmp_path, cache_path)
+	except (IOError, OSError) as e:
+		print "[bg_image_utils]: could not cache background image:", e
+
+	return SerializedMarker(data)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import numpy as np
+
+import grid_msg_utils
+
+"""
+Collision risk of candidate robot trajectories under the predicted human
+occupancy. Every path is a sequence of time-stamped [x, y] points, linearly
+interpolated in between. Each predicted step the path spans counts once:
+the grid's mass within the robot radius of where the path is at the step's
+time is that step's collision probability. Steps are combined with a
+noisy-OR, like the merger combines humans, so the risk of a path is
+1 - prod(1 - p_k). The risk therefore only depends on the path, not on how
+densely it is sampled. The whole batch is evaluated with array operations,
+without Python loops over paths or points.
+
+Planners can keep their own CollisionRisk up to date from
+/occupancy_grid_time (update_from_message), or call the merger's
+EvaluateTrajectories service.
+"""
+
+class CollisionRisk(object):
+	"""
+	Evaluates batches of robot paths against the latest predicted grids.
+	"""
+
+	def __init__(self, lower, upper, res, height, width):
+		"""
+			- lower, upper: real-world bounds, as in state/lower and upper
+			- res, height, width: the prediction grid
+		"""
+		self.lower = lower
+		self.upper = upper
+		self.res = res
+		self.height = height
+		self.width = width
+
+		# (grids, stamp, deltat), replaced as a whole so readers on other
+		# threads always see a consistent prediction
+		self.prediction = None
+		self.disc_cache = {}
+
+	def update(self, grids, stamp, deltat):
+		"""
+		Sets the prediction: grids (T x (height x width)), the first at stamp
+		(s), deltat (s) apart.
+		"""
+		self.prediction = (np.asarray(grids, dtype=np.float64), float(stamp), float(deltat))
+
+	def update_from_message(self, msg):
+		"""
+		Sets the prediction from an OccupancyGridTime msg.
+		"""
+		grids = grid_msg_utils.message_to_grids(msg)
+		if grids is None:
+			return
+		stamp = msg.gridarray[0].header.stamp.to_sec()
+		deltat = (msg.gridarray[1].header.stamp.to_sec() - stamp) if len(msg.gridarray) > 1 else 1.0
+		self.update(grids, stamp, deltat)
+
+	def disc_offsets(self, radius):
+		"""
+		Offsets from a point's nearest cell to every cell whose center may
+		be within radius of the point (it is less than a cell from the
+		nearest center).
+		"""
+		if radius not in self.disc_cache:
+			reach = int(np.ceil(radius/self.res)) + 1
+			dx, dy = np.meshgrid(np.arange(-reach, reach + 1), np.arange(-reach, reach + 1), indexing="ij")
+			near = dx**2 + dy**2 <= (radius/self.res + 1)**2
+			self.disc_cache[radius] = (dx[near], dy[near])
+		return self.disc_cache[radius]
+
+	def disc_risk(self, steps, points, radius):
+		"""
+		Predicted occupancy within radius of every point (... x 2, meters)
+		in the grids of steps (..., indices into the prediction).
+		"""
+		grids = self.prediction[0]
+		shape = steps.shape
+		steps = steps.ravel()
+		points = points.reshape(-1, 2)
+
+		# cells around each point whose centers are within the radius
+		x = (points[:, 0] - self.lower[0])/self.res
+		y = (self.upper[1] - points[:, 1])/self.res
+		dx, dy = self.disc_offsets(radius)
+		cx = np.round(x)[:, None] + dx[None, :]
+		cy = np.round(y)[:, None] + dy[None, :]
+		inside = ((cx - x[:, None])**2 + (cy - y[:, None])**2 <= (radius/self.res)**2) & \
+			(cx >= 0) & (cx < self.height) & (cy >= 0) & (cy < self.width)
+		states = (np.clip(cx, 0, self.height - 1)*self.width + np.clip(cy, 0, self.width - 1)).astype(int)
+
+		occupancy = grids[steps[:, None], states]
+		return np.minimum((occupancy*inside).sum(axis=1), 1.0).reshape(shape)
+
+	def step_positions(self, times, points):
+		"""
+		Where every path is at the predicted steps: the path is linearly
+		interpolated at the times of the steps within its time span (clipped
+		to the predicted horizon), or of the nearest step if none falls in it.
+		Returns the positions (B x T x 2) and which steps every path covers
+		(B x T).
+		"""
+		grids, stamp, deltat = self.prediction
+		num_steps = grids.shape[0]
+		first = (times[:, 0] - stamp)/deltat
+		last = (times[:, -1] - stamp)/deltat
+		low = np.clip(np.ceil(first), 0, num_steps - 1)
+		high = np.clip(np.floor(last), 0, num_steps - 1)
+		nearest = np.clip(np.round(0.5*(first + last)), 0, num_steps - 1)
+		low, high = np.where(high < low, nearest, low), np.where(high < low, nearest, high)
+		k = np.arange(num_steps)
+		covered = (k[None, :] >= low[:, None]) & (k[None, :] <= high[:, None])
+
+		# segment of the path every step time falls in
+		query = np.clip(stamp + k[None, :]*deltat, times[:, :1], times[:, -1:])
+		if times.shape[1] == 1:
+			return np.repeat(points, num_steps, axis=1), covered
+		seg = np.clip((times[:, None, :] <= query[:, :, None]).sum(axis=2) - 1, 0, times.shape[1] - 2)
+		rows = np.arange(len(times))[:, None]
+		t0, t1 = times[rows, seg], times[rows, seg + 1]
+		frac = np.where(t1 > t0, (query - t0)/np.where(t1 > t0, t1 - t0, 1.0), 0.0)
+		positions = (1 - frac)[:, :, None]*points[rows, seg] + frac[:, :, None]*points[rows, seg + 1]
+		return positions, covered
+
+	def evaluate(self, times, points, radius):
+		"""
+		Collision probability of every path: times (B x P, absolute seconds,
+		increasing along each path) and points (B x P x 2, meters) of B paths
+		with P points each, robot radius in meters. Returns None before the
+		first prediction.
+		"""
+		if self.prediction is None:
+			return None
+		positions, covered = self.step_positions(np.asarray(times, dtype=float), np.asarray(points, dtype=float))
+		steps = np.broadcast_to(np.arange(covered.shape[1]), covered.shape)
+		risk = np.where(covered, self.disc_risk(steps, positions, radius), 0.0)
+		return 1.0 - np.prod(1.0 - risk, axis=-1)
+
+def handle_evaluate(collision_risk, request):
+	"""
+	Answers an EvaluateTrajectories request with a CollisionRisk, for the
+	nodes serving it.
+	"""
+	from crazyflie_human.srv import EvaluateTrajectoriesResponse
+
+	n = max(int(request.num_points), 1)
+	times = np.asarray(request.t, dtype=float)
+	if collision_risk.prediction is None or len(times) == 0 or len(times) % n or \
+			not len(request.x) == len(request.y) == len(times):
+		return EvaluateTrajectoriesResponse(collision_prob=[])
+	points = np.column_stack([request.x, request.y])
+	risk = collision_risk.evaluate(times.reshape(-1, n), points.reshape(-1, n, 2), request.radius)
+	return EvaluateTrajectoriesResponse(collision_prob=risk.tolist())
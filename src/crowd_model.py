@@ -0,0 +1,156 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import numpy as np
+
+import static_field
+from spatial_hash import SpatialHash
+
+class PotentialFieldCrowd(object):
+	"""
+	Simulates N pedestrians at once with the same Attractive-Repulsive
+	Potential Field Method as PotentialFieldHuman. All humans are stored as
+	NumPy arrays and every step is computed for the whole crowd in one go.
+
+	References:
+		- Goodrich, M. A. "Potential Fields Tutorial". https://bit.ly/2LXAeIM
+	"""
+
+	def __init__(self, starts, goals, dt=0.01, alpha=0.5, goal_s=1.0, goal_r=0.5,
+			beta=1.0, obstacle_s=1.0, obstacle_r=0.25):
+		"""
+			- starts: list of N [x,y] start positions
+			- goals: list of N lists of [x,y] goals (humans can have
+					a different number of goals)
+			- the rest are the sim/ potential field params
+		"""
+		self.dt = dt
+		self.alpha = alpha
+		self.goal_field_spread = goal_s
+		self.goal_radius = goal_r
+		self.beta = beta
+		self.obstacle_field_spread = obstacle_s
+		self.obstacle_radius = obstacle_r
+
+		self.positions = np.array(starts, dtype=float).reshape(-1, 2)
+		self.num_humans = self.positions.shape[0]
+
+		# precomputed goal and static obstacle fields (None: computed exactly)
+		self.field_grid = None
+		self.goal_field = None
+		self.static_obstacles = None
+
+		# neighbor queries for the repulsion between humans and robots
+		self.neighbors = SpatialHash(obstacle_r + obstacle_s)
+
+		self.set_goals(goals)
+
+	def set_goals(self, goals):
+		"""
+		Stores the goals as a (N x max goals x 2) array with a validity mask.
+		"""
+		max_goals = max([len(g) for g in goals] + [1])
+		self.goals = np.zeros((self.num_humans, max_goals, 2))
+		self.goal_mask = np.zeros((self.num_humans, max_goals), dtype=bool)
+		for i, human_goals in enumerate(goals):
+			if len(human_goals) > 0:
+				self.goals[i, :len(human_goals)] = np.array(human_goals, dtype=float)[:, :2]
+				self.goal_mask[i, :len(human_goals)] = True
+
+		if self.field_grid is not None:
+			self.precompute_goal_field(*self.field_grid)
+
+	def precompute_goal_field(self, lower, upper, res):
+		"""
+		Samples the gradient of every distinct goal on a grid over the space
+		(res m/cell), after which goal gradients are bilinear lookups.
+		"""
+		self.field_grid = (lower, upper, res)
+		goals, layers = np.unique(self.goals[self.goal_mask], axis=0, return_inverse=True)
+		self.goal_field = static_field.goal_field(goals, lower, upper, res,
+			self.alpha, self.goal_field_spread, self.goal_radius)
+		self.goal_layers = np.zeros(self.goal_mask.shape, dtype=int)
+		self.goal_layers[self.goal_mask] = layers.ravel()
+
+	def set_static_obstacles(self, field):
+		"""
+		Static obstacles as a static_field.obstacle_field, None removes them.
+		"""
+		self.static_obstacles = field
+
+	def goal_gradients(self):
+		"""
+		Sum over each human's goals of the attractive gradient, (N x 2).
+		"""
+		if self.goal_field is not None:
+			points = np.repeat(self.positions, self.goals.shape[1], axis=0)
+			grads = self.goal_field.lookup(points, self.goal_layers.ravel())
+			grads = grads.reshape(self.goals.shape)*self.goal_mask[:, :, None]
+			return grads.sum(axis=1)
+
+		diff = self.goals - self.positions[:, None, :]
+		dist = np.linalg.norm(diff, axis=2)
+		unit = diff/np.maximum(dist, 1e-12)[:, :, None]
+
+		# zero inside the goal, proportional to the distance within the
+		# spread, maximal outside of it
+		mag = np.where(dist < self.goal_radius, 0.0,
+			np.where(dist <= self.goal_radius + self.goal_field_spread,
+				self.alpha*(dist - self.goal_radius),
+				self.alpha*self.goal_field_spread))
+		mag = mag*self.goal_mask
+
+		return (mag[:, :, None]*unit).sum(axis=1)
+
+	def obstacle_gradients(self, obstacles, exclude_self=False):
+		"""
+		Sum of the repulsive gradients of the obstacles (M x 2) on every human.
+		If exclude_self, obstacles[i] is human i and is skipped for human i.
+		Only obstacles within obstacle_r + obstacle_s matter, they are found
+		with a spatial hash so the cost grows about linearly with N + M.
+		"""
+		obstacles = np.asarray(obstacles, dtype=float).reshape(-1, 2)
+		if obstacles.shape[0] == 0:
+			return np.zeros((self.num_humans, 2))
+
+		reach = self.obstacle_radius + self.obstacle_field_spread
+		self.neighbors.build(obstacles)
+		human, obstacle, diff, dist = self.neighbors.query_pairs(self.positions, reach)
+		if exclude_self:
+			keep = human != obstacle
+			human, diff, dist = human[keep], diff[keep], dist[keep]
+		unit = diff/np.maximum(dist, 1e-12)[:, None]
+
+		# within the spread, the gradient grows from zero (at the edge of the
+		# spread) to beta (at the edge of the obstacle)
+		grads = (-self.beta*(reach - dist))[:, None]*unit
+
+		# within the obstacle, the potential field is "infinitely" repulsive
+		inside = dist < self.obstacle_radius
+		grads[inside] = -100000*np.sign(unit[inside])
+
+		return np.column_stack([
+			np.bincount(human, weights=grads[:, 0], minlength=self.num_humans),
+			np.bincount(human, weights=grads[:, 1], minlength=self.num_humans)])
+
+	def static_obstacle_gradients(self):
+		"""
+		Repulsive gradient of the static obstacles on every human, (N x 2).
+		"""
+		if self.static_obstacles is None:
+			return np.zeros((self.num_humans, 2))
+		return self.static_obstacles.lookup(self.positions)[:, 1:]
+
+	def step(self, robot_positions=None):
+		"""
+		Moves every human one dt along the combined potential field gradient,
+		avoiding each other, the static obstacles and the robots (M x 2).
+		Returns the (N x 2) positions.
+		"""
+		grad = self.goal_gradients()
+		grad += self.static_obstacle_gradients()
+		grad += self.obstacle_gradients(self.positions, exclude_self=True)
+		if robot_positions is not None and len(robot_positions) > 0:
+			grad += self.obstacle_gradients(robot_positions)
+
+		self.positions = self.positions + self.dt*grad
+		return self.positions
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+import rospy
+import numpy as np
+from geometry_msgs.msg import PoseStamped
+from crazyflie_msgs.msg import PositionVelocityStateStamped
+
+from crowd_model import PotentialFieldCrowd
+import static_field
+import sim_clock
+
+class CrowdSimulator(object):
+	"""
+	This class simulates mocap data of a whole crowd of pedestrians in one
+	node. Every human follows the potential field of PotentialFieldHuman, but
+	the whole crowd is stepped at once with vectorized NumPy code and each
+	human's pose is published on its own /human_poseN topic.
+	"""
+
+	def __init__(self):
+
+		rospy.init_node('crowd_sim', anonymous=True)
+
+		# load all the prediction params and setup subscriber/publishers
+		self.load_parameters()
+		self.register_callbacks()
+
+		if sim_clock.use_sim_time():
+			self.run_sim_time()
+		else:
+			rate = rospy.Rate(1.0/self.dt)
+			start = rospy.Time.now()
+			duration = rospy.Duration.from_sec(rospy.get_param("~duration", 0.0))
+
+			while not rospy.is_shutdown():
+				stamp = rospy.Time.now()
+				self.crowd.step(self.robot_positions())
+				self.publish_poses(stamp)
+
+				if not duration.is_zero() and stamp - start >= duration:
+					rospy.signal_shutdown("crowd_sim: ran "+str(duration.to_sec())+" s")
+					break
+				rate.sleep()
+
+	def run_sim_time(self):
+		"""
+		Owns the simulated time: steps as fast as the predictors of the
+		simulated humans consume the poses (or at ~real_time_factor) and 
+		publishes /clock, optionally stopping after ~duration sim seconds.
+		"""
+		wait = rospy.get_param("~wait_for_predictors", True)
+		if wait and not sim_clock.wait_for_subscribers(self.state_pubs):
+			rospy.logwarn("crowd_sim: not every human pose has a subscriber, starting anyway")
+
+		clock = sim_clock.SimClock(self.dt, 
+			real_time_factor=rospy.get_param("~real_time_factor", 0.0),
+			human_numbers=range(1, self.num_humans+1) if wait else [],
+			max_lag=rospy.get_param("~max_lag", 0.2))
+		start = clock.now
+		duration = rospy.Duration.from_sec(rospy.get_param("~duration", 0.0))
+
+		while not rospy.is_shutdown():
+			stamp = clock.tick()
+			self.crowd.step(self.robot_positions())
+			self.publish_poses(stamp)
+
+			if not duration.is_zero() and stamp - start >= duration:
+				rospy.signal_shutdown("crowd_sim: simulated "+str(duration.to_sec())+" s")
+
+	def load_parameters(self):
+		"""
+		Loads all the important paramters of the crowd sim.
+		"""
+		# --- real-world params ---#
+
+		self.real_lower = rospy.get_param("state/lower")
+		self.real_upper = rospy.get_param("state/upper")
+
+		# total number of humans to simulate
+		self.num_humans = int(rospy.get_param("~num_humans",
+			rospy.get_param("pred/total_number_of_humans")))
+
+		# (real-world) start and goal locations, humans without any in the
+		# params get a random start and goal inside the space
+		rng = np.random.RandomState(rospy.get_param("~seed", 0))
+		starts = []
+		goals = []
+		for ii in range(1, self.num_humans+1):
+			prefix = "pred/human"+str(ii)
+			if rospy.has_param(prefix+"_real_start"):
+				starts.append(rospy.get_param(prefix+"_real_start"))
+				goals.append(rospy.get_param(prefix+"_real_goals"))
+			else:
+				starts.append(list(rng.uniform(self.real_lower[:2], self.real_upper[:2])))
+				goals.append([list(rng.uniform(self.real_lower[:2], self.real_upper[:2]))])
+
+		# --- simulation params ---#
+
+		self.dt = rospy.get_param("sim/dt")
+
+		# get he prefixes of all the robots so we can listen to their topics
+		self.robot_prefixes = rospy.get_param("sim/robot_prefixes")
+
+		self.crowd = PotentialFieldCrowd(starts, goals, dt=self.dt,
+			alpha=rospy.get_param("sim/alpha_pot_field"),
+			goal_s=rospy.get_param("sim/goal_s"),
+			goal_r=rospy.get_param("sim/goal_r"),
+			beta=rospy.get_param("sim/beta_pot_field"),
+			obstacle_s=rospy.get_param("sim/obstacle_s"),
+			obstacle_r=rospy.get_param("sim/obstacle_r"))
+
+		# goals and static obstacles never move, precompute their fields
+		field_res = rospy.get_param("sim/field_res", 0.0)
+		if field_res > 0:
+			self.crowd.precompute_goal_field(self.real_lower, self.real_upper, field_res)
+		map_image = rospy.get_param("sim/map_image", "")
+		if map_image:
+			self.crowd.set_static_obstacles(static_field.load_map_obstacles(map_image,
+				self.real_lower, self.real_upper, field_res or 0.05,
+				self.crowd.beta, self.crowd.obstacle_field_spread,
+				rospy.get_param("sim/map_occupied_thresh", 0.2)))
+
+		# Dictionary mapping from robot pose topic to current [x,y] position
+		self.other_robot_positions = {}
+
+		print "----- Running crowd simulation for: ----------"
+		print "	- num humans: ", self.num_humans
+		print "	- num robots: ", len(self.robot_prefixes)
+		print "----------------------------------------------"
+
+	def register_callbacks(self):
+		"""
+		Sets up all the publishers/subscribers needed.
+		"""
+		# in sim time the predictors may lag a few steps behind, never drop poses
+		queue_size = 1000 if sim_clock.use_sim_time() else 10
+		self.state_pubs = [rospy.Publisher('/human_pose'+str(ii), PoseStamped, queue_size=queue_size)
+			for ii in range(1, self.num_humans+1)]
+
+		# Create a subscriber for each robot in the environment.
+		for robot in self.robot_prefixes:
+			topic = "/state/position_velocity"+robot
+
+			# Lambda function allows us to call a callback
+			# with more arguments than normally intended.
+			def curried_callback(t):
+				return lambda m: self.robot_position_callback(t, m)
+
+			rospy.Subscriber(topic, PositionVelocityStateStamped, curried_callback(topic), queue_size=1)
+
+	def robot_position_callback(self, topic, msg):
+		"""
+		This callback stores the most recent robot position.
+		"""
+		self.other_robot_positions[topic] = [msg.state.x, msg.state.y]
+
+	def robot_positions(self):
+		"""
+		Returns the (num robots heard from) x 2 array of robot positions.
+		"""
+		return np.array(list(self.other_robot_positions.values())).reshape(-1, 2)
+
+	def publish_poses(self, stamp):
+		"""
+		Publishes the current position of every human.
+		"""
+		for pub, pos in zip(self.state_pubs, self.crowd.positions):
+			human_pose = PoseStamped()
+			human_pose.header.frame_id = "/frame_id_1"
+			human_pose.header.stamp = stamp
+			human_pose.pose.position.x = pos[0]
+			human_pose.pose.position.y = pos[1]
+			human_pose.pose.position.z = 0.0
+			human_pose.pose.orientation.w = 1.0
+			pub.publish(human_pose)
+
+if __name__ == '__main__':
+	crowd = CrowdSimulator()
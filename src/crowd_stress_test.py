@@ -0,0 +1,248 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import time
+import signal
+import argparse
+import subprocess
+import numpy as np
+
+import rospy
+import rosgraph
+
+import scenarios
+
+"""
+Crowd stress test. For every crowd size N it generates a seeded scenario,
+launches the crowd simulator, one predictor per human and the merger, and
+measures over a fixed window:
+	- sustained prediction rate of each human (Hz)
+	- merge latency, from a human's prediction to the next merged grid (ms)
+	- poses the predictors dropped (published but never processed)
+	- CPU use (% of one core) and resident memory of all launched nodes
+
+	usage: crowd_stress_test.py --humans 2 5 10 20 50 --duration 30
+"""
+
+def parse_args(argv):
+	parser = argparse.ArgumentParser(description="Ramp up the number of simulated "
+		"humans and report prediction throughput, latency and resource use.")
+	parser.add_argument("--humans", type=int, nargs="+", default=[2, 5, 10, 20],
+		help="crowd sizes to test, in order")
+	parser.add_argument("--duration", type=float, default=30.0,
+		help="measurement window per crowd size (wall seconds)")
+	parser.add_argument("--warmup", type=float, default=5.0,
+		help="seconds to let the nodes start before measuring")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--goals", type=int, default=1, help="goals per human")
+	parser.add_argument("--beta", default="adaptive",
+		help="prediction model: irrational, rational or adaptive")
+	parser.add_argument("--config", default=None,
+		help="base params yaml (default: config/pedestrian_pred.yaml)")
+	parser.add_argument("--out", default="crowd_stress_test",
+		help="directory for the scenarios and the report")
+	return parser.parse_args(argv)
+
+class ProcessStats(object):
+	"""
+	CPU time and memory of a process and all of its descendants, read from
+	/proc (Linux only).
+	"""
+
+	def __init__(self, root_pid):
+		self.root_pid = root_pid
+		self.clk_tck = os.sysconf("SC_CLK_TCK")
+		self.page_size = os.sysconf("SC_PAGE_SIZE")
+
+	def pids(self):
+		"""
+		The root process and all its descendants.
+		"""
+		children = {}
+		for entry in os.listdir("/proc"):
+			if not entry.isdigit():
+				continue
+			try:
+				with open("/proc/%s/stat" % entry) as f:
+					ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+			except (IOError, OSError, IndexError, ValueError):
+				continue
+			children.setdefault(ppid, []).append(int(entry))
+
+		found = [self.root_pid]
+		idx = 0
+		while idx < len(found):
+			found += children.get(found[idx], [])
+			idx += 1
+		return found
+
+	def sample(self):
+		"""
+		Returns (total cpu seconds, total resident MB).
+		"""
+		cpu = 0.0
+		rss = 0.0
+		for pid in self.pids():
+			try:
+				with open("/proc/%d/stat" % pid) as f:
+					fields = f.read().rsplit(")", 1)[1].split()
+				# utime and stime are fields 14 and 15 of /proc/pid/stat
+				cpu += (int(fields[11]) + int(fields[12]))/self.clk_tck
+				with open("/proc/%d/statm" % pid) as f:
+					rss += int(f.read().split()[1])*self.page_size/2**20
+			except (IOError, OSError, IndexError, ValueError):
+				continue
+		return cpu, rss
+
+class ThroughputMonitor(object):
+	"""
+	Counts poses, processed poses and predictions of every human, and times
+	the merged grids. Subscribes with AnyMsg, so nothing is deserialized.
+	"""
+
+	def __init__(self, num_humans):
+		self.num_humans = num_humans
+		self.subs = []
+		self.reset()
+		for ii in range(1, num_humans+1):
+			self.subs.append(rospy.Subscriber('/human_pose'+str(ii), rospy.AnyMsg,
+				lambda m, i=ii: self.count("poses", i), queue_size=100))
+			self.subs.append(rospy.Subscriber('/human_pred_progress'+str(ii), rospy.AnyMsg,
+				lambda m, i=ii: self.count("processed", i), queue_size=100))
+			self.subs.append(rospy.Subscriber('/occupancy_grid_time'+str(ii), rospy.AnyMsg,
+				lambda m, i=ii: self.prediction_callback(i), queue_size=100))
+		self.subs.append(rospy.Subscriber('/occupancy_grid_time', rospy.AnyMsg,
+			self.merged_callback, queue_size=100))
+
+	def reset(self):
+		self.counts = {"poses": np.zeros(self.num_humans+1, dtype=int),
+			"processed": np.zeros(self.num_humans+1, dtype=int),
+			"predictions": np.zeros(self.num_humans+1, dtype=int)}
+		self.pending = []
+		self.merge_latencies = []
+
+	def count(self, name, human):
+		self.counts[name][human] += 1
+
+	def prediction_callback(self, human):
+		self.counts["predictions"][human] += 1
+		self.pending.append(time.time())
+
+	def merged_callback(self, msg):
+		now = time.time()
+		pending, self.pending = self.pending, []
+		self.merge_latencies += [now - t for t in pending]
+
+	def unregister(self):
+		for sub in self.subs:
+			sub.unregister()
+
+def ensure_master():
+	"""
+	Starts a roscore if none is running, and returns its process (or None).
+	"""
+	if rosgraph.is_master_online():
+		return None
+	core = subprocess.Popen(["roscore"], stdout=open(os.devnull, "w"), stderr=subprocess.STDOUT)
+	while not rosgraph.is_master_online():
+		time.sleep(0.1)
+	return core
+
+def stop(process, timeout=10.0):
+	"""
+	SIGINTs a roslaunch/roscore like Ctrl-C would, killing it if it hangs.
+	"""
+	if process is None or process.poll() is not None:
+		return
+	process.send_signal(signal.SIGINT)
+	deadline = time.time() + timeout
+	while process.poll() is None and time.time() < deadline:
+		time.sleep(0.1)
+	if process.poll() is None:
+		process.kill()
+
+def run_crowd(num_humans, args, base_config):
+	"""
+	Launches one scenario and returns its measurements as a dict.
+	"""
+	scenario_dir = os.path.abspath(os.path.join(args.out, "humans%d" % num_humans))
+	if not os.path.isdir(scenario_dir):
+		os.makedirs(scenario_dir)
+	yaml_path = os.path.join(scenario_dir, "scenario.yaml")
+	launch_path = os.path.join(scenario_dir, "scenario.launch")
+
+	config = scenarios.make_scenario_config(num_humans, seed=args.seed,
+		base_config=base_config, num_goals=args.goals)
+	scenarios.write_scenario_yaml(config, yaml_path)
+	scenarios.write_scenario_launch(yaml_path, num_humans, launch_path, beta=args.beta)
+
+	monitor = ThroughputMonitor(num_humans)
+	launch = subprocess.Popen(["roslaunch", launch_path],
+		stdout=open(os.path.join(scenario_dir, "roslaunch.log"), "w"), stderr=subprocess.STDOUT)
+	stats = ProcessStats(launch.pid)
+
+	try:
+		time.sleep(args.warmup)
+		monitor.reset()
+		cpu_start, _ = stats.sample()
+		wall_start = time.time()
+		peak_rss = 0.0
+
+		while time.time() - wall_start < args.duration and not rospy.is_shutdown():
+			time.sleep(1.0)
+			peak_rss = max(peak_rss, stats.sample()[1])
+
+		cpu_end, _ = stats.sample()
+		wall = time.time() - wall_start
+		counts = dict((k, v[1:].copy()) for k, v in monitor.counts.items())
+		latencies = np.array(monitor.merge_latencies)
+	finally:
+		monitor.unregister()
+		stop(launch)
+
+	rates = counts["predictions"]/wall
+	dropped = np.maximum(counts["poses"] - counts["processed"], 0)
+	return {"humans": num_humans,
+		"rate_mean": rates.mean(),
+		"rate_min": rates.min(),
+		"merge_ms_median": 1e3*np.median(latencies) if len(latencies) else float("nan"),
+		"merge_ms_p95": 1e3*np.percentile(latencies, 95) if len(latencies) else float("nan"),
+		"dropped_pct": 100.0*dropped.sum()/max(counts["poses"].sum(), 1),
+		"cpu_pct": 100.0*(cpu_end - cpu_start)/wall,
+		"rss_mb": peak_rss}
+
+COLUMNS = ["humans", "rate_mean", "rate_min", "merge_ms_median", "merge_ms_p95",
+	"dropped_pct", "cpu_pct", "rss_mb"]
+
+if __name__ == '__main__':
+	args = parse_args(rospy.myargv()[1:])
+	if not os.path.isdir(args.out):
+		os.makedirs(args.out)
+
+	core = ensure_master()
+	rospy.init_node('crowd_stress_test', anonymous=True, disable_signals=True)
+	base_config = scenarios.load_config(args.config)
+
+	report_path = os.path.join(args.out, "report.csv")
+	results = []
+	try:
+		for num_humans in args.humans:
+			print "----- Running crowd of", num_humans, "humans -----"
+			result = run_crowd(num_humans, args, base_config)
+			results.append(result)
+
+			print " ".join("%s=%.2f" % (c, result[c]) for c in COLUMNS)
+			with open(report_path, "w") as f:
+				f.write(",".join(COLUMNS)+"\n")
+				for r in results:
+					f.write(",".join("%g" % r[c] for c in COLUMNS)+"\n")
+	finally:
+		rospy.signal_shutdown("crowd stress test done")
+		stop(core)
+
+	print "----------------------------------------------"
+	print "%7s %10s %10s %12s %10s %9s %8s %8s" % ("humans", "rate Hz", "min Hz",
+		"merge ms p50", "p95", "dropped%", "cpu%", "rss MB")
+	for r in results:
+		print "%7d %10.2f %10.2f %12.1f %10.1f %9.1f %8.0f %8.0f" % tuple(r[c] for c in COLUMNS)
+	print "Report written to", report_path
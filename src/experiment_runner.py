@@ -0,0 +1,188 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import time
+import socket
+import signal
+import argparse
+import itertools
+import subprocess
+import numpy as np
+
+import scenarios
+import prediction_evaluator
+
+"""
+Runs batches of closed-loop experiments in parallel. Every experiment gets
+its own ROS master (roslaunch starts one on a free port, its nodes find it
+through their own ROS_MASTER_URI) and its own ROS_HOME for logs, so K of
+them can run at once without seeing each other's topics or params. The
+crowd simulator stands in for mocap; robot simulators can be added with
+--extra-launch. Every run records its predictions (flight_recorder.py),
+which are scored once it finishes, and all results end up in one directory:
+
+	results/runs.csv                  one row per experiment
+	results/<run>/scenario.{yaml,launch}, roslaunch.log, record/, metrics.txt
+
+	usage: experiment_runner.py --humans 3 --models adaptive rational irrational
+			--seeds 0 1 2 3 --parallel 4 --duration 60 --out results
+"""
+
+def free_port():
+	"""
+	A TCP port nobody is listening on right now.
+	"""
+	sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+	sock.bind(("localhost", 0))
+	port = sock.getsockname()[1]
+	sock.close()
+	return port
+
+def stop(process, timeout=10.0):
+	"""
+	SIGINTs a roslaunch like Ctrl-C would, killing it if it hangs.
+	"""
+	if process.poll() is not None:
+		return
+	process.send_signal(signal.SIGINT)
+	deadline = time.time() + timeout
+	while process.poll() is None and time.time() < deadline:
+		time.sleep(0.1)
+	if process.poll() is None:
+		process.kill()
+
+class Experiment(object):
+	"""
+	One experiment: a seeded scenario with one prediction model, run in its
+	own directory against its own ROS master.
+	"""
+
+	def __init__(self, name, run_dir, num_humans, model, seed, args, base_config):
+		self.name = name
+		self.run_dir = run_dir
+		self.model = model
+		self.seed = seed
+		self.num_humans = num_humans
+		self.args = args
+		self.process = None
+		self.start_time = None
+		self.status = "pending"
+
+		if not os.path.isdir(run_dir):
+			os.makedirs(run_dir)
+		self.record_dir = os.path.join(run_dir, "record")
+
+		config = scenarios.make_scenario_config(num_humans, seed=seed,
+			base_config=base_config, num_goals=args.goals)
+		config["pred"]["record_dir"] = self.record_dir
+		self.yaml_path = os.path.join(run_dir, "scenario.yaml")
+		self.launch_path = os.path.join(run_dir, "scenario.launch")
+		scenarios.write_scenario_yaml(config, self.yaml_path)
+		scenarios.write_scenario_launch(self.yaml_path, num_humans, self.launch_path,
+			beta=model, sim_time=args.sim_time, duration=args.duration)
+
+	def start(self):
+		port = free_port()
+		env = dict(os.environ)
+		env["ROS_MASTER_URI"] = "http://localhost:%d" % port
+		env["ROS_HOME"] = self.run_dir
+
+		# roslaunch brings up a master on ROS_MASTER_URI's port when there is none
+		log = open(os.path.join(self.run_dir, "roslaunch.log"), "w")
+		self.process = subprocess.Popen(["roslaunch", "-p", str(port), self.launch_path] + self.args.extra_launch,
+			env=env, stdout=log, stderr=subprocess.STDOUT)
+		self.start_time = time.time()
+		self.status = "running"
+
+	def poll(self):
+		"""
+		True once the experiment is over: the crowd sim ended it (it is a
+		required node) or it ran out of wall time.
+		"""
+		if self.process.poll() is not None:
+			self.status = "done" if self.process.returncode == 0 else "failed (%d)" % self.process.returncode
+			return True
+		if time.time() - self.start_time > self.args.timeout:
+			stop(self.process)
+			self.status = "timeout"
+			return True
+		return False
+
+	def score(self, geometry, radius):
+		"""
+		Scores the recorded predictions of every human, writes metrics.txt
+		and returns (num predictions, mean log-likelihood, mean mass).
+		"""
+		total = prediction_evaluator.Scores(1)
+		for run in prediction_evaluator.find_runs([self.record_dir]) if os.path.isdir(self.record_dir) else []:
+			_, scores = prediction_evaluator.score_run((run, geometry, radius, 256))
+			if scores is not None:
+				total.merge(scores)
+
+		n = total.count.sum()
+		loglik = total.loglik.sum()/n if n else float("nan")
+		mass = total.mass.sum()/n if n else float("nan")
+		with open(os.path.join(self.run_dir, "metrics.txt"), "w") as f:
+			f.write("%s %g %g %d\n" % (self.name, loglik, mass, int(total.count[0])))
+		return int(total.count[0]), loglik, mass
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Run closed-loop experiments in parallel, each with its own ROS master.")
+	parser.add_argument("--humans", type=int, default=2, help="simulated humans per experiment")
+	parser.add_argument("--models", nargs="+", default=["adaptive", "rational", "irrational"])
+	parser.add_argument("--seeds", type=int, nargs="+", default=[0], help="one scenario per seed")
+	parser.add_argument("--goals", type=int, default=1, help="goals per human")
+	parser.add_argument("--parallel", type=int, default=2, help="experiments running at once")
+	parser.add_argument("--duration", type=float, default=60.0, help="seconds (simulated, or wall clock with --no-sim-time) per experiment")
+	parser.add_argument("--no-sim-time", dest="sim_time", action="store_false",
+		help="run in wall-clock time instead of simulated time")
+	parser.add_argument("--timeout", type=float, default=600.0, help="wall seconds before a run is stopped")
+	parser.add_argument("--extra-launch", nargs="*", default=[],
+		help="more launch files (e.g. robot simulators) to start with every experiment")
+	parser.add_argument("--config", default=None, help="base params yaml (default: config/pedestrian_pred.yaml)")
+	parser.add_argument("--radius", type=float, default=0.3, help="radius (m) for the probability mass")
+	parser.add_argument("--out", default="results", help="results directory")
+	args = parser.parse_args()
+
+	base_config = scenarios.load_config(args.config)
+	geometry = prediction_evaluator.GridGeometry.from_config(base_config)
+
+	experiments = []
+	for seed, model in itertools.product(args.seeds, args.models):
+		name = "%s_seed%d" % (model, seed)
+		experiments.append(Experiment(name, os.path.abspath(os.path.join(args.out, name)),
+			args.humans, model, seed, args, base_config))
+	pending = list(experiments)
+	running = []
+	start = time.time()
+
+	rows = []
+	while pending or running:
+		while pending and len(running) < args.parallel:
+			experiment = pending.pop(0)
+			experiment.start()
+			running.append(experiment)
+			print "[%6.1fs] started %s" % (time.time() - start, experiment.name)
+
+		for experiment in [e for e in running if e.poll()]:
+			running.remove(experiment)
+			predictions, loglik, mass = experiment.score(geometry, args.radius)
+			rows.append((experiment.name, experiment.model, experiment.seed, experiment.status,
+				time.time() - experiment.start_time, predictions, loglik, mass))
+			print "[%6.1fs] %s %s: %d predictions, loglik %.3f, mass %.3f" % (time.time() - start,
+				experiment.name, experiment.status, predictions, loglik, mass)
+
+			with open(os.path.join(args.out, "runs.csv"), "w") as f:
+				f.write("run,model,seed,status,wall_s,predictions,loglik,mass_within_%gm\n" % args.radius)
+				for row in rows:
+					f.write("%s,%s,%d,%s,%.1f,%d,%g,%g\n" % row)
+		time.sleep(0.5)
+
+	wall = time.time() - start
+	print "----------------------------------------------"
+	print "%d experiments in %.1f s (%.1f experiments/hour)" % (len(rows), wall, 3600.0*len(rows)/wall)
+	for model in args.models:
+		ll = [r[6] for r in rows if r[1] == model and not np.isnan(r[6])]
+		if ll:
+			print "	- %-10s loglik %.3f over %d runs" % (model, np.mean(ll), len(ll))
+	print "Results written to", args.out
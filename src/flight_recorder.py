@@ -0,0 +1,247 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import sys
+import json
+import time
+import threading
+import numpy as np
+
+try:
+	import Queue as queue
+except ImportError:
+	import queue
+
+"""
+Flight recorder for the prediction nodes. Every stream (poses, posteriors,
+occupancy stacks, ...) is appended to chunked binary files:
+
+	<dir>/<stream>/chunk_000000.bin   records, back to back, raw array bytes
+	<dir>/<stream>/chunk_000000.idx   float64 timestamp of every record
+	<dir>/<stream>/chunk_000000.json  dtype and shape of the records
+
+Every run of a node records into its own directory (run_directory()), since
+the stamps (e.g. simulated time) may restart between runs and a stream
+must stay sorted by time.
+
+Records of a chunk all have the same size, so a timestamp lookup in the
+index gives the record offset directly and readers memory-map only the
+chunks they touch. Writes happen on a background thread and never block
+the caller.
+
+	usage: flight_recorder.py DIR [STREAM TIME]
+"""
+
+CHUNK_NAME = "chunk_%06d"
+
+def run_directory(record_dir, name):
+	"""
+	<record_dir>/run_<start time>_<pid>/<name>, a fresh directory for this
+	run of the node even when record_dir is reused.
+	"""
+	run = "run_%s_%d" % (time.strftime("%Y%m%d_%H%M%S"), os.getpid())
+	return os.path.join(os.path.expanduser(record_dir), run, name)
+
+class StreamWriter(object):
+	"""
+	Appends records of one stream, starting a new chunk when the current one
+	is full or the record shape changes.
+	"""
+
+	def __init__(self, directory, chunk_bytes):
+		self.directory = directory
+		self.chunk_bytes = chunk_bytes
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+		# never overwrite chunks already in the directory
+		self.chunk = len([f for f in os.listdir(directory) if f.endswith(".json")])
+		self.data_file = None
+		self.index_file = None
+		self.layout = None
+		self.size = 0
+
+	def open_chunk(self, layout):
+		self.close()
+		path = os.path.join(self.directory, CHUNK_NAME % self.chunk)
+		self.chunk += 1
+		with open(path + ".json", "w") as f:
+			json.dump({"dtype": layout[0], "shape": list(layout[1])}, f)
+		self.data_file = open(path + ".bin", "ab")
+		self.index_file = open(path + ".idx", "ab")
+		self.layout = layout
+		self.size = 0
+
+	def write(self, stamp, record):
+		layout = (record.dtype.str, record.shape)
+		if layout != self.layout or self.size + record.nbytes > self.chunk_bytes:
+			self.open_chunk(layout)
+
+		# data first, so an index entry always points at a complete record
+		self.data_file.write(record.tobytes())
+		self.index_file.write(np.array([stamp], dtype="<f8").tobytes())
+		self.size += record.nbytes
+
+	def flush(self):
+		if self.data_file is not None:
+			self.data_file.flush()
+			self.index_file.flush()
+
+	def close(self):
+		if self.data_file is not None:
+			self.data_file.close()
+			self.index_file.close()
+			self.data_file = None
+			self.index_file = None
+
+class FlightRecorder(object):
+	"""
+	Records timestamped arrays into streams under a directory. record()
+	only queues a copy of the data; a background thread writes it. When the
+	queue is full records are dropped (and counted) instead of blocking.
+	"""
+
+	def __init__(self, directory, chunk_bytes=64*2**20, queue_size=1000, flush_period=1.0):
+		self.directory = directory
+		self.chunk_bytes = chunk_bytes
+		self.flush_period = flush_period
+		self.writers = {}
+		self.dropped = 0
+
+		self.queue = queue.Queue(maxsize=queue_size)
+		self.thread = threading.Thread(target=self.write_loop)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def record(self, stream, stamp, data):
+		"""
+		Queues data (anything np.asarray takes) taken at stamp (seconds).
+		"""
+		try:
+			self.queue.put_nowait((stream, float(stamp), np.array(data)))
+		except queue.Full:
+			self.dropped += 1
+
+	def write_loop(self):
+		while True:
+			try:
+				item = self.queue.get(timeout=self.flush_period)
+			except queue.Empty:
+				for writer in self.writers.values():
+					writer.flush()
+				continue
+
+			if item is None:
+				break
+			stream, stamp, data = item
+			if stream not in self.writers:
+				self.writers[stream] = StreamWriter(os.path.join(self.directory, stream), self.chunk_bytes)
+			self.writers[stream].write(stamp, data)
+
+		for writer in self.writers.values():
+			writer.close()
+
+	def close(self):
+		"""
+		Writes everything still queued and closes the files.
+		"""
+		if not self.thread.is_alive():
+			return
+		self.queue.put(None)
+		self.thread.join()
+		if self.dropped:
+			print "[flight_recorder]: dropped", self.dropped, "records, the disk could not keep up"
+
+class StreamReader(object):
+	"""
+	Time-indexed random access to one recorded stream. Only the indices are
+	read up front; records are memory-mapped on demand.
+	"""
+
+	def __init__(self, directory):
+		self.directory = directory
+		self.chunks = []
+		stamps = []
+
+		for name in sorted(f[:-5] for f in os.listdir(directory) if f.endswith(".json")):
+			path = os.path.join(directory, name)
+			with open(path + ".json") as f:
+				meta = json.load(f)
+			dtype = np.dtype(str(meta["dtype"]))
+			shape = tuple(meta["shape"])
+			record_bytes = dtype.itemsize*int(np.prod(shape))
+
+			index = np.fromfile(path + ".idx", dtype="<f8")
+			# a crash may have left a partial record or index entry behind
+			num = min(len(index), os.path.getsize(path + ".bin")//max(record_bytes, 1))
+			if num == 0:
+				continue
+			self.chunks.append({"path": path + ".bin", "dtype": dtype, "shape": shape,
+				"num": num, "data": None})
+			stamps.append(index[:num])
+
+		self.stamps = np.concatenate(stamps) if stamps else np.zeros(0)
+		self.chunk_ends = np.cumsum([c["num"] for c in self.chunks])
+
+	def __len__(self):
+		return len(self.stamps)
+
+	def chunk_data(self, chunk_idx):
+		chunk = self.chunks[chunk_idx]
+		if chunk["data"] is None:
+			chunk["data"] = np.memmap(chunk["path"], dtype=chunk["dtype"], mode="r",
+				shape=(chunk["num"],) + chunk["shape"])
+		return chunk["data"]
+
+	def record(self, idx):
+		"""
+		(stamp, record) of the idx-th record of the stream.
+		"""
+		chunk_idx = int(np.searchsorted(self.chunk_ends, idx, side="right"))
+		start = self.chunk_ends[chunk_idx-1] if chunk_idx > 0 else 0
+		return self.stamps[idx], np.array(self.chunk_data(chunk_idx)[idx - start])
+
+	def at(self, t):
+		"""
+		The latest record at or before time t, None if there is none.
+		"""
+		idx = int(np.searchsorted(self.stamps, t, side="right")) - 1
+		if idx < 0:
+			return None
+		return self.record(idx)
+
+	def window(self, t_start, t_end):
+		"""
+		Stamps and records (as a list, shapes may differ between chunks) of
+		every record with t_start <= stamp <= t_end.
+		"""
+		first = int(np.searchsorted(self.stamps, t_start, side="left"))
+		last = int(np.searchsorted(self.stamps, t_end, side="right"))
+		return self.stamps[first:last], [self.record(i)[1] for i in range(first, last)]
+
+def open_log(directory):
+	"""
+	Readers for every stream recorded under the directory.
+	"""
+	return dict((name, StreamReader(os.path.join(directory, name)))
+		for name in sorted(os.listdir(directory))
+		if os.path.isdir(os.path.join(directory, name)))
+
+if __name__ == '__main__':
+	if len(sys.argv) < 2:
+		print "usage: flight_recorder.py DIR [STREAM TIME]"
+		sys.exit(1)
+
+	if len(sys.argv) >= 4:
+		found = StreamReader(os.path.join(sys.argv[1], sys.argv[2])).at(float(sys.argv[3]))
+		if found is None:
+			print "Nothing recorded before", sys.argv[3]
+		else:
+			np.set_printoptions(precision=4, suppress=True, threshold=200)
+			print "t =", found[0]
+			print found[1]
+	else:
+		for name, stream in open_log(sys.argv[1]).items():
+			if len(stream):
+				print "%-12s %7d records  %.3f - %.3f s  shape %s" % (name, len(stream),
+					stream.stamps[0], stream.stamps[-1], stream.chunks[-1]["shape"])
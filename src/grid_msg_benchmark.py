@@ -0,0 +1,96 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import sys
+import timeit
+import numpy as np
+from io import BytesIO
+
+import rospy
+from geometry_msgs.msg import Pose, Point, Quaternion
+from crazyflie_human.msg import OccupancyGridTime, ProbabilityGrid
+
+import grid_msg_utils
+
+"""
+Microbenchmark of OccupancyGridTime encode/decode cost, comparing the old
+list()/tuple path against the numpy_msg path used by the prediction nodes.
+Needs no roscore, messages are serialized in memory.
+
+	usage: grid_msg_benchmark.py [fwd_tsteps] [repeats]
+"""
+
+def list_encode(grids, stamp, deltat, res, width, height):
+	"""
+	Encodes the grids the way grid_to_message used to: one list() per grid.
+	"""
+	timed_grid = OccupancyGridTime()
+	timed_grid.gridarray = [None]*grids.shape[0]
+	for t in range(grids.shape[0]):
+		grid_msg = ProbabilityGrid()
+		grid_msg.header.stamp = stamp + rospy.Duration(t*deltat)
+		grid_msg.header.frame_id = "/world"
+		grid_msg.resolution = res
+		grid_msg.width = width
+		grid_msg.height = height
+		grid_msg.origin = Pose(Point(0.0, 0.0, 0), Quaternion(0, 0, 0, 1))
+		grid_msg.data = list(grids[t])
+		timed_grid.gridarray[t] = grid_msg
+	buff = BytesIO()
+	timed_grid.serialize(buff)
+	return buff.getvalue()
+
+def list_decode(data, fwd_tsteps, grid_len):
+	"""
+	Decodes the grids the way the merger used to: tuples copied row by row.
+	"""
+	msg = OccupancyGridTime().deserialize(data)
+	grids = np.array([[0.0]*grid_len]*fwd_tsteps)
+	for k in range(fwd_tsteps):
+		grids[k] = msg.gridarray[k].data
+	return grids
+
+def numpy_encode(grids, stamp, deltat, res, width, height):
+	msg = grid_msg_utils.grids_to_message(grids, 0, stamp, deltat, res, width, height)
+	buff = BytesIO()
+	msg.serialize(buff)
+	return buff.getvalue()
+
+def numpy_decode(data, fwd_tsteps, grid_len):
+	msg = grid_msg_utils.NumpyOccupancyGridTime().deserialize(data)
+	return grid_msg_utils.message_to_grids(msg)
+
+def best_time(fn, repeats):
+	"""
+	Returns the best per-call time (seconds) over a few timing rounds.
+	"""
+	return min(timeit.repeat(fn, number=repeats, repeat=3))/repeats
+
+if __name__ == '__main__':
+	fwd_tsteps = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+	repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+	stamp = rospy.Time(0)
+	deltat = 0.2
+	res = 0.1464
+
+	print "----- OccupancyGridTime encode/decode, fwd_tsteps =", fwd_tsteps, "-----"
+	print "%10s %10s | %12s %12s | %12s %12s" % ("grid", "bytes",
+		"list enc ms", "numpy enc ms", "list dec ms", "numpy dec ms")
+
+	for side in [26, 52, 104, 208]:
+		grid_len = side*side
+		grids = np.random.rand(fwd_tsteps, grid_len)
+		grids /= grids.sum(axis=1, keepdims=True)
+
+		data = numpy_encode(grids, stamp, deltat, res, side, side)
+		assert data == list_encode(grids, stamp, deltat, res, side, side)
+		assert np.array_equal(numpy_decode(data, fwd_tsteps, grid_len),
+			list_decode(data, fwd_tsteps, grid_len))
+
+		list_enc = best_time(lambda: list_encode(grids, stamp, deltat, res, side, side), repeats)
+		np_enc = best_time(lambda: numpy_encode(grids, stamp, deltat, res, side, side), repeats)
+		list_dec = best_time(lambda: list_decode(data, fwd_tsteps, grid_len), repeats)
+		np_dec = best_time(lambda: numpy_decode(data, fwd_tsteps, grid_len), repeats)
+
+		print "%10s %10d | %12.3f %12.3f | %12.3f %12.3f" % ("%dx%d" % (side, side), len(data),
+			list_enc*1e3, np_enc*1e3, list_dec*1e3, np_dec*1e3)
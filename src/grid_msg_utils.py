@@ -0,0 +1,117 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import rospy
+from rospy.numpy_msg import numpy_msg
+import numpy as np
+
+from geometry_msgs.msg import Pose, Point, Quaternion
+from crazyflie_human.msg import OccupancyGridTime, OccupancySummary, ProbabilityGrid
+
+"""
+Conversions between stacks of NumPy occupancy grids and OccupancyGridTime
+messages. Publishers and subscribers should be created with
+NumpyOccupancyGridTime so the float64[] data of each ProbabilityGrid is
+written from / read into NumPy arrays directly, without ever going through
+Python lists or tuples. The wire format is unchanged, so plain
+OccupancyGridTime nodes can still talk to these topics.
+
+OccupancySummary messages carry per-cell reductions of a stack over the
+whole horizon (max probability, union mask and first time above the
+threshold), see summarize_grids.
+"""
+
+NumpyOccupancyGridTime = numpy_msg(OccupancyGridTime)
+NumpyOccupancySummary = numpy_msg(OccupancySummary)
+
+def grids_to_message(grids, object_num, stamp, deltat, res, width, height, frame_id="/world"):
+	"""
+	Converts a (fwd_tsteps) x (height x width) array of probabilities into an
+	OccupancyGridTime msg. Each ProbabilityGrid gets a view of its row of the
+	(contiguous, float64) array as its data.
+		- stamp: time of the first grid, the t-th grid is at stamp + t*deltat
+	"""
+	grids = np.ascontiguousarray(grids, dtype=np.float64)
+
+	timed_grid = NumpyOccupancyGridTime()
+	timed_grid.gridarray = [None]*grids.shape[0]
+	timed_grid.object_num = int(object_num)
+
+	# Rotated maps are not supported...
+	origin = Pose(Point(0.0, 0.0, 0), Quaternion(0, 0, 0, 1))
+
+	for t in range(grids.shape[0]):
+		grid_msg = ProbabilityGrid()
+
+		# Set up the header.
+		grid_msg.header.stamp = stamp + rospy.Duration(t*deltat)
+		grid_msg.header.frame_id = frame_id
+
+		grid_msg.resolution = res
+		grid_msg.width = width
+		grid_msg.height = height
+		grid_msg.origin = origin
+
+		# view of the doubles from 0-1, serialized by numpy_msg in one copy
+		grid_msg.data = grids[t]
+
+		timed_grid.gridarray[t] = grid_msg
+
+	return timed_grid
+
+def message_to_grids(msg):
+	"""
+	Stacks the grids of an OccupancyGridTime msg into a
+	(num grids) x (height x width) float64 array.
+	Returns None if the message has no grids.
+	"""
+	if len(msg.gridarray) == 0:
+		return None
+	return np.vstack([np.asarray(grid.data, dtype=np.float64) for grid in msg.gridarray])
+
+def summarize_grids(grids, prob_thresh):
+	"""
+	Per-cell reductions of a (num grids) x (height x width) stack:
+		- max_prob: max probability over the horizon
+		- union_mask: bit-packed (np.packbits) cells that reach prob_thresh
+		- first_step: index of the first grid reaching prob_thresh, -1 if none
+	"""
+	above = grids >= prob_thresh
+	ever = above.any(axis=0)
+	max_prob = grids.max(axis=0)
+	union_mask = np.packbits(ever)
+	first_step = np.where(ever, above.argmax(axis=0), -1).astype(np.int16)
+	return max_prob, union_mask, first_step
+
+def summary_to_message(grids, prob_thresh, object_num, stamp, deltat, res, width, height, frame_id="/world"):
+	"""
+	Summarizes a (num grids) x (height x width) stack into an
+	OccupancySummary msg, for publishers made with NumpyOccupancySummary.
+	"""
+	max_prob, union_mask, first_step = summarize_grids(grids, prob_thresh)
+
+	msg = NumpyOccupancySummary()
+	msg.header.stamp = stamp
+	msg.header.frame_id = frame_id
+	msg.resolution = res
+	msg.width = width
+	msg.height = height
+	msg.origin = Pose(Point(0.0, 0.0, 0), Quaternion(0, 0, 0, 1))
+	msg.deltat = deltat
+	msg.prob_thresh = prob_thresh
+	msg.object_num = int(object_num)
+	msg.max_prob = np.ascontiguousarray(max_prob, dtype=np.float64)
+	msg.union_mask = union_mask
+	msg.first_step = first_step
+	return msg
+
+def message_to_summary(msg):
+	"""
+	(max_prob, union mask, first_step) arrays of an OccupancySummary msg,
+	with the mask unpacked to one bool per cell.
+	"""
+	num_cells = msg.width*msg.height
+	mask = np.frombuffer(msg.union_mask, dtype=np.uint8) if isinstance(msg.union_mask, str) \
+		else np.asarray(msg.union_mask, dtype=np.uint8)
+	return (np.asarray(msg.max_prob, dtype=np.float64), 
+		np.unpackbits(mask)[:num_cells].astype(bool),
+		np.asarray(msg.first_step, dtype=np.int16))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import numpy as np
+
+"""
+Conservative coarser versions of the prediction grids, for planners that
+run at other resolutions. A coarse cell takes the max probability of every
+fine cell whose area overlaps it, so a coarse planner never sees less risk
+than the fine grid has. The fine-to-coarse cell mapping is computed once
+per level; pooling a whole stack is then one np.maximum.reduceat.
+
+Coarse grids share the fine grid's origin (cell [0, 0] is centered at the
+same point) and layout (state = x*width + y).
+"""
+
+class PyramidLevel(object):
+	"""
+	Max-pooling of (T) x (height x width) fine grids onto one coarser
+	resolution.
+	"""
+
+	def __init__(self, fine_res, fine_height, fine_width, res):
+		self.res = res
+		x_fine, x_coarse = self.overlaps(fine_res, fine_height, res)
+		y_fine, y_coarse = self.overlaps(fine_res, fine_width, res)
+		self.height = int(x_coarse.max()) + 1
+		self.width = int(y_coarse.max()) + 1
+
+		# every (fine cell, coarse cell) pair that overlaps, grouped by
+		# coarse cell
+		xi, yi = np.meshgrid(np.arange(len(x_fine)), np.arange(len(y_fine)), indexing="ij")
+		fine = (x_fine[xi]*fine_width + y_fine[yi]).ravel()
+		coarse = (x_coarse[xi]*self.width + y_coarse[yi]).ravel()
+		order = np.argsort(coarse, kind="mergesort")
+		self.fine = fine[order]
+		self.starts = np.flatnonzero(np.r_[True, np.diff(coarse[order]) > 0])
+
+	def overlaps(self, fine_res, num_fine, res):
+		"""
+		(fine index, coarse index) pairs along one axis whose cells overlap,
+		fine cell k spans [k - 0.5, k + 0.5]*fine_res and coarse cell i
+		spans [i - 0.5, i + 0.5]*res.
+		"""
+		k = np.arange(num_fine)
+		first = np.floor((k - 0.5)*fine_res/res + 0.5 + 1e-9).astype(int)
+		last = np.ceil((k + 0.5)*fine_res/res - 0.5 - 1e-9).astype(int)
+		first = np.maximum(first, 0)
+		span = last - first + 1
+		fine = np.repeat(k, span)
+		coarse = np.repeat(first, span) + np.arange(span.sum()) - np.repeat(np.cumsum(span) - span, span)
+		return fine, coarse
+
+	def pool(self, grids):
+		"""
+		(T) x (height x width) coarse grids of the fine ones.
+		"""
+		return np.maximum.reduceat(grids[:, self.fine], self.starts, axis=1)
+
+class GridPyramid(object):
+	"""
+	One PyramidLevel per coarser resolution.
+	"""
+
+	def __init__(self, res, height, width, resolutions):
+		self.levels = [PyramidLevel(res, height, width, r) for r in resolutions]
+
+	def pool(self, grids):
+		"""
+		Coarse grids of every level, finest first.
+		"""
+		return [level.pool(grids) for level in self.levels]
@@ -1,26 +1,27 @@
 #!/usr/bin/env python2.7
 from __future__ import division
 import rospy
-import sys, select, os
+import select, os
 import numpy as np
 import time
 import pickle
+import threading
 
-from std_msgs.msg import String, Float32, ColorRGBA
-from nav_msgs.msg import OccupancyGrid
-from geometry_msgs.msg import PoseStamped, Pose, Point, Quaternion, Pose2D, Vector3
+from std_msgs.msg import String, Float32, ColorRGBA, Time, Bool
+from nav_msgs.msg import OccupancyGrid, Odometry
+from geometry_msgs.msg import PoseStamped, Pose2D, Vector3
 from visualization_msgs.msg import Marker, MarkerArray
-from crazyflie_human.msg import OccupancyGridTime, ProbabilityGrid
-
-# Get the path of this file, go up two directories, and add that to our 
-# Python path so that we can import the pedestrian_prediction module.
-sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../../")
-
-from pedestrian_prediction.pp.mdp import GridWorldMDP
-from pedestrian_prediction.pp.mdp.expanded import GridWorldExpanded
-from pedestrian_prediction.pp.inference import hardmax as inf
-
-Actions = GridWorldMDP.Actions
+from crazyflie_human.msg import HumanIntent
+from crazyflie_human.srv import QueryOccupancy
+
+import grid_msg_utils
+import static_markers
+import flight_recorder
+import prediction_core
+import sim_clock
+import startup_profiler
+import posterior_checkpoint
+import region_query
 
 class HumanPrediction(object):
 	"""
@@ -33,37 +34,37 @@ class HumanPrediction(object):
 
 	def __init__(self):
 
+		# time every startup phase, from when the process started
+		self.profiler = startup_profiler.StartupProfiler("human_prediction")
+		self.profiler.add("imports", self.profiler.since_start())
+		self.profiler.add("  pedestrian_prediction", prediction_core.IMPORT_SECONDS, 
+			prediction_core.IMPORTED_AT)
+
 		# create ROS node
-		rospy.init_node('human_prediction', anonymous=True)
+		with self.profiler.phase("node init"):
+			rospy.init_node('human_prediction', anonymous=True)
 
 		# load all the prediction params and setup subscriber/publishers
 		self.load_parameters()
 		self.register_callbacks()
 
-		# make a marker array for all the goals
-		marker_array = MarkerArray()
-		for g in self.real_goals:
-			marker = self.state_to_marker(xy=g, color=self.color)
-			marker_array.markers.append(marker)
-
-		# Re-number the marker IDs
-		id = 0
-		for m in marker_array.markers:
-			m.id = id
-			id += 1
-
-		rate = rospy.Rate(100) 
-
-		while not rospy.is_shutdown():
-			# plot start/goal markers for visualization
-			self.goal_pub.publish(marker_array)
+		# the goals are known, so pay the first-inference costs now instead
+		# of when the first pose arrives
+		if rospy.get_param("pred/warm_up", True) and not rospy.is_shutdown():
+			warm_up_thread = threading.Thread(target=self.warm_up)
+			warm_up_thread.daemon = True
+			warm_up_thread.start()
+		else:
+			self.ready_pub.publish(Bool(True))
 
-			rate.sleep()
+		rospy.spin()
 
 	def load_parameters(self):
 		"""
 		Loads all the important paramters of the human sim
 		"""
+		began = time.time()
+
 		# --- simulation params ---# 
 		self.human_number = str(rospy.get_param("human_number"))
 		
@@ -80,30 +81,14 @@ class HumanPrediction(object):
 		self.human_height = rospy.get_param("pred/human_height")
 		self.prob_thresh = rospy.get_param("pred/prob_thresh")	
 
-		# hidden state volatility in HMM
-		self.epsilon_dest = rospy.get_param("pred/epsilon_dest")
-		self.epsilon_beta = rospy.get_param("pred/epsilon_beta")
-
-		# stores 2D array of size (fwd_tsteps) x (height x width) of probabilities
-		self.occupancy_grids = None
-
 		# stores list of beta values for each goal
 		self.beta_model = rospy.get_param("beta")
 		print "beta_model", self.beta_model
-		if self.beta_model == "irrational":
-			self.betas = rospy.get_param("pred/beta_irrational")
-		elif self.beta_model == "rational":
-			self.betas = rospy.get_param("pred/beta_rational")
-		elif self.beta_model == "adaptive":
-			self.betas = rospy.get_param("pred/beta_adaptive")
-		else:
+		try:
+			self.betas = prediction_core.model_betas(rospy.get_param("pred"), self.beta_model)
+		except ValueError:
 			rospy.signal_shutdown("Beta model type is not valid!")
-		
-		# stores dest x beta array with posterior prob of each beta
-		self.dest_beta_prob = None
-
-		# grid world representing the experimental environment
-		self.gridworld = GridWorldExpanded(self.sim_height, self.sim_width)
+			return
 
 		# --- real-world params ---# 
 
@@ -121,26 +106,54 @@ class HumanPrediction(object):
 		self.real_start = rospy.get_param("pred/human"+self.human_number+"_real_start")
 		self.real_goals = rospy.get_param("pred/human"+self.human_number+"_real_goals")
 
-		# (simulation) start and goal locations
-		self.sim_start = self.real_to_sim_coord(self.real_start)
-		self.sim_goals = [self.real_to_sim_coord(g) for g in self.real_goals]
-
 		# color to use to represent this human
 		self.color = rospy.get_param("pred/human"+self.human_number+"_color")
 
-		# tracks the human's state over time
-		self.real_human_traj = None
-		self.sim_human_traj = None
-
-		# store the previous time to compute deltat
-		self.prev_t = None
-		self.prev_pos = None
-
-		# get the speed of the human (meters/sec)
-		self.human_vel = rospy.get_param("pred/human_vel")
-
-		# compute the timestep (seconds/cell)
-		self.deltat = self.res/self.human_vel
+		# stamp of the measurement being processed
+		self.curr_stamp = None
+
+		# optionally record poses, posteriors and predictions (pred/record_dir)
+		self.recorder = None
+		record_dir = rospy.get_param("pred/record_dir", "")
+		if record_dir:
+			self.recorder = flight_recorder.FlightRecorder(
+				flight_recorder.run_directory(record_dir, "human"+self.human_number))
+			rospy.on_shutdown(self.recorder.close)
+
+		# set once the first prediction was published
+		self.predicted_once = False
+
+		# sequence number of the published predictions, and summed-area 
+		# tables of the latest ones for region queries
+		self.prediction_seq = 0
+		self.region_index = region_query.RegionIndex(self.real_lower, self.real_upper, 
+			self.res, self.sim_height, self.sim_width)
+
+		# optionally checkpoint the filter state (pred/checkpoint_dir) every
+		# checkpoint_period (wall s), restored on startup if fresh enough
+		self.checkpoint_path = None
+		self.checkpoint_writer = None
+		checkpoint_dir = rospy.get_param("pred/checkpoint_dir", "")
+		if checkpoint_dir:
+			self.checkpoint_path = os.path.join(os.path.expanduser(checkpoint_dir), 
+				"human"+self.human_number+".npz")
+			self.checkpoint_writer = posterior_checkpoint.CheckpointWriter(self.checkpoint_path,
+				lambda e: rospy.logwarn_throttle(10.0, "[human_prediction]: could not write checkpoint: %s" % e))
+			rospy.on_shutdown(self.checkpoint_writer.close)
+		self.checkpoint_period = rospy.get_param("pred/checkpoint_period", 1.0)
+		self.checkpoint_max_age = rospy.get_param("pred/checkpoint_max_age", 30.0)
+		self.last_checkpoint = time.time()
+
+		self.profiler.add("parameter load", time.time() - began)
+
+		# trajectory tracking and (goal, beta) inference
+		with self.profiler.phase("gridworld build"):
+			self.predictor = prediction_core.HumanPredictor({"pred": rospy.get_param("pred"), 
+				"state": rospy.get_param("state")}, self.human_number, self.betas)
+
+		if self.checkpoint_path is not None:
+			with self.profiler.phase("checkpoint restore"):
+				self.restore_checkpoint()
 
 		# TODO This is for debugging.
 		print "----- Running prediction for one human : -----"
@@ -155,20 +168,51 @@ class HumanPrediction(object):
 		"""
 		Sets up all the publishers/subscribers needed.
 		"""
-		# subscribe to the info of the human walking around the space
+		# subscribe to the info of the human walking around the space. In
+		# simulated time every pose is processed, in order, so runs replay 
+		# exactly; the simulator waits on our progress instead of us dropping poses.
+		queue_size = None if sim_clock.use_sim_time() else 1
 		self.human_sub = rospy.Subscriber('/human_pose'+self.human_number, PoseStamped, 
-											self.human_state_callback, queue_size=1)
+											self.human_state_callback, queue_size=queue_size)
+		self.progress_pub = sim_clock.progress_publisher(self.human_number)
 
 		# occupancy grid publisher & small publishers for visualizing the goals
 		self.occu_pub = rospy.Publisher('/occupancy_grid_time'+self.human_number, 
-			OccupancyGridTime, queue_size=1)
+			grid_msg_utils.NumpyOccupancyGridTime, queue_size=1)
 		self.beta_pub = rospy.Publisher('/beta_topic'+self.human_number, 
 			Float32, queue_size=1)
-		self.goal_pub = rospy.Publisher('/goal_markers'+self.human_number, MarkerArray, queue_size=10)
+
+		# compact (cell, posterior, deltat) version of the prediction, see intent_client.py
+		self.intent_pub = rospy.Publisher('/human_intent'+self.human_number, 
+			HumanIntent, queue_size=1)
+
+		# max over the horizon, union mask and first time above prob_thresh
+		self.summary_pub = rospy.Publisher('/occupancy_summary'+self.human_number, 
+			grid_msg_utils.NumpyOccupancySummary, queue_size=1)
+
+		# total predicted occupancy in boxes over time intervals
+		self.query_srv = rospy.Service('/query_occupancy'+self.human_number, QueryOccupancy, 
+			lambda request: region_query.handle_query(self.region_index, request))
+
+		# start/goal markers never move, so they are latched and only
+		# republished when their params change
+		human_prefix = "pred/human"+self.human_number
+		self.goal_pub = static_markers.LatchedMarkerPublisher('/goal_markers'+self.human_number, 
+			MarkerArray, self.goals_to_marker_array, 
+			[human_prefix+"_real_goals", human_prefix+"_color"])
+		self.start_pub = static_markers.LatchedMarkerPublisher('/start_marker'+self.human_number, 
+			Marker, lambda start: self.state_to_marker(xy=start or self.real_start, color=[0.0, 1.0, 0.0]), 
+			[human_prefix+"_real_start"])
 		self.grid_vis_pub = rospy.Publisher('/occu_grid_marker'+self.human_number, 
 			Marker, queue_size=10)
 		self.human_marker_pub = rospy.Publisher('/human_marker'+self.human_number, 
 			Marker, queue_size=10)
+		self.filter_pub = rospy.Publisher('/human_filter_state'+self.human_number, 
+			Odometry, queue_size=1)
+
+		# latched True once the predictor is warmed up and predictions come fast
+		self.ready_pub = rospy.Publisher('/prediction_ready'+self.human_number, 
+			Bool, queue_size=1, latch=True)
 
 	# ---- Inference Functionality ---- #
 
@@ -176,174 +220,95 @@ class HumanPrediction(object):
 		"""
 		Grabs the human's state from the mocap publisher
 		"""
-		curr_time = rospy.Time.now()
-		xypose = self.make_valid_state([msg.pose.position.x, msg.pose.position.y])
-
-		# if this is the first human state message, just record the time and pose
-		if self.prev_t is None:
-			self.prev_t = curr_time
-			self.prev_pos = xypose	
-			self.update_human_traj(xypose)
-			return 
-	
-		time_diff = (curr_time - self.prev_t).to_sec()
-
-		# only use measurements of the human every deltat timesteps
-		if time_diff >= self.deltat:
-
-			self.prev_t += rospy.Duration.from_sec(self.deltat) 
-
-			# get the human's current state and make sure its always a valid location
-			#xypose = self.make_valid_state([msg.pose.position.x, msg.pose.position.y])
-
-			# update the map with where the human is at the current time
-			self.update_human_traj(xypose)
-
-			s = rospy.Time().now()
-
-			# infer the new human occupancy map from the current state
-			self.infer_occupancies() 
-	
+		# every decision is keyed off the measurement's own stamp (when it has
+		# one), so runs in simulated time are reproducible
+		curr_time = rospy.Time.now() if msg.header.stamp.is_zero() else msg.header.stamp
+		self.curr_stamp = curr_time
+		xypose = self.predictor.make_valid_state([msg.pose.position.x, msg.pose.position.y])
+		if self.recorder is not None:
+			self.recorder.record("pose", curr_time.to_sec(), [msg.pose.position.x, msg.pose.position.y])
+
+		# smooth every measurement, infer the new human occupancy map every deltat
+		began = time.time()
+		predicted = self.predictor.observe(xypose, curr_time.to_sec())
+		if predicted and not self.predicted_once:
+			self.predicted_once = True
+			self.profiler.add("first inference", time.time() - began)
+			print self.profiler.report()
+		self.publish_filter_state(curr_time)
+
+		if predicted:
 			# update human pose marker
 			self.human_marker_pub.publish(self.pose_to_marker(xypose, color=self.color))
 
 			# publish occupancy grid list
-			if self.occupancy_grids is not None:
+			if self.predictor.occupancy_grids is not None:
 				self.occu_pub.publish(self.grid_to_message())
+				self.publish_summary()
+				self.publish_intent()
+				self.prediction_seq += 1
+				self.region_index.update(self.prediction_seq, self.predictor.occupancy_grids[:self.fwd_tsteps], 
+					curr_time.to_sec(), self.predictor.pred_deltat)
 				self.visualize_occugrid(3)
+				self.record_prediction(curr_time)
 
-			# adjust the deltat based on the observed measurements
-			if self.prev_pos is not None:
-				self.human_vel = np.linalg.norm((np.array(xypose) - np.array(self.prev_pos)))/time_diff
-				self.deltat = np.minimum(np.maximum(self.res/self.human_vel,0.05),0.2)
+			if self.checkpoint_path is not None and time.time() - self.last_checkpoint >= self.checkpoint_period:
+				self.save_checkpoint()
 
-			self.prev_pos = xypose	
+		# let a simulator owning the clock know this pose is done
+		self.progress_pub.publish(Time(curr_time))
 			
 
-	def make_valid_state(self, xypose):
+	def warm_up(self):
 		"""
-		Takes human state measurement, checks if its inside of the world grid, and 
-		creates a valid [x,y] position. 
-		If human is in valid [x,y] grid location, returns original xypose
-		Else if human is NOT valid, then clips the human's pose to a valid location
+		Runs a throwaway inference from the human's start on a background 
+		thread, then reports the node as ready.
 		"""
-
-		valid_xypose = [np.clip(xypose[0], self.real_lower[0], self.real_upper[0]),
-							np.clip(xypose[1], self.real_lower[1], self.real_upper[1])]		
-
-		return valid_xypose
-
-	def update_human_traj(self, newstate):
+		try:
+			with self.profiler.phase("warm-up"):
+				self.predictor.warm_up(self.real_start)
+		except Exception as e:
+			rospy.logwarn("[human_prediction]: warm-up failed, the first prediction will be slow: %s" % e)
+		self.ready_pub.publish(Bool(True))
+		print self.profiler.report()
+
+	def save_checkpoint(self):
 		"""
-		Given a new sensor measurement of where the human is, update the tracked
-		trajectory of the human's movements.
+		Hands a copy of the predictor's filter state to the checkpoint writer,
+		which atomically writes it on its own thread.
 		"""
+		self.last_checkpoint = time.time()
+		self.checkpoint_writer.submit(self.predictor.checkpoint_state())
 
-		sim_newstate = self.real_to_sim_coord(newstate)
-
-		if self.real_human_traj is None:
-			self.real_human_traj = np.array([newstate])
-			self.sim_human_traj = np.array([sim_newstate])
+	def restore_checkpoint(self):
+		"""
+		Restores the predictor's filter state from a fresh enough checkpoint
+		made with the same betas, goals and backend, if there is one.
+		"""
+		state = posterior_checkpoint.load(self.checkpoint_path, self.checkpoint_max_age)
+		if state is None:
+			return
+		if self.predictor.restore_state(state):
+			print "[human_prediction]: restored checkpoint from", \
+				"%.1f s ago" % (time.time() - float(state["saved_at"]))
 		else:
-			self.real_human_traj = np.append(self.real_human_traj, 
-												np.array([newstate]), 0)
+			print "[human_prediction]: ignoring checkpoint made with other betas, goals or backend"
 
-			# if the new measured state does not map to the same state in sim, add it
-			# to the simulated trajectory. We need this for the inference to work
-			#in_same_state = (sim_newstate == self.sim_human_traj[-1]).all()
-			#if not in_same_state:
-			self.sim_human_traj = np.append(self.sim_human_traj, 
-											np.array([sim_newstate]), 0)
-
-
-	def infer_occupancies(self):
+	def record_prediction(self, stamp):
 		"""
-		Using the current trajectory data, recompute a new occupancy grid
-		for where the human might be.
+		Hands the posterior and the published occupancy stack to the flight
+		recorder (which writes them on its own thread).
 		"""
-		if self.real_human_traj is None or self.sim_human_traj is None:
-			print "Can't infer occupancies -- human hasn't appeared yet!"
-			return 
-
-		# Get list of goals in 2D 
-		dest_list = [self.gridworld.coor_to_state(g[0], g[1]) for g in self.sim_goals]
-
-		# Convert the human trajectory points from real-world to 2D grid values. 
-		traj = [self.real_to_sim_coord(x, round_vals=False) for x in self.real_human_traj] 
-  
-  		# OPTION 1: The line below feeds in the entire human traj history so far
-  		# 			and does a single bulk Bayesian inference step.
-		# (self.occupancy_grids, self.beta_occu, self.dest_beta_prob) = inf.state.infer_joint(self.gridworld, 
-		# 	dest_list, self.betas, T=self.fwd_tsteps, use_gridless=True, traj=traj, verbose_return=True)
-
-		# OPTION 2: The line below feeds in the last human (s,a) pair and previous posterior
-		# 			and does a recursive Bayesian update.
-		(self.occupancy_grids, self.beta_occu, self.dest_beta_prob) = inf.state.infer_joint(self.gridworld, 
-			dest_list, self.betas, T=self.fwd_tsteps, use_gridless=True, priors=self.dest_beta_prob,
-			traj=traj[-2:], epsilon_dest=self.epsilon_dest, epsilon_beta=self.epsilon_beta, verbose_return=True)
+		if self.recorder is None:
+			return
+		t = stamp.to_sec()
+		self.recorder.record("posterior", t, self.predictor.dest_beta_prob)
+		self.recorder.record("betas", t, self.predictor.betas)
+		self.recorder.record("occupancy", t, self.predictor.occupancy_grids[:self.fwd_tsteps])
+		self.recorder.record("deltat", t, self.predictor.pred_deltat)
 
 	# ---- Utility Functions ---- #
 
-	def traj_to_state_action(self):
-		"""
-		Converts the measured state-based sim_human_traj into (state, action) traj.
-		"""		
-		prev = self.sim_human_traj[0]		
-		states = np.array([prev])
-		actions = None
-		for i in range(1,len(self.sim_human_traj)):
-			next = self.sim_human_traj[i]
-			# dont consider duplicates of the same measurement
-			if not np.array_equal(prev, next):
-				states = np.append(states, [next], 0)
-				curr_action = self.motion_to_action(prev, next)
-
-				if actions is None:
-					actions = np.array([curr_action])
-				else:
-					actions = np.append(actions, curr_action)			
-			prev = next
-
-		grid_states = [self.gridworld.coor_to_state(s[0], s[1]) for s in states]
-
-		sa_traj = []
-		if actions is not None:
-			for i in range(len(actions)):			
-				sa_traj.append((grid_states[i], actions[i]))
-
-		return sa_traj
-
-	def motion_to_action(self, prev_pos, next_pos):
-		"""
-		Takes two measured positions of the human (previous and next) 
-		and returns the gridworld action that the human took.
-		"""
-		xdiff = next_pos[0] - prev_pos[0]
-		ydiff = next_pos[1] - prev_pos[1]
-		if xdiff < 0:
-			if ydiff < 0:
-					action = Actions.DOWN_LEFT
-			elif ydiff == 0:	
-					action = Actions.LEFT		
-			else:
-					action = Actions.UP_LEFT
-		elif xdiff == 0:
-			if ydiff < 0:
-					action = Actions.DOWN
-			elif ydiff == 0:
-					action = Actions.ABSORB		# note this should only happen at goal
-			else:
-					action = Actions.UP
-		else:
-			if ydiff < 0:
-				action = Actions.DOWN_RIGHT
-			elif ydiff == 0:
-				action = Actions.RIGHT
-			else:
-				action = Actions.UP_RIGHT	
-
-		return action
-
 	def state_to_coor(self, state):
 		"""
 		Goes from 1D array value ot [x,y] in simulation
@@ -358,34 +323,11 @@ class HumanPrediction(object):
 		return [sim_coord[0]*self.res + self.real_lower[0], 
 				self.real_upper[1] - sim_coord[1]*self.res]
 
-	def real_to_sim_coord(self, real_coord, round_vals=True):
-		"""
-		Takes [x,y] coordinate in the ROS real frame, and returns a rotated and 
-		shifted	value in the simulation frame
-		-- round_vals: 
-					True - gives an [i,j] integer-valued grid cell entry.
-					False - gives a floating point value on the grid cell
-		"""
-		if round_vals:
-			x = round((real_coord[0] - self.real_lower[0])/self.res)
-			y = round((self.real_upper[1] - real_coord[1])/self.res)
-		else:
-			x = (real_coord[0] - self.real_lower[0])/self.res
-			y = (self.real_upper[1] - real_coord[1])/self.res
-
-		i_coord = np.minimum(self.sim_height-1, np.maximum(0.0,x));
-		j_coord = np.minimum(self.sim_width-1, np.maximum(0.0,y));
-
-		if round_vals:
-			return [int(i_coord), int(j_coord)]
-		else:
-			return [i_coord, j_coord]
-
 	def interpolate_grid(self, future_time):
 		"""
 		Interpolates the grid at some future time
 		"""
-		if self.occupancy_grids is None:
+		if self.predictor.occupancy_grids is None:
 			print "Occupancy grids are not created yet!"
 			return None
 
@@ -406,13 +348,13 @@ class HumanPrediction(object):
 	
 		if in_idx != -1:
 			# if interpolating exactly at the timestep
-			return self.occupancy_grids[in_idx]
+			return self.predictor.occupancy_grids[in_idx]
 		else:
 			prev_t = int(future_time)
 			next_t = int(future_time)+1
 
-			low_grid = self.occupancy_grids[prev_t]
-			high_grid = self.occupancy_grids[next_t]
+			low_grid = self.predictor.occupancy_grids[prev_t]
+			high_grid = self.predictor.occupancy_grids[next_t]
 
 			interpolated_grid = np.zeros((self.sim_height*self.sim_width))
 
@@ -434,7 +376,7 @@ class HumanPrediction(object):
 			rospy.loginfo_throttle(1.0, "visualize_occugrid: I'm lonely.")
 			return
 
-		if self.occupancy_grids is not None:
+		if self.predictor.occupancy_grids is not None:
 			marker = Marker()
 			marker.header.frame_id = "/world"
 			marker.header.stamp = rospy.Time.now()
@@ -478,39 +420,101 @@ class HumanPrediction(object):
 		"""
 		Converts OccupancyGridTime structure to ROS msg
 		"""
-		timed_grid = OccupancyGridTime()
-		timed_grid.gridarray = [None]*self.fwd_tsteps
-		timed_grid.object_num = int(self.human_number) 
+		grids = self.predictor.occupancy_grids[:self.fwd_tsteps]
 
-		curr_time = rospy.Time.now()
+		# Assert that all occupancies are in [0, 1] and each grid sums to 1.
+		assert grids.max() <= 1.0 +1e-8 and grids.min() >= 0.0 - 1e-8
+		assert (np.abs(grids.sum(axis=1) - 1.0) < 1e-8).all()
 
-		for t in range(self.fwd_tsteps):
-			grid_msg = ProbabilityGrid()
+		return grid_msg_utils.grids_to_message(grids, self.human_number, 
+			self.curr_stamp, self.predictor.pred_deltat, self.res, self.sim_width, self.sim_height)
 
-			# Set up the header.
-			grid_msg.header.stamp = curr_time + rospy.Duration(t*self.deltat)
-			grid_msg.header.frame_id = "/world"
+	def publish_intent(self):
+		"""
+		Publishes the human's cell, the (goal, beta) posterior and deltat (and
+		with the exact backend the inputs of the inference step), and the 
+		posterior mean of beta.
+		"""
+		dest_beta_prob = np.asarray(self.predictor.dest_beta_prob, dtype=float)
+		betas = np.asarray(self.predictor.betas, dtype=float)
+		self.beta_pub.publish(Float32(dest_beta_prob.sum(axis=0).dot(betas)/dest_beta_prob.sum()))
 
-			# .info is a nav_msgs/MapMetaData message. 
-			grid_msg.resolution = self.res
-			grid_msg.width = self.sim_width
-			grid_msg.height = self.sim_height
+		if self.intent_pub.get_num_connections() == 0:
+			return
 
-			# Rotated maps are not supported... 
-			origin_x=0.0 
-			origin_y=0.0 
-			grid_msg.origin = Pose(Point(origin_x, origin_y, 0), Quaternion(0, 0, 0, 1))
+		cell = self.predictor.sim_human_traj[-1]
+		msg = HumanIntent()
+		msg.header.stamp = self.curr_stamp
+		msg.header.frame_id = "/world"
+		msg.object_num = int(self.human_number)
+		msg.model = self.predictor.posterior_backend
+		msg.cell = int(cell[0])*self.sim_width + int(cell[1])
+		msg.deltat = self.predictor.pred_deltat
+		msg.betas = betas.tolist()
+		msg.dest_beta_prob = dest_beta_prob.ravel().tolist()
+
+		# the exact backend's grids are replayed from the step's inputs
+		step = self.predictor.last_step
+		if step is not None:
+			msg.step_goals = [int(g) for g in step["goals"]]
+			msg.step_betas = [float(b) for b in step["betas"]]
+			if step["priors"] is not None:
+				msg.step_prior = np.asarray(step["priors"], dtype=float).ravel().tolist()
+			msg.step_traj = np.asarray(step["traj"], dtype=float).ravel().tolist()
+			msg.epsilon_dest = step["epsilon_dest"]
+			msg.epsilon_beta = step["epsilon_beta"]
+		self.intent_pub.publish(msg)
+
+	def publish_summary(self):
+		"""
+		Publishes the per-cell summary of the predicted grids, if anyone listens.
+		"""
+		if self.summary_pub.get_num_connections() == 0:
+			return
 
-			# Assert that all occupancies are in [0, 1].
-			assert self.occupancy_grids[t].max() <= 1.0 +1e-8 and self.occupancy_grids[t].min() >= 0.0 - 1e-8
-			assert abs(self.occupancy_grids[t].sum() - 1.0) < 1e-8
+		self.summary_pub.publish(grid_msg_utils.summary_to_message(
+			self.predictor.occupancy_grids[:self.fwd_tsteps], self.prob_thresh, self.human_number, 
+			self.curr_stamp, self.predictor.pred_deltat, self.res, self.sim_width, self.sim_height))
 
-			# convert to list of doubles from 0-1
-			grid_msg.data = list(self.occupancy_grids[t])
+	def publish_filter_state(self, stamp):
+		"""
+		Publishes the filtered position, velocity and covariance for debugging.
+		"""
+		if self.filter_pub.get_num_connections() == 0:
+			return
 
-			timed_grid.gridarray[t] = grid_msg
- 
-		return timed_grid
+		x = self.predictor.vel_filter.x
+		P = self.predictor.vel_filter.P
+
+		odom = Odometry()
+		odom.header.stamp = stamp
+		odom.header.frame_id = "/world"
+		odom.pose.pose.position.x = x[0]
+		odom.pose.pose.position.y = x[1]
+		odom.pose.pose.orientation.w = 1.0
+		odom.twist.twist.linear.x = x[2]
+		odom.twist.twist.linear.y = x[3]
+
+		# 6x6 covariances over (x, y, z, roll, pitch, yaw), only x/y are filtered
+		pose_cov = np.zeros((6, 6))
+		pose_cov[:2, :2] = P[:2, :2]
+		twist_cov = np.zeros((6, 6))
+		twist_cov[:2, :2] = P[2:, 2:]
+		odom.pose.covariance = list(pose_cov.flatten())
+		odom.twist.covariance = list(twist_cov.flatten())
+
+		self.filter_pub.publish(odom)
+
+	def goals_to_marker_array(self, goals, color):
+		"""
+		Makes a marker array with one (uniquely numbered) marker per goal
+		"""
+		marker_array = MarkerArray()
+		for i, g in enumerate(goals or []):
+			marker = self.state_to_marker(xy=g, color=color or self.color)
+			marker.id = i
+			marker_array.markers.append(marker)
+		return marker_array
 
 	def state_to_marker(self, xy=[0,0], color=[1.0,0.0,0.0]):
 		"""
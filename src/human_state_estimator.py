@@ -1,36 +1,125 @@
-#!/usr/bin/env python  
+#!/usr/bin/env python
 import rospy
-import math
-import tf
+import re
+import tf2_ros
 import geometry_msgs.msg
-import sys
+from tf2_msgs.msg import TFMessage
 
-if __name__ == '__main__':
-	rospy.init_node('human_state_estimator')
+class HumanStateEstimator(object):
+	"""
+	This class turns mocap transforms of every /HumanN/base_link frame into
+	/human_poseN messages. It only wakes up when new transforms arrive on /tf,
+	so it does no work when nobody is in the room.
+	"""
+
+	def __init__(self):
+
+		rospy.init_node('human_state_estimator')
+
+		# load all the params and setup subscriber/publishers
+		self.load_parameters()
+		self.register_callbacks()
+
+		rospy.spin()
+
+	def load_parameters(self):
+		"""
+		Loads all the important paramters of the estimator
+		"""
+		# frame the human poses are expressed in
+		self.world_frame = rospy.get_param("~world_frame", "world").strip("/")
+
+		# max rate (Hz) at which to publish each human's pose, <= 0 publishes
+		# every transform
+		rate = rospy.get_param("~rate", 100.0)
+		self.min_period = rospy.Duration(1.0/rate) if rate > 0 else rospy.Duration(0)
+
+		# matches the mocap frames of the humans, capturing the human number
+		self.human_frame_re = re.compile(rospy.get_param("~human_frame_regex",
+			r"^/?Human(\d+)/base_link$"))
+
+		# stores everything heard on /tf so poses relative to other frames
+		# can still be expressed in the world frame
+		self.tf_buffer = tf2_ros.Buffer()
+
+		# human number -> pose publisher / stamp of the last published pose
+		self.pose_pubs = {}
+		self.last_stamps = {}
 
-	human_num = str(rospy.get_param('human_number'))
+	def register_callbacks(self):
+		"""
+		Sets up all the publishers/subscribers needed.
+		"""
+		self.tf_sub = rospy.Subscriber('/tf', TFMessage, self.tf_callback, queue_size=100)
+		self.tf_static_sub = rospy.Subscriber('/tf_static', TFMessage,
+			lambda msg: self.store_transforms(msg, is_static=True), queue_size=100)
 
-	listener = tf.TransformListener()
+	def store_transforms(self, msg, is_static=False):
+		"""
+		Adds the transforms in the message to the tf buffer.
+		"""
+		for transform in msg.transforms:
+			try:
+				if is_static:
+					self.tf_buffer.set_transform_static(transform, "human_state_estimator")
+				else:
+					self.tf_buffer.set_transform(transform, "human_state_estimator")
+			except tf2_ros.TransformException:
+				pass
 
-	pub_topic = '/human_pose'+human_num
-	pose_pub = rospy.Publisher(pub_topic, geometry_msgs.msg.PoseStamped, queue_size=1)
+	def tf_callback(self, msg):
+		"""
+		Publishes the pose of every human whose frame was just updated.
+		"""
+		self.store_transforms(msg)
 
-	rate = rospy.Rate(100.0)
-	while not rospy.is_shutdown():
-		try:
-			hat_tf = '/Human'+human_num+'/base_link'
-			(trans,rot) = listener.lookupTransform('/world', hat_tf, rospy.Time(0))
-		except (tf.LookupException, tf.ConnectivityException, tf.ExtrapolationException):
-			continue
+		for transform in msg.transforms:
+			match = self.human_frame_re.match(transform.child_frame_id)
+			if match is None:
+				continue
+
+			human_num = match.group(1)
+			stamp = transform.header.stamp
+
+			# decimate to the configured rate; a stamp going backwards (bag
+			# loop, sim clock reset) starts over instead of waiting it out
+			last_stamp = self.last_stamps.get(human_num)
+			if last_stamp is not None and rospy.Duration(0) <= stamp - last_stamp < self.min_period:
+				continue
+
+			if transform.header.frame_id.strip("/") == self.world_frame:
+				trans = transform.transform.translation
+			else:
+				try:
+					trans = self.tf_buffer.lookup_transform(self.world_frame,
+						transform.child_frame_id.strip("/"), rospy.Time(0)).transform.translation
+				except (tf2_ros.LookupException, tf2_ros.ConnectivityException,
+						tf2_ros.ExtrapolationException):
+					continue
+
+			self.last_stamps[human_num] = stamp
+			self.publish_pose(human_num, stamp, trans)
+
+	def publish_pose(self, human_num, stamp, trans):
+		"""
+		Publishes the human's position on /human_poseN, creating the publisher
+		the first time the human shows up.
+		"""
+		if human_num not in self.pose_pubs:
+			rospy.loginfo("human_state_estimator: tracking human %s", human_num)
+			self.pose_pubs[human_num] = rospy.Publisher('/human_pose'+human_num,
+				geometry_msgs.msg.PoseStamped, queue_size=1)
 
 		human_pose = geometry_msgs.msg.PoseStamped()
-		human_pose.header.frame_id="/world"
-		human_pose.header.stamp = rospy.Time.now()
-		
-		human_pose.pose.position.x = trans[0]
-		human_pose.pose.position.y = trans[1]
-		human_pose.pose.position.z = trans[2]
-
-		pose_pub.publish(human_pose)
-	
-		rate.sleep()
+		human_pose.header.frame_id = "/world"
+		human_pose.header.stamp = stamp
+
+		human_pose.pose.position.x = trans.x
+		human_pose.pose.position.y = trans.y
+		human_pose.pose.position.z = trans.z
+		human_pose.pose.orientation.w = 1.0
+
+		self.pose_pubs[human_num].publish(human_pose)
+
+if __name__ == '__main__':
+	estimator = HumanStateEstimator()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import numpy as np
+
+import particle_posterior
+
+"""
+Client side of the HumanIntent topic (/human_intentN). A HumanIntent only
+carries the human's cell, the (goal, beta) posterior and deltat, plus for
+the exact backend the inputs of the inference step; the goals and grid
+come from the params both sides share. IntentClient rebuilds the predicted
+occupancy stack from it with the model that made it (msg.model):
+	- exact: the inference step is replayed with pedestrian_prediction's
+	  infer_joint (same goals, betas, prior, trajectory points and
+	  epsilons), which gives the published grids. pedestrian_prediction
+	  caches its goal-conditioned quantities on the gridworld, so only the
+	  first messages pay for them.
+	- particle: every (goal, beta bin) hypothesis is propagated with the
+	  Boltzmann walker of particle_posterior.py and mixed by posterior
+	  weight, which gives the published grids up to float32 rounding and
+	  the skipped low-mass hypotheses. The per-hypothesis policies only
+	  depend on the goal and beta, so they are computed once and cached.
+
+	client = IntentClient(params, human_number)
+	grids = client.reconstruct(msg)   # (fwd_tsteps) x (height x width)
+"""
+
+class IntentClient(object):
+	"""
+	Rebuilds one human's occupancy grids from HumanIntent messages.
+	"""
+
+	def __init__(self, params, human_number, min_weight=1e-4, max_cached=256):
+		"""
+			- params: dict with the "pred" and "state" params (the layout
+					of config/pedestrian_pred.yaml)
+			- human_number: whose goals to use
+			- min_weight: hypotheses with less posterior mass are skipped
+						(particle model)
+			- max_cached: most (goal, beta) policies to keep
+		"""
+		pred = params["pred"]
+		self.height = int(pred["sim_height"])
+		self.width = int(pred["sim_width"])
+		self.res = pred["resolution"]
+		self.fwd_tsteps = pred["fwd_tsteps"]
+		self.min_weight = min_weight
+		self.max_cached = max_cached
+
+		# goals in grid cells, the same as HumanPredictor.real_to_sim_coord
+		# (which rounds halves up)
+		lower = params["state"]["lower"]
+		upper = params["state"]["upper"]
+		goals = np.array(pred["human"+str(human_number)+"_real_goals"], dtype=float).reshape(-1, 2)
+		self.goals = np.column_stack([
+			np.clip(np.floor((goals[:, 0] - lower[0])/self.res + 0.5), 0, self.height - 1),
+			np.clip(np.floor((upper[1] - goals[:, 1])/self.res + 0.5), 0, self.width - 1)])
+
+		self.walker = particle_posterior.BoltzmannWalker(self.height, self.width)
+		self.policy_cache = {}
+
+		# pedestrian_prediction's gridworld for the exact model, built on the
+		# first exact message
+		self.gridworld = None
+		self.dest_list = None
+
+	def policies(self, goal_idx, betas):
+		"""
+		Policies (H x S x 9) of the (goal, beta) hypotheses, computing the
+		ones not cached yet in one batch.
+		"""
+		keys = [(int(g), float(b)) for g, b in zip(goal_idx, betas)]
+		missing = [k for k in set(keys) if k not in self.policy_cache]
+		if missing:
+			if len(self.policy_cache) + len(missing) > self.max_cached:
+				self.policy_cache = {}
+			computed = self.walker.policies(self.goals[[g for g, _ in missing]], [b for _, b in missing])
+			for key, policy in zip(missing, computed):
+				self.policy_cache[key] = policy
+		return np.array([self.policy_cache[k] for k in keys])
+
+	def reconstruct(self, msg):
+		"""
+		(fwd_tsteps) x (height x width) occupancy grids of a HumanIntent msg,
+		the first at msg.header.stamp, msg.deltat apart. None if the message
+		does not match the goals or has no posterior mass.
+		"""
+		if msg.model == "exact":
+			return self.replay_step(msg)
+
+		betas = np.asarray(msg.betas, dtype=float)
+		table = np.asarray(msg.dest_beta_prob, dtype=float)
+		if len(betas) == 0 or table.size != len(self.goals)*len(betas) or not table.sum() > 0:
+			return None
+		table = table.reshape(len(self.goals), len(betas))
+
+		goal_idx, beta_idx = np.nonzero(table >= self.min_weight)
+		if len(goal_idx) == 0:
+			goal_idx, beta_idx = np.unravel_index([table.argmax()], table.shape)
+		weights = table[goal_idx, beta_idx]
+
+		grids = self.walker.propagate(self.policies(goal_idx, betas[beta_idx]), weights/weights.sum(),
+			int(msg.cell), self.fwd_tsteps)
+		return grids[:self.fwd_tsteps]
+
+	def replay_step(self, msg):
+		"""
+		Grids of an exact-model message: its inference step rerun with
+		pedestrian_prediction.
+		"""
+		goals = np.asarray(msg.step_goals, dtype=int)
+		betas = [float(b) for b in msg.step_betas]
+		if len(goals) == 0 or len(betas) == 0 or len(msg.step_traj) != 4 or \
+				goals.max() >= len(self.goals):
+			return None
+		priors = None
+		if len(msg.step_prior) > 0:
+			priors = np.asarray(msg.step_prior, dtype=float)
+			if priors.size != len(goals)*len(betas) or not priors.sum() > 0:
+				return None
+			priors = priors.reshape(len(goals), len(betas))
+		traj = np.asarray(msg.step_traj, dtype=float).reshape(2, 2).tolist()
+
+		# only exact-model clients need pedestrian_prediction
+		import prediction_core
+		if self.gridworld is None:
+			self.gridworld = prediction_core.GridWorldExpanded(self.height, self.width)
+			self.dest_list = [self.gridworld.coor_to_state(int(g[0]), int(g[1])) for g in self.goals]
+
+		grids = prediction_core.inf.state.infer_joint(self.gridworld, [self.dest_list[g] for g in goals],
+			betas, T=self.fwd_tsteps, use_gridless=True, priors=priors, traj=traj,
+			epsilon_dest=msg.epsilon_dest, epsilon_beta=msg.epsilon_beta, verbose_return=True)[0]
+		return np.asarray(grids)[:self.fwd_tsteps]
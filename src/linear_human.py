@@ -8,6 +8,8 @@ from visualization_msgs.msg import Marker
 import time
 import sys
 
+import sim_clock
+
 class LinearHuman(object):	
 	"""
 	This class simulates mocap data of a human moving around a space.
@@ -23,14 +25,17 @@ class LinearHuman(object):
 		self.load_parameters()
 		self.register_callbacks()
 
-		rate = rospy.Rate(100)
+		if sim_clock.use_sim_time() and rospy.get_param("~publish_clock", False):
+			self.run_sim_time()
+		else:
+			rate = rospy.Rate(1.0/self.dt)
 
-		while not rospy.is_shutdown():
-			t = rospy.Time.now().secs - self.start_T
-			self.update_pose(t)
-			self.state_pub.publish(self.human_pose)
-			#self.marker_pub.publish(self.pose_to_marker(color=self.color))
-			rate.sleep()
+			while not rospy.is_shutdown():
+				stamp = rospy.Time.now()
+				self.update_pose(stamp.to_sec() - self.start_T, stamp)
+				self.state_pub.publish(self.human_pose)
+				#self.marker_pub.publish(self.pose_to_marker(color=self.color))
+				rate.sleep()
 
 	def load_parameters(self):
 		"""
@@ -57,7 +62,7 @@ class LinearHuman(object):
 		# color to use to represent this human
 		self.color = rospy.get_param("pred/human"+self.human_number+"_color")
 
-		self.start_T = rospy.Time.now().secs
+		self.start_T = rospy.Time.now().to_sec()
 		self.final_T = 60.0
 		self.step_time = self.final_T/(len(self.real_goals)+1) 
 		self.waypt_times = [i*self.step_time for i in range(len(self.real_goals)+2)] # include start and end
@@ -70,13 +75,18 @@ class LinearHuman(object):
 
 		self.human_height = rospy.get_param("pred/human_height")
 
+		# simulation timestep (s)
+		self.dt = rospy.get_param("sim/dt", 0.01)
+
 		self.prev_pose = self.real_start
 
 	def register_callbacks(self):
 		"""
 		Sets up all the publishers/subscribers needed.
 		"""
-		self.state_pub = rospy.Publisher('/human_pose'+self.human_number, PoseStamped, queue_size=10)
+		# in sim time the predictor may lag a few steps behind, never drop poses
+		queue_size = 1000 if sim_clock.use_sim_time() else 10
+		self.state_pub = rospy.Publisher('/human_pose'+self.human_number, PoseStamped, queue_size=queue_size)
 		#self.marker_pub = rospy.Publisher('/human_marker'+self.human_number, Marker, queue_size=10)
 
 	def pose_to_marker(self, color=[1.0, 0.0, 0.0]):
@@ -110,7 +120,25 @@ class LinearHuman(object):
 
 		return marker
 
-	def update_pose(self, curr_time):
+	def run_sim_time(self):
+		"""
+		Owns the simulated time: publishes /clock and steps as fast as this
+		human's predictor consumes the poses (or at ~real_time_factor).
+		"""
+		if not sim_clock.wait_for_subscribers([self.state_pub]):
+			rospy.logwarn("No subscriber to the human pose, starting anyway")
+
+		clock = sim_clock.SimClock(self.dt, 
+			real_time_factor=rospy.get_param("~real_time_factor", 0.0),
+			human_numbers=[self.human_number], max_lag=rospy.get_param("~max_lag", 0.2))
+		self.start_T = clock.now.to_sec()
+
+		while not rospy.is_shutdown():
+			stamp = clock.tick()
+			self.update_pose(stamp.to_sec() - self.start_T, stamp)
+			self.state_pub.publish(self.human_pose)
+
+	def update_pose(self, curr_time, stamp):
 		"""
 		Gets the next desired position along trajectory
 		by interpolating between waypoints given the current t.
@@ -133,7 +161,7 @@ class LinearHuman(object):
 
 		self.human_pose = PoseStamped()
 		self.human_pose.header.frame_id="/frame_id_1"
-		self.human_pose.header.stamp = rospy.Time.now()
+		self.human_pose.header.stamp = stamp
 		# set the current timestamp
 		# self.human_pose.header.stamp.secs = curr_time
 		self.human_pose.pose.position.x = target_pos[0]
@@ -0,0 +1,166 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import re
+import time
+import argparse
+import itertools
+import multiprocessing
+import numpy as np
+import yaml
+
+import flight_recorder
+import prediction_core
+import prediction_evaluator
+
+"""
+Parameter sweep of the predictor. Replays recorded human trajectories (see
+flight_recorder.py) through the prediction logic, without ROS, for every
+combination of beta set, epsilon_dest, epsilon_beta and fwd_tsteps, in a
+process pool. For each setting it reports the accuracy of the predictions
+(prediction_evaluator.py) and the latency of each prediction step, and marks
+the Pareto-optimal settings.
+
+	usage: param_sweep.py RECORD_DIR [...] --betas 0.1,0.3,1,3,10 0.05
+			--epsilon-dest 0.01 0.02 0.05 --fwd-tsteps 5 10 --budget 20
+"""
+
+def find_recorded_humans(dirs):
+	"""
+	(directory, human number) of every recorded human with poses.
+	"""
+	found = []
+	for top in dirs:
+		for root, subdirs, _ in os.walk(top):
+			match = re.search(r"human(\d+)$", root.rstrip("/"))
+			if "pose" in subdirs and match:
+				found.append((root, int(match.group(1))))
+	return sorted(found)
+
+def replay(job):
+	"""
+	Replays one recorded human with one setting. Returns the setting index,
+	the accuracy Scores of the first score_steps of every prediction and the
+	latency (s) of every prediction step.
+	"""
+	setting_idx, setting, directory, human_number, base_params, score_steps, radius = job
+	betas, epsilon_dest, epsilon_beta, fwd_tsteps = setting
+
+	params = {"pred": dict(base_params["pred"]), "state": base_params["state"]}
+	params["pred"].update({"epsilon_dest": epsilon_dest, "epsilon_beta": epsilon_beta,
+		"fwd_tsteps": fwd_tsteps})
+	predictor = prediction_core.HumanPredictor(params, human_number, list(betas))
+
+	pose_stamps, poses = flight_recorder.StreamReader(os.path.join(directory, "pose")).window(-np.inf, np.inf)
+	poses = np.array(poses, dtype=float)
+
+	grids = []
+	stamps = []
+	deltats = []
+	latencies = []
+	for t, xy in zip(pose_stamps, poses):
+		start = time.time()
+		predicted = predictor.observe(predictor.make_valid_state(xy), t)
+		if predicted and predictor.occupancy_grids is not None:
+			latencies.append(time.time() - start)
+			grids.append(np.array(predictor.occupancy_grids[:score_steps]))
+			stamps.append(t)
+			deltats.append(predictor.pred_deltat)
+
+	geometry = prediction_evaluator.GridGeometry.from_config(params)
+	scores = prediction_evaluator.Scores(score_steps)
+	if grids:
+		prediction_evaluator.score_batch(scores, np.array(grids), np.array(stamps), np.array(deltats),
+			pose_stamps, poses, geometry, geometry.cell_centers(), radius)
+	return setting_idx, scores, latencies
+
+def pareto_front(accuracy, latency):
+	"""
+	Mask of the settings no other setting beats in both accuracy (higher is
+	better) and latency (lower is better).
+	"""
+	accuracy = np.asarray(accuracy)
+	latency = np.asarray(latency)
+	dominated = ((accuracy[None, :] >= accuracy[:, None]) & (latency[None, :] <= latency[:, None]) &
+		((accuracy[None, :] > accuracy[:, None]) | (latency[None, :] < latency[:, None]))).any(axis=1)
+	return ~dominated
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Sweep the prediction parameters over recorded trajectories.")
+	parser.add_argument("dirs", nargs="+", help="flight recorder directories (searched recursively)")
+	parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.realpath(__file__)),
+		"..", "config", "pedestrian_pred.yaml"), help="params with the humans' goals")
+	parser.add_argument("--betas", nargs="+", default=None,
+		help="beta sets to try, each comma separated (default: pred/beta_adaptive)")
+	parser.add_argument("--epsilon-dest", type=float, nargs="+", default=None)
+	parser.add_argument("--epsilon-beta", type=float, nargs="+", default=None)
+	parser.add_argument("--fwd-tsteps", type=int, nargs="+", default=None)
+	parser.add_argument("--radius", type=float, default=0.3, help="radius (m) for the probability mass")
+	parser.add_argument("--budget", type=float, default=None, help="latency budget (ms) of a prediction step")
+	parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+	parser.add_argument("--out", default="sweep.csv", help="csv with the results of every setting")
+	args = parser.parse_args()
+
+	with open(args.config) as f:
+		base_params = yaml.safe_load(f)
+	pred = base_params["pred"]
+
+	beta_sets = [tuple(float(b) for b in s.split(",")) for s in args.betas] if args.betas \
+		else [tuple(pred["beta_adaptive"])]
+	settings = list(itertools.product(beta_sets,
+		args.epsilon_dest or [pred["epsilon_dest"]],
+		args.epsilon_beta or [pred["epsilon_beta"]],
+		args.fwd_tsteps or [pred["fwd_tsteps"]]))
+
+	# score the same horizon for every setting so they are comparable
+	score_steps = min(s[3] for s in settings)
+
+	humans = find_recorded_humans(args.dirs)
+	print "Replaying", len(humans), "recorded humans with", len(settings), "settings..."
+
+	jobs = [(i, setting, d, h, base_params, score_steps, args.radius)
+		for i, setting in enumerate(settings) for d, h in humans]
+	scores = [prediction_evaluator.Scores(score_steps) for _ in settings]
+	latencies = [[] for _ in settings]
+
+	pool = multiprocessing.Pool(args.jobs)
+	for idx, run_scores, run_latencies in pool.imap_unordered(replay, jobs):
+		scores[idx].merge(run_scores)
+		latencies[idx] += run_latencies
+	pool.close()
+	pool.join()
+
+	rows = []
+	for setting, s, lat in zip(settings, scores, latencies):
+		n = max(s.count.sum(), 1)
+		predictions = len(lat)
+		lat = np.array(lat)*1e3 if lat else np.array([np.nan])
+		rows.append({"betas": " ".join("%g" % b for b in setting[0]), "epsilon_dest": setting[1],
+			"epsilon_beta": setting[2], "fwd_tsteps": setting[3], "predictions": predictions,
+			"loglik": s.loglik.sum()/n, "mass": s.mass.sum()/n,
+			"latency_ms": np.mean(lat), "latency_p95_ms": np.percentile(lat, 95)})
+
+	front = pareto_front([r["loglik"] for r in rows], [r["latency_p95_ms"] for r in rows])
+	columns = ["betas", "epsilon_dest", "epsilon_beta", "fwd_tsteps", "predictions",
+		"loglik", "mass", "latency_ms", "latency_p95_ms"]
+	with open(args.out, "w") as f:
+		f.write(",".join(columns + ["pareto"]) + "\n")
+		for row, optimal in zip(rows, front):
+			f.write(",".join(str(row[c]) for c in columns) + ",%d\n" % optimal)
+
+	print "----- Pareto-optimal settings (first %d steps scored) -----" % score_steps
+	print "%-24s %6s %6s %4s %9s %7s %8s %8s" % ("betas", "eps_d", "eps_b", "T",
+		"loglik", "mass", "ms", "p95 ms")
+	for row, optimal in sorted(zip(rows, front), key=lambda x: x[0]["latency_p95_ms"]):
+		if optimal:
+			print "%-24s %6g %6g %4d %9.3f %7.3f %8.2f %8.2f" % tuple(row[c] for c in columns[:4] + columns[5:])
+
+	if args.budget is not None:
+		within = [r for r in rows if r["latency_p95_ms"] <= args.budget]
+		if within:
+			best = max(within, key=lambda r: r["loglik"])
+			print "Best within %g ms: betas [%s], epsilon_dest %g, epsilon_beta %g, fwd_tsteps %d" % (
+				args.budget, best["betas"], best["epsilon_dest"], best["epsilon_beta"], best["fwd_tsteps"])
+		else:
+			print "No setting fits a", args.budget, "ms budget."
+	print "Results written to", args.out
@@ -0,0 +1,228 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import numpy as np
+
+"""
+Particle-filter backend for the (goal, beta) posterior of one human, for
+hypothesis spaces too large for the exact table. Each particle is a goal
+and a (continuous) log(beta). The human is modeled as a Boltzmann-rational
+walker on the grid: with Q(s, a) = -|a| - |goal - (s + a)| (gridless,
+Euclidean cost to go, staying only allowed at the goal), it moves with
+P(a | s) ~ exp(Q(s, a)/beta). Every step:
+	- stubborn transition: a particle switches to a random goal with
+	  probability epsilon_dest and to a random beta with epsilon_beta,
+	  otherwise its log(beta) is jittered a little
+	- the weights are multiplied by the likelihood of the observed motion,
+	  vectorized over all particles
+	- systematic resampling when the effective sample size gets low
+The occupancy prediction propagates the grid distribution of every distinct
+hypothesis (goal, beta bin) forward, vectorized, and mixes them by weight,
+so the cost scales with the particle budget and not with the number of
+goals x betas. Grids are (T+1) x (height x width) like infer_joint's, in
+the same state layout (state = x*width + y).
+"""
+
+# The 8 neighbors and staying put, (dx, dy) in cells.
+ACTIONS = np.array([[dx, dy] for dx in [-1, 0, 1] for dy in [-1, 0, 1]], dtype=float)
+STAY = 4
+
+class BoltzmannWalker(object):
+	"""
+	The Boltzmann-rational grid walker both the particle filter and the
+	intent client (intent_client.py) predict with.
+	"""
+
+	def __init__(self, height, width):
+		self.height = height
+		self.width = width
+
+		# every state's cell and where each action leads from it (moves off
+		# the grid stay put)
+		states = np.arange(height*width)
+		self.cells = np.column_stack([states // width, states % width]).astype(float)
+		targets = self.cells[:, None, :] + ACTIONS[None, :, :]
+		targets[..., 0] = np.clip(targets[..., 0], 0, height - 1)
+		targets[..., 1] = np.clip(targets[..., 1], 0, width - 1)
+		self.targets = (targets[..., 0]*width + targets[..., 1]).astype(int)
+		self.action_cost = np.sqrt((ACTIONS**2).sum(axis=1))
+
+	def q_values(self, cells, goals):
+		"""
+		Q(s, a) of every action from cells (... x 2) towards goals
+		(... x 2), shape ... x 9. Staying is only allowed at the goal.
+		"""
+		after = cells[..., None, :] + ACTIONS
+		q = -self.action_cost - np.sqrt(((goals[..., None, :] - after)**2).sum(axis=-1))
+		at_goal = ((goals - cells)**2).sum(axis=-1) < 0.25
+		q[..., STAY] = np.where(at_goal, 0.0, -np.inf)
+		return q
+
+	def log_policy(self, q, betas):
+		"""
+		log P(a | s) of the Boltzmann policy, q (... x 9) and betas (...).
+		"""
+		scaled = q/betas[..., None]
+		peak = scaled.max(axis=-1)
+		return scaled - (peak + np.log(np.exp(scaled - peak[..., None]).sum(axis=-1)))[..., None]
+
+	def policies(self, goals, betas):
+		"""
+		P(a | s) in every state for each of H hypotheses, goals (H x 2) and
+		betas (H), shape H x S x 9.
+		"""
+		q = self.q_values(self.cells[None, :, :], np.asarray(goals, dtype=float)[:, None, :])
+		return np.exp(self.log_policy(q, np.asarray(betas, dtype=float)[:, None]))
+
+	def cell_state(self, cell):
+		"""
+		The state of the grid cell nearest to cell (grid coordinates).
+		"""
+		return int(round(np.clip(cell[0], 0, self.height - 1)))*self.width + \
+			int(round(np.clip(cell[1], 0, self.width - 1)))
+
+	def propagate(self, policies, weights, start, T):
+		"""
+		(T+1) x S occupancy probabilities of a walker starting in state start 
+		whose hypotheses have the given policies (H x S x 9) and weights (H).
+		"""
+		num_hypotheses, num_states = policies.shape[:2]
+		dist = np.zeros((num_hypotheses, num_states))
+		dist[:, start] = 1.0
+		flat_targets = (np.arange(num_hypotheses)[:, None, None]*num_states + self.targets[None]).ravel()
+
+		grids = np.zeros((T + 1, num_states))
+		grids[0] = weights.dot(dist)
+		for t in range(1, T + 1):
+			dist = np.bincount(flat_targets, weights=(dist[:, :, None]*policies).ravel(),
+				minlength=num_hypotheses*num_states).reshape(num_hypotheses, num_states)
+			grids[t] = weights.dot(dist)
+		return grids
+
+class ParticlePosterior(object):
+	"""
+	Weighted particles over (goal, log beta) and the grid they predict.
+	"""
+
+	def __init__(self, height, width, goals, betas, num_particles=500, beta_bins=16,
+			min_beta=0.01, max_beta=100.0, beta_jitter=0.05, epsilon_dest=0.02,
+			epsilon_beta=0.02, seed=0):
+		"""
+			- height, width: gridworld dimensions (cells)
+			- goals: goal positions in the grid ([x, y] cells)
+			- betas: initial beta support, particles start spread over it
+			- beta_bins: log-spaced beta bins in [min_beta, max_beta] that
+						group particles into hypotheses for the prediction
+			- beta_jitter: std dev of the per-step log(beta) random walk
+		"""
+		self.height = height
+		self.width = width
+		self.goals = np.array(goals, dtype=float).reshape(-1, 2)
+		self.initial_betas = np.array(betas, dtype=float)
+		self.num_particles = num_particles
+		self.log_min = np.log(min_beta)
+		self.log_max = np.log(max_beta)
+		self.beta_jitter = beta_jitter
+		self.epsilon_dest = epsilon_dest
+		self.epsilon_beta = epsilon_beta
+		self.rng = np.random.RandomState(seed)
+
+		# log-spaced beta bins, a hypothesis uses its bin's center
+		self.bin_edges = np.linspace(self.log_min, self.log_max, beta_bins + 1)
+		self.betas = np.exp(0.5*(self.bin_edges[:-1] + self.bin_edges[1:]))
+
+		self.walker = BoltzmannWalker(height, width)
+		self.reset()
+
+	def reset(self, table=None):
+		"""
+		Draws new particles, from a (goal x beta bin) table if given (e.g. a
+		restored posterior), else uniformly over goals and initial betas.
+		"""
+		n = self.num_particles
+		if table is None:
+			self.goal_idx = self.rng.randint(len(self.goals), size=n)
+			self.log_beta = np.log(self.initial_betas[self.rng.randint(len(self.initial_betas), size=n)])
+		else:
+			table = np.asarray(table, dtype=float)
+			flat = self.rng.choice(table.size, size=n, p=table.ravel()/table.sum())
+			self.goal_idx, beta_bin = np.unravel_index(flat, table.shape)
+			self.log_beta = self.rng.uniform(self.bin_edges[beta_bin], self.bin_edges[beta_bin + 1])
+		self.weights = np.ones(n)/n
+
+	def transition(self):
+		"""
+		Stubborn goal and beta changes, and a random walk of log(beta).
+		"""
+		n = self.num_particles
+		switch_goal = self.rng.rand(n) < self.epsilon_dest
+		self.goal_idx[switch_goal] = self.rng.randint(len(self.goals), size=switch_goal.sum())
+		switch_beta = self.rng.rand(n) < self.epsilon_beta
+		self.log_beta[switch_beta] = self.rng.uniform(self.log_min, self.log_max, size=switch_beta.sum())
+		self.log_beta = np.clip(self.log_beta + self.beta_jitter*self.rng.randn(n), self.log_min, self.log_max)
+
+	def update(self, prev, curr):
+		"""
+		Bayesian update with the human's motion from prev to curr (grid
+		coordinates, not rounded). Motions much shorter than a cell carry no
+		heading and leave the weights alone.
+		"""
+		self.transition()
+
+		prev = np.asarray(prev, dtype=float)
+		motion = np.asarray(curr, dtype=float) - prev
+		if np.abs(motion).max() < 0.3:
+			return
+
+		# the grid action closest to the measured motion
+		action = int(np.argmax(ACTIONS.dot(motion)/np.maximum(self.walker.action_cost, 1e-9)))
+		q = self.walker.q_values(prev[None, :], self.goals[self.goal_idx])
+		loglik = self.walker.log_policy(q, np.exp(self.log_beta))[:, action]
+
+		logw = np.log(np.maximum(self.weights, 1e-300)) + loglik
+		if not np.isfinite(logw.max()):
+			# nothing explains the motion, start over rather than divide by 0
+			self.reset()
+			return
+		w = np.exp(logw - logw.max())
+		self.weights = w/w.sum()
+
+		if 1.0/(self.weights**2).sum() < 0.5*self.num_particles:
+			self.resample()
+
+	def resample(self):
+		"""
+		Systematic resampling.
+		"""
+		n = self.num_particles
+		positions = (self.rng.rand() + np.arange(n))/n
+		idx = np.minimum(np.searchsorted(np.cumsum(self.weights), positions), n - 1)
+		self.goal_idx = self.goal_idx[idx]
+		self.log_beta = self.log_beta[idx]
+		self.weights = np.ones(n)/n
+
+	def beta_bin(self):
+		return np.clip(np.searchsorted(self.bin_edges, self.log_beta, side="right") - 1,
+			0, len(self.betas) - 1)
+
+	def dest_beta_prob(self):
+		"""
+		The posterior as a (goal x beta bin) table.
+		"""
+		table = np.zeros((len(self.goals), len(self.betas)))
+		np.add.at(table, (self.goal_idx, self.beta_bin()), self.weights)
+		return table
+
+	def predict(self, curr, T):
+		"""
+		(T+1) x (height x width) occupancy probabilities of the human, who
+		is at curr (grid coordinates) now.
+		"""
+		# distinct (goal, beta bin) hypotheses and their total weights
+		keys = self.goal_idx*len(self.betas) + self.beta_bin()
+		hypotheses, inverse = np.unique(keys, return_inverse=True)
+		weights = np.bincount(inverse, weights=self.weights)
+		goals = self.goals[hypotheses // len(self.betas)]
+		betas = self.betas[hypotheses % len(self.betas)]
+
+		return self.walker.propagate(self.walker.policies(goals, betas), weights,
+			self.walker.cell_state(curr), T)
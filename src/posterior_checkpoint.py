@@ -0,0 +1,104 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import time
+import threading
+import numpy as np
+
+"""
+Checkpoints of a predictor's filter state ((goal, beta) posterior,
+trajectory history, adaptive deltat, ...) so a restarted prediction node
+picks up where it left off instead of re-converging from a uniform prior.
+A checkpoint is a single uncompressed .npz of named arrays. It is written
+to a temporary file that is renamed over the old checkpoint, so readers
+only ever see a complete one. CheckpointWriter does the (fsync'ed) writes
+on a background thread, off the prediction path.
+"""
+
+def save(path, arrays):
+	"""
+	Atomically writes the dict of arrays to path, stamped with the wall time.
+	"""
+	directory = os.path.dirname(path)
+	if directory and not os.path.isdir(directory):
+		os.makedirs(directory)
+
+	arrays = dict(arrays)
+	arrays["saved_at"] = np.array(time.time())
+
+	tmp_path = path + ".tmp"
+	with open(tmp_path, "wb") as f:
+		np.savez(f, **arrays)
+		f.flush()
+		os.fsync(f.fileno())
+	os.rename(tmp_path, path)
+
+def load(path, max_age):
+	"""
+	The dict of arrays saved at path, or None if there is no checkpoint, it
+	can't be read or it is older than max_age (s).
+	"""
+	if not os.path.isfile(path):
+		return None
+	try:
+		with np.load(path) as data:
+			arrays = dict((name, data[name]) for name in data.files)
+	except (IOError, OSError, ValueError):
+		return None
+
+	if "saved_at" not in arrays or time.time() - float(arrays["saved_at"]) > max_age:
+		return None
+	return arrays
+
+class CheckpointWriter(object):
+	"""
+	Saves checkpoints to one path on a background thread. Only the latest
+	submitted state is kept: if a write is still running, newer submits
+	replace the pending one instead of queueing up.
+	"""
+
+	def __init__(self, path, on_error=None):
+		"""
+			- path: checkpoint file
+			- on_error: called with the IOError/OSError of a failed write
+		"""
+		self.path = path
+		self.on_error = on_error
+		self.pending = None
+		self.closed = False
+		self.cond = threading.Condition()
+		self.thread = threading.Thread(target=self.write_loop)
+		self.thread.daemon = True
+		self.thread.start()
+
+	def submit(self, arrays):
+		"""
+		Schedules a save of a copy of the dict of arrays.
+		"""
+		snapshot = dict((name, np.array(value)) for name, value in arrays.items())
+		with self.cond:
+			self.pending = snapshot
+			self.cond.notify()
+
+	def write_loop(self):
+		while True:
+			with self.cond:
+				while self.pending is None and not self.closed:
+					self.cond.wait()
+				arrays, self.pending = self.pending, None
+			if arrays is None:
+				break
+			try:
+				save(self.path, arrays)
+			except (IOError, OSError) as e:
+				if self.on_error is not None:
+					self.on_error(e)
+
+	def close(self):
+		"""
+		Writes the pending checkpoint, if any, and stops the thread.
+		"""
+		with self.cond:
+			self.closed = True
+			self.cond.notify()
+		self.thread.join()
@@ -8,6 +8,9 @@ from crazyflie_msgs.msg import PositionVelocityStateStamped
 import time
 import sys
 
+import sim_clock
+import static_field
+
 class PotentialFieldHuman(object):
 	"""
 	This class simulates a human pedestrian with an
@@ -25,12 +28,16 @@ class PotentialFieldHuman(object):
 		self.load_parameters()
 		self.register_callbacks()
 
-		rate = rospy.Rate(100)
+		if sim_clock.use_sim_time() and rospy.get_param("~publish_clock", False):
+			self.run_sim_time()
+			return
+
+		rate = rospy.Rate(1.0/self.dt)
 
 		while not rospy.is_shutdown():
 			# get current time and update the human's pose
-			t = rospy.Time.now().secs - self.start_T
-			self.update_pose(t)
+			stamp = rospy.Time.now()
+			self.update_pose(stamp.to_sec() - self.start_T, stamp)
 			self.state_pub.publish(self.human_pose)
 
 			# publish markers for goal spread and radius
@@ -70,7 +77,7 @@ class PotentialFieldHuman(object):
 		# --- simulation params ---# 
 
 		# potential field parameters
-		self.start_T = rospy.Time.now().secs
+		self.start_T = rospy.Time.now().to_sec()
 		self.dt = rospy.get_param("sim/dt")
 		self.goal_field_spread = rospy.get_param("sim/goal_s")
 		self.obstacle_field_spread = rospy.get_param("sim/obstacle_s")
@@ -97,11 +104,26 @@ class PotentialFieldHuman(object):
 		# Dictionary mapping from robot pose topic to current pose
 		self.other_robot_poses = {}
 
+		# goals and static obstacles never move, precompute their fields
+		field_res = rospy.get_param("sim/field_res", 0.0)
+		self.goal_field = None
+		if field_res > 0:
+			self.goal_field = static_field.goal_field(self.real_goals, low, up, field_res,
+				self.alpha, self.goal_field_spread, self.goal_radius)
+		self.static_obstacles = None
+		map_image = rospy.get_param("sim/map_image", "")
+		if map_image:
+			self.static_obstacles = static_field.load_map_obstacles(map_image, low, up,
+				field_res or 0.05, self.beta, self.obstacle_field_spread,
+				rospy.get_param("sim/map_occupied_thresh", 0.2))
+
 	def register_callbacks(self):
 		"""
 		Sets up all the publishers/subscribers needed.
 		"""
-		self.state_pub = rospy.Publisher('/human_pose'+self.human_number, PoseStamped, queue_size=10)
+		# in sim time the predictor may lag a few steps behind, never drop poses
+		queue_size = 1000 if sim_clock.use_sim_time() else 10
+		self.state_pub = rospy.Publisher('/human_pose'+self.human_number, PoseStamped, queue_size=queue_size)
 
 		# Create a subscriber for each other human in the environment.
 		for ii in range(1, self.total_number_of_humans+1):
@@ -210,7 +232,25 @@ class PotentialFieldHuman(object):
 
 		return marker
 
-	def update_pose(self, curr_time):
+	def run_sim_time(self):
+		"""
+		Owns the simulated time: publishes /clock and steps as fast as this
+		human's predictor consumes the poses (or at ~real_time_factor).
+		"""
+		if not sim_clock.wait_for_subscribers([self.state_pub]):
+			rospy.logwarn("No subscriber to the human pose, starting anyway")
+
+		clock = sim_clock.SimClock(self.dt, 
+			real_time_factor=rospy.get_param("~real_time_factor", 0.0),
+			human_numbers=[self.human_number], max_lag=rospy.get_param("~max_lag", 0.2))
+		self.start_T = clock.now.to_sec()
+
+		while not rospy.is_shutdown():
+			stamp = clock.tick()
+			self.update_pose(stamp.to_sec() - self.start_T, stamp)
+			self.state_pub.publish(self.human_pose)
+
+	def update_pose(self, curr_time, stamp):
 		"""
 		Gets the next position of the human that is moving to
 		a goal, and reacting to obstacles following a potential 
@@ -224,8 +264,15 @@ class PotentialFieldHuman(object):
 		x_obs_grad = 0.0
 		y_obs_grad = 0.0
 
+		# Look up the precomputed goal and static obstacle gradients.
+		if self.goal_field is not None:
+			layers = np.arange(len(self.real_goals))
+			x_goal_grad, y_goal_grad = self.goal_field.lookup([self.prev_pose]*len(layers), layers).sum(axis=0)
+		if self.static_obstacles is not None:
+			x_obs_grad, y_obs_grad = self.static_obstacles.lookup(self.prev_pose)[0, 1:]
+
 		# Compute goal-gradient based on the distance from human to goal.
-		for goal in self.real_goals:
+		for goal in (self.real_goals if self.goal_field is None else []):
 			dist_to_goal = np.linalg.norm(np.array(goal) - np.array(self.prev_pose)) 
 			theta = np.arctan2(goal[1] - self.prev_pose[1], goal[0] - self.prev_pose[0])
 			if dist_to_goal < self.goal_radius:
@@ -280,7 +327,7 @@ class PotentialFieldHuman(object):
 		# Construct a new Pose message with the updated state.
 		self.human_pose = PoseStamped()
 		self.human_pose.header.frame_id="/frame_id_1"
-		self.human_pose.header.stamp = rospy.Time.now()
+		self.human_pose.header.stamp = stamp
 		self.human_pose.pose.position.x = self.prev_pose[0] 
 		self.human_pose.pose.position.y = self.prev_pose[1]
 		self.human_pose.pose.position.z = 0.0
@@ -0,0 +1,538 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import sys, os
+import time
+import threading
+import numpy as np
+
+# Get the path of this file, go up two directories, and add that to our 
+# Python path so that we can import the pedestrian_prediction module.
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../../")
+
+_import_start = time.time()
+from pedestrian_prediction.pp.mdp import GridWorldMDP
+from pedestrian_prediction.pp.mdp.expanded import GridWorldExpanded
+from pedestrian_prediction.pp.inference import hardmax as inf
+
+# when importing pedestrian_prediction finished and how long (s) it took, 
+# for the startup report
+IMPORTED_AT = time.time()
+IMPORT_SECONDS = IMPORTED_AT - _import_start
+
+import velocity_filter
+import beta_grid
+import particle_posterior
+
+Actions = GridWorldMDP.Actions
+
+"""
+The prediction logic of one human, without ROS: tracks the measured
+trajectory, decides when to predict (every deltat) and runs the Bayesian
+(goal, beta) inference. HumanPrediction wraps it in a ROS node, offline
+tools (e.g. param_sweep.py) replay recorded poses through it directly.
+"""
+
+def model_betas(pred_params, beta_model):
+	"""
+	The beta values of a prediction model (irrational, rational or adaptive).
+	"""
+	if beta_model not in ["irrational", "rational", "adaptive"]:
+		raise ValueError("Beta model type is not valid: "+str(beta_model))
+	return pred_params["beta_"+beta_model]
+
+class HumanPredictor(object):
+	"""
+	Predicts the motion of one human in a 2D planar environment.
+	It stores:
+		- human's tracked trajectory 
+		- occupancy grid of states human is likely to go to
+		- (goal, beta) posterior
+	"""
+
+	def __init__(self, params, human_number, betas):
+		"""
+			- params: dict with the "pred" and "state" params (the layout 
+					of config/pedestrian_pred.yaml)
+			- human_number: whose goals to use
+			- betas: beta values of the model
+		"""
+		pred = params["pred"]
+		self.human_number = str(human_number)
+		self.model_betas = list(betas)
+		self.betas = list(betas)
+
+		# optionally let the beta support points follow the posterior, with
+		# at most beta_budget of them (0 keeps the model's betas fixed); the
+		# model's lowest and highest betas always stay in the support
+		self.beta_grid = None
+		if pred.get("beta_budget", 0) and len(betas) > 1:
+			self.beta_grid = beta_grid.AdaptiveBetaGrid(int(pred["beta_budget"]),
+				min_beta=pred.get("beta_min", 0.01), max_beta=pred.get("beta_max", 100.0),
+				split_mass=pred.get("beta_split_mass", 0.5), drop_mass=pred.get("beta_drop_mass", 0.01),
+				anchors=[min(betas), max(betas)])
+
+		# measurements of gridworld
+		self.sim_height = int(pred["sim_height"])
+		self.sim_width = int(pred["sim_width"])
+
+		# resolution (m/cell)
+		self.res = pred["resolution"]
+
+		# simulation forward prediction parameters
+		self.fwd_tsteps = pred["fwd_tsteps"]
+
+		# hidden state volatility in HMM
+		self.epsilon_dest = pred["epsilon_dest"]
+		self.epsilon_beta = pred["epsilon_beta"]
+
+		# stores 2D array of size (fwd_tsteps) x (height x width) of probabilities
+		self.occupancy_grids = None
+		self.beta_occu = None
+
+		# stores dest x beta array with posterior prob of each beta
+		self.dest_beta_prob = None
+
+		# grid world representing the experimental environment
+		self.gridworld = GridWorldExpanded(self.sim_height, self.sim_width)
+
+		# the warm-up may be inferring on another thread
+		self.infer_lock = threading.Lock()
+
+		# --- real-world params ---# 
+
+		self.real_lower = params["state"]["lower"]
+		self.real_upper = params["state"]["upper"]
+
+		# (real-world) and (simulation) goal locations 
+		self.real_goals = pred["human"+self.human_number+"_real_goals"]
+		self.sim_goals = [self.real_to_sim_coord(g) for g in self.real_goals]
+
+		# goal states in the gridworld, and goal positions for the heading score
+		self.dest_list = [self.gridworld.coor_to_state(g[0], g[1]) for g in self.sim_goals]
+		self.goal_positions = np.array(self.real_goals, dtype=float).reshape(-1, 2)
+
+		# large goal catalogs: only the max_active_goals most likely goals get
+		# the full inference each step, the rest are tracked with a cheap 
+		# heading score (0 always uses every goal)
+		self.max_active_goals = int(pred.get("max_active_goals", 8))
+		self.heading_kappa = pred.get("goal_heading_kappa", 2.0)
+		self.heading_min_speed = pred.get("goal_heading_min_speed", 0.1)
+		self.active_goals = np.arange(len(self.dest_list))
+
+		# posterior backend: "exact" (goal x beta table, pedestrian_prediction)
+		# or "particle" (particle filter, for large hypothesis spaces)
+		self.particles = None
+		backend = pred.get("posterior_backend", "exact")
+		self.posterior_backend = backend
+		if backend == "particle":
+			self.particles = particle_posterior.ParticlePosterior(self.sim_height, self.sim_width,
+				self.sim_goals, self.betas, num_particles=int(pred.get("num_particles", 500)),
+				beta_bins=int(pred.get("particle_beta_bins", 16)), min_beta=pred.get("beta_min", 0.01),
+				max_beta=pred.get("beta_max", 100.0), beta_jitter=pred.get("particle_beta_jitter", 0.05),
+				epsilon_dest=self.epsilon_dest, epsilon_beta=self.epsilon_beta)
+			self.betas = list(self.particles.betas)
+		elif backend != "exact":
+			raise ValueError("Posterior backend is not valid: "+str(backend))
+
+		# tracks the human's state over time, its last max_traj_len points
+		# (inference needs at least the last two)
+		self.real_human_traj = None
+		self.sim_human_traj = None
+		self.max_traj_len = max(int(pred.get("max_traj_len", 200)), 2)
+
+		# time (s) of the last measurement used for inference
+		self.prev_t = None
+
+		# inputs of the last exact inference step (goal indices, betas, prior,
+		# trajectory points, epsilons), enough to replay it exactly elsewhere
+		# (see intent_client.py); None with the particle backend
+		self.last_step = None
+
+		# get the speed of the human (meters/sec)
+		self.human_vel = pred["human_vel"]
+
+		# compute the timestep (seconds/cell), and remember the one the 
+		# last prediction was made with
+		self.deltat = self.res/self.human_vel
+		self.pred_deltat = self.deltat
+
+		# bounds on the adaptive timestep (seconds/cell)
+		self.min_deltat = pred.get("min_deltat", 0.05)
+		self.max_deltat = pred.get("max_deltat", 0.2)
+
+		# constant-velocity Kalman filter smoothing the measured human motion,
+		# its speed (not the raw jittery poses) drives the adaptive deltat
+		self.vel_filter = velocity_filter.ConstantVelocityFilter(
+			accel_std=pred.get("filter_accel_std", 2.0),
+			meas_std=pred.get("filter_meas_std", 0.02))
+
+	def observe(self, xypose, t):
+		"""
+		Feeds a (valid) measurement of the human taken at time t (s). Every
+		measurement is filtered, but inference only runs every deltat.
+		Returns True if a new prediction was made.
+		"""
+		self.vel_filter.update(xypose, t)
+
+		# if this is the first measurement, just record the time and pose
+		if self.prev_t is None:
+			self.prev_t = t
+			self.update_human_traj(xypose)
+			return False
+
+		# only use measurements of the human every deltat timesteps
+		if t - self.prev_t < self.deltat:
+			return False
+
+		self.prev_t += self.deltat
+
+		# update the map with where the human is at the current time
+		self.update_human_traj(xypose)
+
+		# infer the new human occupancy map from the current state
+		self.infer_occupancies()
+		self.pred_deltat = self.deltat
+
+		# adjust the deltat based on the filtered speed of the human
+		self.human_vel = self.vel_filter.speed()
+		self.deltat = self.speed_to_deltat(self.human_vel)
+
+		return True
+
+	def checkpoint_state(self):
+		"""
+		The filter state worth keeping across a restart, as a dict of arrays:
+		the (goal, beta) posterior, the trajectory, the adaptive deltat and
+		speed, the current betas, and the model's betas, goals and posterior
+		backend (and beta bins) they belong to.
+		"""
+		state = {"betas": np.array(self.betas, dtype=float),
+			"model_betas": np.array(self.model_betas, dtype=float),
+			"sim_goals": np.array(self.sim_goals, dtype=float),
+			"backend": np.array(self.posterior_backend),
+			"deltat": np.array(self.deltat), "human_vel": np.array(self.human_vel)}
+		if self.particles is not None:
+			state["bin_edges"] = self.particles.bin_edges
+		if self.dest_beta_prob is not None:
+			state["dest_beta_prob"] = np.asarray(self.dest_beta_prob)
+		if self.real_human_traj is not None:
+			state["real_human_traj"] = self.real_human_traj
+			state["sim_human_traj"] = self.sim_human_traj
+		return state
+
+	def restore_state(self, state):
+		"""
+		Restores a checkpoint_state(). Returns False (and changes nothing) if
+		it was made with another beta model, other goals or another posterior
+		backend (or other beta bins), whose tables do not mean the same.
+		"""
+		if not (np.array_equal(state["model_betas"], np.array(self.model_betas, dtype=float)) and
+				np.array_equal(state["sim_goals"], np.array(self.sim_goals, dtype=float))):
+			return False
+		if str(state.get("backend", "exact")) != self.posterior_backend:
+			return False
+		if self.particles is not None and not ("bin_edges" in state and
+				state["bin_edges"].shape == self.particles.bin_edges.shape and
+				np.allclose(state["bin_edges"], self.particles.bin_edges)):
+			return False
+
+		self.betas = list(state["betas"])
+		self.dest_beta_prob = state.get("dest_beta_prob")
+		if self.particles is not None and self.dest_beta_prob is not None:
+			self.particles.reset(self.dest_beta_prob)
+		self.real_human_traj = state.get("real_human_traj")
+		self.sim_human_traj = state.get("sim_human_traj")
+		self.deltat = float(state["deltat"])
+		self.pred_deltat = self.deltat
+		self.human_vel = float(state["human_vel"])
+
+		# the next measurement restarts the timing (the clock may have been
+		# reset), so inference never pairs a stale point with a fresh one
+		self.prev_t = None
+		return True
+
+	def speed_to_deltat(self, speed):
+		"""
+		Time (s) the human takes to cross one grid cell at the given speed, 
+		clipped to [min_deltat, max_deltat].
+		"""
+		if speed <= 0:
+			return self.max_deltat
+		return float(np.clip(self.res/speed, self.min_deltat, self.max_deltat))
+
+	def make_valid_state(self, xypose):
+		"""
+		Takes human state measurement, checks if its inside of the world grid, and 
+		creates a valid [x,y] position. 
+		If human is in valid [x,y] grid location, returns original xypose
+		Else if human is NOT valid, then clips the human's pose to a valid location
+		"""
+
+		valid_xypose = [np.clip(xypose[0], self.real_lower[0], self.real_upper[0]),
+							np.clip(xypose[1], self.real_lower[1], self.real_upper[1])]		
+
+		return valid_xypose
+
+	def update_human_traj(self, newstate):
+		"""
+		Given a new sensor measurement of where the human is, update the tracked
+		trajectory of the human's movements (only its last max_traj_len points
+		are kept).
+		"""
+
+		sim_newstate = self.real_to_sim_coord(newstate)
+
+		if self.real_human_traj is None:
+			self.real_human_traj = np.array([newstate])
+			self.sim_human_traj = np.array([sim_newstate])
+		else:
+			self.real_human_traj = np.append(self.real_human_traj[-self.max_traj_len+1:], 
+												np.array([newstate]), 0)
+
+			# if the new measured state does not map to the same state in sim, add it
+			# to the simulated trajectory. We need this for the inference to work
+			#in_same_state = (sim_newstate == self.sim_human_traj[-1]).all()
+			#if not in_same_state:
+			self.sim_human_traj = np.append(self.sim_human_traj[-self.max_traj_len+1:], 
+											np.array([sim_newstate]), 0)
+
+
+	def infer_occupancies(self):
+		"""
+		Using the current trajectory data, recompute a new occupancy grid
+		for where the human might be.
+		"""
+		if self.real_human_traj is None or self.sim_human_traj is None:
+			print "Can't infer occupancies -- human hasn't appeared yet!"
+			return 
+
+		# Convert the (last two) human trajectory points from real-world to 2D grid values. 
+		traj = [self.real_to_sim_coord(x, round_vals=False) for x in self.real_human_traj[-2:]] 
+
+		if self.particles is not None:
+			self.infer_particles(traj)
+			return
+
+		if self.max_active_goals and len(self.dest_list) > self.max_active_goals:
+			self.infer_active_goals(traj)
+		else:
+			self.infer_all_goals(traj)
+
+		# move the beta support points to where the posterior is
+		if self.beta_grid is not None:
+			self.betas, self.dest_beta_prob = self.beta_grid.refine(self.betas, self.dest_beta_prob)
+
+	def infer_all_goals(self, traj):
+		"""
+		Recursive update with every goal.
+		"""
+  
+  		# OPTION 1: The line below feeds in the entire human traj history so far
+  		# 			and does a single bulk Bayesian inference step.
+		# (self.occupancy_grids, self.beta_occu, self.dest_beta_prob) = inf.state.infer_joint(self.gridworld, 
+		# 	dest_list, self.betas, T=self.fwd_tsteps, use_gridless=True, traj=traj, verbose_return=True)
+
+		# OPTION 2: The line below feeds in the last human (s,a) pair and previous posterior
+		# 			and does a recursive Bayesian update.
+		self.last_step = {"goals": np.arange(len(self.dest_list)), "betas": list(self.betas),
+			"priors": self.dest_beta_prob, "traj": traj[-2:], "epsilon_dest": self.epsilon_dest,
+			"epsilon_beta": self.epsilon_beta}
+		with self.infer_lock:
+			(self.occupancy_grids, self.beta_occu, self.dest_beta_prob) = inf.state.infer_joint(self.gridworld, 
+				self.dest_list, self.betas, T=self.fwd_tsteps, use_gridless=True, priors=self.dest_beta_prob,
+				traj=traj[-2:], epsilon_dest=self.epsilon_dest, epsilon_beta=self.epsilon_beta, verbose_return=True)
+
+	def infer_particles(self, traj):
+		"""
+		Recursive update with the particle filter backend, the posterior is
+		summarized as a (goal x beta bin) table in dest_beta_prob.
+		"""
+		with self.infer_lock:
+			self.particles.update(traj[0], traj[-1])
+			self.occupancy_grids = self.particles.predict(traj[-1], self.fwd_tsteps)
+		self.dest_beta_prob = self.particles.dest_beta_prob()
+		self.beta_occu = None
+		self.last_step = None
+
+	def infer_active_goals(self, traj):
+		"""
+		Recursive update over a large goal catalog. The full (goal, beta)
+		table is kept in dest_beta_prob, but only the top max_active_goals 
+		goals get the full Bayesian update and forward propagation:
+			1. every goal's mass is updated with a cheap heading score (how
+			   well the filtered velocity points at it), which also decides
+			   how much mass the active set as a whole gets
+			2. the most likely goals become the active set
+			3. the full inference redistributes the active set's mass 
+			   among its (goal, beta) pairs
+		Inactive goals keep their (heading-updated) mass, so they can climb 
+		back into the active set. The cost only depends on max_active_goals.
+		"""
+		num_goals = len(self.dest_list)
+		if self.dest_beta_prob is None:
+			prior = np.ones((num_goals, len(self.betas)))
+		else:
+			prior = np.asarray(self.dest_beta_prob, dtype=float)
+		goal_prob = prior.sum(axis=1)
+		beta_given_goal = prior/np.maximum(goal_prob[:, None], 1e-300)
+
+		# stubborn-goal noise over the whole catalog, so no goal dies out (the
+		# active set's update below does not add it a second time)
+		goal_prob = goal_prob/goal_prob.sum()
+		goal_prob = (1 - self.epsilon_dest)*goal_prob + self.epsilon_dest/num_goals
+
+		posterior_goal_prob = goal_prob*self.heading_likelihood()
+		posterior_goal_prob /= posterior_goal_prob.sum()
+
+		active = self.select_active_goals(posterior_goal_prob, self.real_human_traj[-1])
+		active_prior = goal_prob[active, None]*beta_given_goal[active]
+		active_prior /= active_prior.sum()
+
+		self.last_step = {"goals": active, "betas": list(self.betas), "priors": active_prior,
+			"traj": traj[-2:], "epsilon_dest": 0.0, "epsilon_beta": self.epsilon_beta}
+		with self.infer_lock:
+			(self.occupancy_grids, self.beta_occu, active_posterior) = inf.state.infer_joint(self.gridworld, 
+				[self.dest_list[g] for g in active], self.betas, T=self.fwd_tsteps, use_gridless=True, 
+				priors=active_prior, traj=traj[-2:], epsilon_dest=0.0, 
+				epsilon_beta=self.epsilon_beta, verbose_return=True)
+
+		dest_beta_prob = posterior_goal_prob[:, None]*beta_given_goal
+		dest_beta_prob[active] = np.asarray(active_posterior)*posterior_goal_prob[active].sum()
+		self.dest_beta_prob = dest_beta_prob
+		self.active_goals = active
+
+	def heading_likelihood(self):
+		"""
+		Cheap likelihood of every goal given the human's filtered heading, 
+		exp(kappa*(cos(angle to goal) - 1)). Uninformative (all ones) while
+		the human is (nearly) standing still.
+		"""
+		position = self.vel_filter.position()
+		velocity = self.vel_filter.velocity()
+		if velocity is None or np.linalg.norm(velocity) < self.heading_min_speed:
+			return np.ones(len(self.goal_positions))
+
+		to_goal = self.goal_positions - position
+		dist = np.sqrt((to_goal**2).sum(axis=1))
+		cos = to_goal.dot(velocity)/(np.maximum(dist, 1e-9)*np.linalg.norm(velocity))
+		# the human is already at these goals
+		cos[dist < self.res] = 1.0
+		return np.exp(self.heading_kappa*(cos - 1.0))
+
+	def select_active_goals(self, goal_prob, xypose):
+		"""
+		Indices of the max_active_goals most likely goals, ties broken by
+		distance to the human.
+		"""
+		dist = ((self.goal_positions - np.asarray(xypose, dtype=float))**2).sum(axis=1)
+		return np.sort(np.lexsort((dist, -goal_prob))[:self.max_active_goals])
+
+	def warm_up(self, xypose):
+		"""
+		Runs one throwaway inference for a human standing at xypose, so the
+		goal-conditioned quantities pedestrian_prediction computes and caches 
+		on the gridworld (and every other first-call cost) are paid before the
+		first pose arrives. Only needs the goals; the posterior, trajectory 
+		and predictions are left untouched. Safe to run on another thread.
+		"""
+		if self.particles is not None:
+			with self.infer_lock:
+				self.particles.predict(self.real_to_sim_coord(self.make_valid_state(xypose)), self.fwd_tsteps)
+			return
+
+		dest_list = self.dest_list
+		if self.max_active_goals and len(dest_list) > self.max_active_goals:
+			# the goals closest to the start are the first active set
+			active = self.select_active_goals(np.ones(len(dest_list)), xypose)
+			dest_list = [dest_list[g] for g in active]
+
+		sim_pose = self.real_to_sim_coord(self.make_valid_state(xypose), round_vals=False)
+		with self.infer_lock:
+			inf.state.infer_joint(self.gridworld, dest_list, self.betas, T=self.fwd_tsteps,
+				use_gridless=True, traj=[sim_pose, sim_pose], epsilon_dest=self.epsilon_dest,
+				epsilon_beta=self.epsilon_beta, verbose_return=True)
+
+	# ---- Utility Functions ---- #
+
+	def traj_to_state_action(self):
+		"""
+		Converts the measured state-based sim_human_traj into (state, action) traj.
+		"""		
+		prev = self.sim_human_traj[0]		
+		states = np.array([prev])
+		actions = None
+		for i in range(1,len(self.sim_human_traj)):
+			next = self.sim_human_traj[i]
+			# dont consider duplicates of the same measurement
+			if not np.array_equal(prev, next):
+				states = np.append(states, [next], 0)
+				curr_action = self.motion_to_action(prev, next)
+
+				if actions is None:
+					actions = np.array([curr_action])
+				else:
+					actions = np.append(actions, curr_action)			
+			prev = next
+
+		grid_states = [self.gridworld.coor_to_state(s[0], s[1]) for s in states]
+
+		sa_traj = []
+		if actions is not None:
+			for i in range(len(actions)):			
+				sa_traj.append((grid_states[i], actions[i]))
+
+		return sa_traj
+
+	def motion_to_action(self, prev_pos, next_pos):
+		"""
+		Takes two measured positions of the human (previous and next) 
+		and returns the gridworld action that the human took.
+		"""
+		xdiff = next_pos[0] - prev_pos[0]
+		ydiff = next_pos[1] - prev_pos[1]
+		if xdiff < 0:
+			if ydiff < 0:
+					action = Actions.DOWN_LEFT
+			elif ydiff == 0:	
+					action = Actions.LEFT		
+			else:
+					action = Actions.UP_LEFT
+		elif xdiff == 0:
+			if ydiff < 0:
+					action = Actions.DOWN
+			elif ydiff == 0:
+					action = Actions.ABSORB		# note this should only happen at goal
+			else:
+					action = Actions.UP
+		else:
+			if ydiff < 0:
+				action = Actions.DOWN_RIGHT
+			elif ydiff == 0:
+				action = Actions.RIGHT
+			else:
+				action = Actions.UP_RIGHT	
+
+		return action
+
+	def real_to_sim_coord(self, real_coord, round_vals=True):
+		"""
+		Takes [x,y] coordinate in the ROS real frame, and returns a rotated and 
+		shifted	value in the simulation frame
+		-- round_vals: 
+					True - gives an [i,j] integer-valued grid cell entry.
+					False - gives a floating point value on the grid cell
+		"""
+		if round_vals:
+			x = round((real_coord[0] - self.real_lower[0])/self.res)
+			y = round((self.real_upper[1] - real_coord[1])/self.res)
+		else:
+			x = (real_coord[0] - self.real_lower[0])/self.res
+			y = (self.real_upper[1] - real_coord[1])/self.res
+
+		i_coord = np.minimum(self.sim_height-1, np.maximum(0.0,x));
+		j_coord = np.minimum(self.sim_width-1, np.maximum(0.0,y));
+
+		if round_vals:
+			return [int(i_coord), int(j_coord)]
+		else:
+			return [i_coord, j_coord]
@@ -0,0 +1,236 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import argparse
+import multiprocessing
+import numpy as np
+import yaml
+
+import flight_recorder
+
+"""
+Offline accuracy of the recorded predictions (see flight_recorder.py). For
+every prediction and every horizon step k, the human's true position at
+t + k*deltat is interpolated from the recorded poses and scored with:
+	- log-likelihood of the true cell
+	- probability mass within a radius of the true position
+	- calibration: predicted cell probabilities vs. how often such cells
+	  held the human
+Scoring is vectorized over batches of predictions within a run, and runs
+are scored in parallel.
+
+	usage: prediction_evaluator.py RECORD_DIR [RECORD_DIR ...] --out eval/
+"""
+
+# Edges of the calibration bins over predicted cell probabilities, most
+# cells have tiny probabilities so the low end is finer.
+CALIBRATION_EDGES = np.array([0.0, 1e-4, 1e-3, 1e-2, 0.05, 0.1, 0.2, 0.3, 0.4,
+	0.5, 0.6, 0.7, 0.8, 0.9, 1.0 + 1e-9])
+
+class GridGeometry(object):
+	"""
+	Mapping between real-world positions and grid states, the same as
+	HumanPrediction.real_to_sim_coord and coor_to_state.
+	"""
+
+	def __init__(self, lower, upper, res, height, width):
+		self.lower = lower
+		self.upper = upper
+		self.res = res
+		self.height = height
+		self.width = width
+
+	@classmethod
+	def from_config(cls, config):
+		return cls(config["state"]["lower"], config["state"]["upper"],
+			config["pred"]["resolution"], int(config["pred"]["sim_height"]),
+			int(config["pred"]["sim_width"]))
+
+	def to_state(self, points):
+		"""
+		Grid state of every real-world [x,y] point (... x 2).
+		"""
+		x = np.clip(np.round((points[..., 0] - self.lower[0])/self.res), 0, self.height - 1)
+		y = np.clip(np.round((self.upper[1] - points[..., 1])/self.res), 0, self.width - 1)
+		return (x*self.width + y).astype(int)
+
+	def cell_centers(self):
+		"""
+		Real-world position (S x 2) of every grid state.
+		"""
+		states = np.arange(self.height*self.width)
+		return np.column_stack([(states // self.width)*self.res + self.lower[0],
+			self.upper[1] - (states % self.width)*self.res])
+
+class Scores(object):
+	"""
+	Sums of the per-horizon scores, so runs can be merged.
+	"""
+
+	def __init__(self, horizon):
+		nbins = len(CALIBRATION_EDGES) - 1
+		self.count = np.zeros(horizon)
+		self.loglik = np.zeros(horizon)
+		self.mass = np.zeros(horizon)
+		self.calib_count = np.zeros((horizon, nbins))
+		self.calib_prob = np.zeros((horizon, nbins))
+		self.calib_hits = np.zeros((horizon, nbins))
+
+	def horizon(self):
+		return len(self.count)
+
+	def merge(self, other):
+		"""
+		Adds the other scores into these, growing the horizon if needed.
+		"""
+		grow = other.horizon() - self.horizon()
+		for name in ["count", "loglik", "mass", "calib_count", "calib_prob", "calib_hits"]:
+			values = getattr(self, name)
+			if grow > 0:
+				values = np.concatenate([values, np.zeros((grow,) + values.shape[1:])])
+				setattr(self, name, values)
+			values[:other.horizon()] += getattr(other, name)
+
+	def rows(self):
+		"""
+		(k, count, mean log-likelihood, mean mass within radius) per horizon step.
+		"""
+		n = np.maximum(self.count, 1)
+		return [(k, int(self.count[k]), self.loglik[k]/n[k], self.mass[k]/n[k])
+			for k in range(self.horizon()) if self.count[k] > 0]
+
+def score_batch(scores, grids, stamps, deltats, pose_stamps, poses, geometry, cells, radius):
+	"""
+	Scores a batch of predictions: grids (B x T x S) made at stamps (B) with
+	timesteps deltats (B), against the recorded poses.
+	"""
+	horizon = grids.shape[1]
+	future = stamps[:, None] + np.arange(horizon)[None, :]*deltats[:, None]
+	valid = (future >= pose_stamps[0]) & (future <= pose_stamps[-1])
+
+	true_xy = np.dstack([np.interp(future, pose_stamps, poses[:, 0]),
+		np.interp(future, pose_stamps, poses[:, 1])])
+	true_state = geometry.to_state(true_xy)
+
+	# log-likelihood of the true cell
+	batch, step = np.meshgrid(np.arange(len(grids)), np.arange(horizon), indexing="ij")
+	p_true = grids[batch, step, true_state]
+	loglik = np.log(np.maximum(p_true, 1e-12))
+
+	# probability mass within the radius of the true position
+	dist2 = ((cells[None, None] - true_xy[:, :, None, :])**2).sum(axis=3)
+	mass = (grids*(dist2 <= radius**2)).sum(axis=2)
+
+	scores.count += valid.sum(axis=0)
+	scores.loglik += (loglik*valid).sum(axis=0)
+	scores.mass += (mass*valid).sum(axis=0)
+
+	# calibration, binned per horizon step
+	nbins = len(CALIBRATION_EDGES) - 1
+	bins = np.clip(np.digitize(grids, CALIBRATION_EDGES) - 1, 0, nbins - 1)
+	hits = np.zeros(grids.shape)
+	hits[batch, step, true_state] = 1.0
+	keys = (np.arange(horizon)[None, :, None]*nbins + bins)[valid]
+	size = horizon*nbins
+	scores.calib_count += np.bincount(keys.ravel(), minlength=size).reshape(horizon, nbins)
+	scores.calib_prob += np.bincount(keys.ravel(), weights=grids[valid].ravel(),
+		minlength=size).reshape(horizon, nbins)
+	scores.calib_hits += np.bincount(keys.ravel(), weights=hits[valid].ravel(),
+		minlength=size).reshape(horizon, nbins)
+
+def score_run(job):
+	"""
+	Scores every prediction recorded in one human's directory. Returns
+	(directory, Scores), Scores is None if there is nothing to score.
+	"""
+	directory, geometry, radius, batch_size = job
+	log = flight_recorder.open_log(directory)
+	if not all(name in log and len(log[name]) for name in ["pose", "occupancy", "deltat"]):
+		return directory, None
+
+	pose_stamps, poses = log["pose"].window(-np.inf, np.inf)
+	poses = np.array(poses, dtype=float)
+	deltat_stamps, deltats = log["deltat"].window(-np.inf, np.inf)
+	deltats = np.array(deltats, dtype=float).ravel()
+
+	occupancy = log["occupancy"]
+	cells = geometry.cell_centers()
+	scores = None
+	for first in range(0, len(occupancy), batch_size):
+		idx = range(first, min(first + batch_size, len(occupancy)))
+		grids = np.array([occupancy.record(i)[1] for i in idx])
+		stamps = occupancy.stamps[first:first + len(idx)]
+		if scores is None:
+			scores = Scores(grids.shape[1])
+
+		# the deltat recorded with each prediction
+		d = np.clip(np.searchsorted(deltat_stamps, stamps, side="right") - 1, 0, len(deltats) - 1)
+		score_batch(scores, grids, stamps, deltats[d], pose_stamps, poses, geometry, cells, radius)
+
+	return directory, scores
+
+def find_runs(dirs):
+	"""
+	Every directory holding a recorded human (pose and occupancy streams).
+	"""
+	runs = []
+	for top in dirs:
+		for root, subdirs, _ in os.walk(top):
+			if "pose" in subdirs and "occupancy" in subdirs:
+				runs.append(root)
+	return sorted(runs)
+
+def write_results(out_dir, results, total, radius):
+	if not os.path.isdir(out_dir):
+		os.makedirs(out_dir)
+
+	with open(os.path.join(out_dir, "horizon.csv"), "w") as f:
+		f.write("run,k,count,loglik,mass_within_%gm\n" % radius)
+		for run, scores in results + [("all", total)]:
+			for row in scores.rows():
+				f.write("%s,%d,%d,%g,%g\n" % ((run,) + row))
+
+	with open(os.path.join(out_dir, "calibration.csv"), "w") as f:
+		f.write("k,bin_low,bin_high,count,mean_predicted,observed_freq\n")
+		for k in range(total.horizon()):
+			for b in range(len(CALIBRATION_EDGES) - 1):
+				n = total.calib_count[k, b]
+				if n > 0:
+					f.write("%d,%g,%g,%d,%g,%g\n" % (k, CALIBRATION_EDGES[b], CALIBRATION_EDGES[b+1],
+						n, total.calib_prob[k, b]/n, total.calib_hits[k, b]/n))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Score recorded predictions against where the humans went.")
+	parser.add_argument("dirs", nargs="+", help="flight recorder directories (searched recursively)")
+	parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.realpath(__file__)),
+		"..", "config", "pedestrian_pred.yaml"), help="params the predictions were made with")
+	parser.add_argument("--radius", type=float, default=0.3, help="radius (m) for the probability mass")
+	parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+	parser.add_argument("--batch", type=int, default=256, help="predictions scored at once")
+	parser.add_argument("--out", default="eval", help="directory for the csv results")
+	args = parser.parse_args()
+
+	with open(args.config) as f:
+		geometry = GridGeometry.from_config(yaml.safe_load(f))
+
+	runs = find_runs(args.dirs)
+	print "Scoring", len(runs), "recorded humans..."
+	pool = multiprocessing.Pool(args.jobs)
+	jobs = [(run, geometry, args.radius, args.batch) for run in runs]
+	results = [(run, s) for run, s in pool.imap(score_run, jobs) if s is not None]
+	pool.close()
+	pool.join()
+
+	if not results:
+		print "Nothing to score."
+	else:
+		total = Scores(1)
+		for _, scores in results:
+			total.merge(scores)
+		write_results(args.out, results, total, args.radius)
+
+		print "----------------------------------------------"
+		print "%4s %9s %10s %14s" % ("k", "count", "loglik", "mass <%gm" % args.radius)
+		for k, n, ll, mass in total.rows():
+			print "%4d %9d %10.3f %14.3f" % (k, n, ll, mass)
+		print "Results written to", args.out
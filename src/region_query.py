@@ -0,0 +1,137 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import threading
+import numpy as np
+
+"""
+Total predicted occupancy inside real-world boxes over time intervals. A
+published (fwd_tsteps) x (height x width) stack is turned into a summed-area
+table, cumulative over time and both grid axes, so any box x time-interval
+sum is 8 lookups. Queries come in batches and are answered with array
+indexing only. Tables are built on the first query of a prediction and
+kept for its sequence number.
+
+The prediction and merge nodes answer the QueryOccupancy service with
+RegionIndex; other nodes can keep their own RegionIndex of the grids they
+receive, or call the service with query_service().
+"""
+
+class SummedAreaTable(object):
+	"""
+	Prefix sums of a (T) x (height x width) stack, zero-padded so that
+	table[t, x, y] is the sum over steps < t, rows < x and columns < y.
+	"""
+
+	def __init__(self, grids, height, width):
+		grids = np.asarray(grids, dtype=np.float64).reshape(-1, height, width)
+		self.table = np.zeros((grids.shape[0] + 1, height + 1, width + 1))
+		self.table[1:, 1:, 1:] = grids.cumsum(axis=0).cumsum(axis=1).cumsum(axis=2)
+
+	def query(self, t0, t1, x0, x1, y0, y1):
+		"""
+		Sums over the half-open index ranges [t0, t1) x [x0, x1) x [y0, y1),
+		all arrays of the same shape (empty ranges sum to 0).
+		"""
+		t1 = np.maximum(t0, t1)
+		x1 = np.maximum(x0, x1)
+		y1 = np.maximum(y0, y1)
+		s = self.table
+		return (s[t1, x1, y1] - s[t0, x1, y1] - s[t1, x0, y1] - s[t1, x1, y0]
+			+ s[t0, x0, y1] + s[t0, x1, y0] + s[t1, x0, y0] - s[t0, x0, y0])
+
+class RegionIndex(object):
+	"""
+	Answers batched region queries against the most recent predictions,
+	keyed by their sequence numbers. Thread-safe (services run on their
+	own threads).
+	"""
+
+	def __init__(self, lower, upper, res, height, width, keep=4):
+		"""
+			- lower, upper: real-world bounds, as in state/lower and upper
+			- res, height, width: the prediction grid
+			- keep: how many of the latest predictions stay queryable
+		"""
+		self.lower = lower
+		self.upper = upper
+		self.res = res
+		self.height = height
+		self.width = width
+		self.keep = keep
+		self.predictions = {}
+		self.latest = 0
+		self.lock = threading.Lock()
+
+	def update(self, seq, grids, stamp, deltat):
+		"""
+		Registers prediction seq: grids (T x (height x width)), the first at
+		stamp (s), deltat (s) apart. Its table is only built when queried.
+		"""
+		with self.lock:
+			self.predictions[seq] = {"grids": grids, "stamp": stamp, "deltat": deltat, "table": None}
+			self.latest = seq
+			for old in sorted(self.predictions)[:-self.keep]:
+				del self.predictions[old]
+
+	def query(self, boxes, t_start, t_end, seq=0):
+		"""
+		Sum of the predicted occupancy inside every box [x_min, y_min, x_max,
+		y_max] (N x 4, meters) over the grids whose times fall in
+		[t_start, t_end] (N, absolute seconds), using prediction seq (0 for
+		the latest). Returns (seq, N sums), or (seq, None) if that
+		prediction is not available.
+		"""
+		with self.lock:
+			seq = seq or self.latest
+			prediction = self.predictions.get(seq)
+			if prediction is None:
+				return seq, None
+			if prediction["table"] is None:
+				prediction["table"] = SummedAreaTable(prediction["grids"], self.height, self.width)
+
+		boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+		t_start = np.asarray(t_start, dtype=float).ravel()
+		t_end = np.asarray(t_end, dtype=float).ravel()
+		table = prediction["table"]
+		num_steps = table.table.shape[0] - 1
+
+		# grid steps within the interval
+		t0 = np.clip(np.ceil((t_start - prediction["stamp"])/prediction["deltat"] - 1e-9), 0, num_steps)
+		t1 = np.clip(np.floor((t_end - prediction["stamp"])/prediction["deltat"] + 1e-9) + 1, 0, num_steps)
+
+		# cells whose centers are inside the box: x = lower_x + i*res, y = upper_y - j*res
+		x0 = np.clip(np.ceil((boxes[:, 0] - self.lower[0])/self.res - 1e-9), 0, self.height)
+		x1 = np.clip(np.floor((boxes[:, 2] - self.lower[0])/self.res + 1e-9) + 1, 0, self.height)
+		y0 = np.clip(np.ceil((self.upper[1] - boxes[:, 3])/self.res - 1e-9), 0, self.width)
+		y1 = np.clip(np.floor((self.upper[1] - boxes[:, 1])/self.res + 1e-9) + 1, 0, self.width)
+
+		ranges = [r.astype(int) for r in [t0, t1, x0, x1, y0, y1]]
+		return seq, table.query(*ranges)
+
+def query_service(service_name, boxes, t_start, t_end, seq=0, timeout=None):
+	"""
+	Calls a QueryOccupancy service. Returns (seq, N sums), the sums are None
+	if the prediction was not available.
+	"""
+	import rospy
+	from crazyflie_human.srv import QueryOccupancy
+
+	boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+	rospy.wait_for_service(service_name, timeout=timeout)
+	response = rospy.ServiceProxy(service_name, QueryOccupancy)(seq=seq,
+		x_min=boxes[:, 0], y_min=boxes[:, 1], x_max=boxes[:, 2], y_max=boxes[:, 3],
+		t_start=np.asarray(t_start, dtype=float).ravel(), t_end=np.asarray(t_end, dtype=float).ravel())
+	if len(response.occupancy) != len(boxes):
+		return response.seq, None
+	return response.seq, np.asarray(response.occupancy)
+
+def handle_query(index, request):
+	"""
+	Answers a QueryOccupancy request with a RegionIndex, for the nodes
+	serving it.
+	"""
+	from crazyflie_human.srv import QueryOccupancyResponse
+
+	boxes = np.column_stack([request.x_min, request.y_min, request.x_max, request.y_max])
+	seq, sums = index.query(boxes, request.t_start, request.t_end, request.seq)
+	return QueryOccupancyResponse(seq=seq, occupancy=[] if sums is None else sums.tolist())
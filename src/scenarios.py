@@ -0,0 +1,128 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import colorsys
+import yaml
+import numpy as np
+
+"""
+Generates reproducible multi-human scenarios: seeded starts and goals inside
+the experimental space, written out as a params yaml (same layout as
+config/pedestrian_pred.yaml) and a launch file running the crowd simulator,
+one predictor per human and the multi-human merger.
+"""
+
+def default_config_path():
+	return os.path.join(os.path.dirname(os.path.realpath(__file__)),
+		"..", "config", "pedestrian_pred.yaml")
+
+def load_config(path=None):
+	with open(path or default_config_path()) as f:
+		return yaml.safe_load(f)
+
+def sample_scenario(num_humans, lower, upper, seed=0, num_goals=1, margin=0.2,
+		min_goal_dist=1.0, min_separation=0.5, max_tries=1000):
+	"""
+	Samples a start and num_goals goals for every human, uniformly inside
+	[lower + margin, upper - margin] (x, y only). Starts are at least
+	min_separation apart and every goal is at least min_goal_dist from its
+	human's start. The constraints are relaxed when the space is too crowded
+	to satisfy them. Returns (starts, goals) as lists of [x,y] / [[x,y],..].
+	"""
+	rng = np.random.RandomState(seed)
+	low = np.array(lower[:2], dtype=float) + margin
+	up = np.array(upper[:2], dtype=float) - margin
+
+	starts = []
+	goals = []
+	for _ in range(num_humans):
+		separation = min_separation
+		for tries in range(max_tries):
+			start = rng.uniform(low, up)
+			if all(np.linalg.norm(start - np.array(s)) >= separation for s in starts):
+				break
+			# the space is full, gradually accept closer starts
+			if tries % 100 == 99:
+				separation /= 2.0
+		starts.append([round(float(v), 3) for v in start])
+
+		human_goals = []
+		goal_dist = min(min_goal_dist, np.linalg.norm(up - low)/2.0)
+		for _ in range(num_goals):
+			for tries in range(max_tries):
+				goal = rng.uniform(low, up)
+				if np.linalg.norm(goal - start) >= goal_dist:
+					break
+			human_goals.append([round(float(v), 3) for v in goal])
+		goals.append(human_goals)
+
+	return starts, goals
+
+def human_color(human_idx, num_humans):
+	"""
+	Evenly spread hues so every human gets a distinct color.
+	"""
+	return [round(c, 3) for c in colorsys.hsv_to_rgb(human_idx/max(num_humans, 1), 0.9, 0.9)]
+
+def make_scenario_config(num_humans, seed=0, base_config=None, num_goals=1):
+	"""
+	Returns the params dict of a scenario with num_humans humans, built on
+	top of the base config (config/pedestrian_pred.yaml by default).
+	"""
+	config = base_config if base_config is not None else load_config()
+	config = yaml.safe_load(yaml.safe_dump(config))
+
+	pred = config["pred"]
+	for key in list(pred.keys()):
+		if key.startswith("human") and key[5:6].isdigit():
+			del pred[key]
+
+	starts, goals = sample_scenario(num_humans, config["state"]["lower"],
+		config["state"]["upper"], seed=seed, num_goals=num_goals)
+
+	pred["total_number_of_humans"] = num_humans
+	pred["num_humans"] = num_humans
+	for ii in range(num_humans):
+		prefix = "human"+str(ii+1)
+		pred[prefix+"_real_start"] = starts[ii]
+		pred[prefix+"_real_goals"] = goals[ii]
+		pred[prefix+"_color"] = human_color(ii, num_humans)
+
+	return config
+
+def write_scenario_yaml(config, path):
+	with open(path, "w") as f:
+		yaml.safe_dump(config, f, default_flow_style=None)
+
+def write_scenario_launch(yaml_path, num_humans, path, beta="adaptive", sim_time=False,
+		duration=0.0, predict=True, merge=True):
+	"""
+	Writes a launch file running the crowd sim for all humans, a predictor
+	per human (in the humanN namespace, like simulated_demo.launch) and the
+	multi-human merger.
+	"""
+	lines = ['<?xml version="1.0"?>', '<launch>',
+		'\t<param name="/use_sim_time" value="%s" />' % str(bool(sim_time)).lower(),
+		'\t<rosparam command="load" file="%s" />' % yaml_path,
+		'',
+		'\t<node name="crowd_sim" pkg="crazyflie_human" type="crowd_sim.py" output="log" required="true">',
+		'\t\t<param name="num_humans" value="%d" />' % num_humans,
+		'\t\t<param name="duration" value="%f" />' % duration,
+		'\t</node>']
+
+	if merge:
+		lines += ['\t<node name="multi_human_prediction" pkg="crazyflie_human" type="multi_human_pred.py" output="log" />']
+
+	if predict:
+		for ii in range(1, num_humans+1):
+			lines += ['',
+				'\t<group ns="human%d">' % ii,
+				'\t\t<rosparam command="load" file="%s" />' % yaml_path,
+				'\t\t<param name="human_number" value="%d" />' % ii,
+				'\t\t<param name="beta" value="%s" />' % beta,
+				'\t\t<node name="human_prediction%d" pkg="crazyflie_human" type="human_pred.py" output="log" />' % ii,
+				'\t</group>']
+
+	lines += ['</launch>', '']
+	with open(path, "w") as f:
+		f.write("\n".join(lines))
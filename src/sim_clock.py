@@ -0,0 +1,129 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import time
+import rospy
+from rosgraph_msgs.msg import Clock
+from std_msgs.msg import Time
+
+"""
+Simulation time owned by a simulator node. When /use_sim_time is set, the
+simulator advances time itself, publishes it on /clock and runs as fast as
+the prediction nodes can consume its poses, so a run takes as long as the
+computation needs and replays identically every time.
+"""
+
+def use_sim_time():
+	return rospy.get_param("/use_sim_time", False)
+
+def progress_topic(human_number):
+	"""
+	Topic on which the predictor of a human reports the stamp of the last
+	pose it finished processing.
+	"""
+	return '/human_pred_progress'+str(human_number)
+
+def progress_publisher(human_number):
+	return rospy.Publisher(progress_topic(human_number), Time, queue_size=1)
+
+class SimClock(object):
+	"""
+	Steps simulated time by dt. Before letting time run more than max_lag
+	seconds ahead of the slowest predictor it waits for them to catch up,
+	which bounds their queues so no pose is ever dropped.
+	"""
+
+	def __init__(self, dt, real_time_factor=0.0, human_numbers=[], max_lag=0.2,
+			ack_timeout=5.0, start_time=1.0):
+		"""
+			- real_time_factor: sim seconds per wall second, <= 0 runs as fast
+					as the predictors allow
+			- human_numbers: humans whose predictors to wait for
+			- ack_timeout: wall seconds to wait for a silent predictor before
+					assuming it is not running
+		"""
+		self.dt = dt
+		self.real_time_factor = real_time_factor
+		self.max_lag = max_lag
+		self.ack_timeout = ack_timeout
+
+		self.now = rospy.Time.from_sec(start_time)
+		self.step_duration = rospy.Duration.from_sec(dt)
+		self.wall_start = time.time()
+		self.sim_start = start_time
+
+		self.clock_pub = rospy.Publisher('/clock', Clock, queue_size=1)
+
+		# human number -> stamp of the last pose its predictor processed,
+		# predictors that went silent are ignored until they report again
+		self.progress = {}
+		self.waiting_for = set(str(h) for h in human_numbers)
+		self.ignored = set()
+		for h in self.waiting_for:
+			rospy.Subscriber(progress_topic(h), Time,
+				lambda msg, h=h: self.progress_callback(h, msg), queue_size=10)
+
+		self.publish()
+
+	def progress_callback(self, human_number, msg):
+		self.progress[human_number] = msg.data
+		self.ignored.discard(human_number)
+
+	def publish(self):
+		self.clock_pub.publish(Clock(clock=self.now))
+
+	def slowest_progress(self):
+		"""
+		Stamp of the predictor furthest behind, None if we wait for nobody.
+		"""
+		start = rospy.Time.from_sec(self.sim_start)
+		stamps = [self.progress.get(h, start) for h in self.waiting_for - self.ignored]
+		return min(stamps) if stamps else None
+
+	def tick(self):
+		"""
+		Advances (and publishes) the simulated time by one step and returns it.
+		"""
+		self.wait_for_predictors()
+
+		if self.real_time_factor > 0:
+			# pace the simulation against the wall clock
+			wall_target = self.wall_start + (self.now.to_sec() + self.dt - self.sim_start)/self.real_time_factor
+			delay = wall_target - time.time()
+			if delay > 0:
+				time.sleep(delay)
+
+		self.now = self.now + self.step_duration
+		self.publish()
+		return self.now
+
+	def wait_for_predictors(self):
+		"""
+		Blocks while the slowest predictor is more than max_lag behind.
+		"""
+		lag_limit = self.now - rospy.Duration.from_sec(self.max_lag)
+		wall_deadline = time.time() + self.ack_timeout
+
+		while not rospy.is_shutdown():
+			slowest = self.slowest_progress()
+			if slowest is None or slowest >= lag_limit:
+				return
+			if time.time() > wall_deadline:
+				start = rospy.Time.from_sec(self.sim_start)
+				stalled = [h for h in self.waiting_for - self.ignored
+					if self.progress.get(h, start) < lag_limit]
+				rospy.logwarn("sim_clock: no progress from predictors %s, not waiting for them", stalled)
+				self.ignored.update(stalled)
+				return
+			time.sleep(0.0005)
+
+def wait_for_subscribers(pubs, timeout=10.0):
+	"""
+	Waits (wall time) until every publisher has a subscriber, so no pose is
+	published before the predictors listen. Returns False on timeout.
+	"""
+	deadline = time.time() + timeout
+	while not rospy.is_shutdown() and time.time() < deadline:
+		if all(pub.get_num_connections() > 0 for pub in pubs):
+			return True
+		time.sleep(0.01)
+	return False
@@ -0,0 +1,85 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import numpy as np
+
+"""
+Uniform-grid spatial hash for neighbor queries between humans and robots.
+Rebuilding it is a sort of the points by cell, and a radius query only looks
+at the 3 x 3 cells around each query point, so finding all close pairs costs
+about O(N) instead of the O(N^2) of checking every pair.
+"""
+
+# Offset making cell coordinates non-negative before they are packed into
+# one int64 key, covers +-1e9 cells in x and y.
+CELL_OFFSET = 2**30
+
+class SpatialHash(object):
+	"""
+	Hashes (N x 2) points into square cells of side cell_size. Queries with a
+	radius up to cell_size are exact.
+	"""
+
+	def __init__(self, cell_size, points=None):
+		self.cell_size = cell_size
+		self.build(np.zeros((0, 2)) if points is None else points)
+
+	def cell_keys(self, cells):
+		return (cells[:, 0] + CELL_OFFSET)*(2*CELL_OFFSET) + (cells[:, 1] + CELL_OFFSET)
+
+	def build(self, points):
+		"""
+		(Re)hashes the points, call it whenever they move.
+		"""
+		self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+		keys = self.cell_keys(np.floor(self.points/self.cell_size).astype(np.int64))
+
+		# points sorted by cell, and where each occupied cell starts
+		self.order = np.argsort(keys, kind="mergesort")
+		self.keys, self.starts, self.counts = np.unique(keys[self.order],
+			return_index=True, return_counts=True)
+
+	def query_pairs(self, queries, radius):
+		"""
+		All (query, point) pairs closer than radius (<= cell_size). Returns
+		the query indices, point indices, offsets (point - query) and
+		distances of the pairs.
+		"""
+		queries = np.asarray(queries, dtype=float).reshape(-1, 2)
+		assert radius <= self.cell_size, "radius larger than the hash cells"
+		if len(queries) == 0 or len(self.points) == 0:
+			return (np.zeros(0, dtype=int), np.zeros(0, dtype=int),
+				np.zeros((0, 2)), np.zeros(0))
+
+		query_cells = np.floor(queries/self.cell_size).astype(np.int64)
+		query_idx = []
+		point_idx = []
+		for dx in (-1, 0, 1):
+			for dy in (-1, 0, 1):
+				keys = self.cell_keys(query_cells + [dx, dy])
+				slot = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+				hit = np.nonzero(self.keys[slot] == keys)[0]
+				counts = self.counts[slot[hit]]
+
+				# expand every hit cell into its points
+				total = counts.sum()
+				within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+				query_idx.append(np.repeat(hit, counts))
+				point_idx.append(self.order[np.repeat(self.starts[slot[hit]], counts) + within])
+
+		query_idx = np.concatenate(query_idx)
+		point_idx = np.concatenate(point_idx)
+		diff = self.points[point_idx] - queries[query_idx]
+		dist = np.sqrt((diff**2).sum(axis=1))
+		close = dist <= radius
+		return query_idx[close], point_idx[close], diff[close], dist[close]
+
+	def nearest_within(self, queries, radius):
+		"""
+		Distance from every query to its nearest point, inf if none is
+		within radius. Handy for online human-robot proximity metrics.
+		"""
+		queries = np.asarray(queries, dtype=float).reshape(-1, 2)
+		nearest = np.full(len(queries), np.inf)
+		query_idx, _, _, dist = self.query_pairs(queries, radius)
+		np.minimum.at(nearest, query_idx, dist)
+		return nearest
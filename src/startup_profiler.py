@@ -0,0 +1,76 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import time
+import threading
+import contextlib
+
+"""
+Times the startup phases of a node (imports, parameter load, gridworld
+build, first inference, ...) relative to when its process started, so the
+time to the first prediction can be broken down and reported.
+"""
+
+def process_start_time():
+	"""
+	Wall time (s) the current process started at, read from /proc so it
+	includes the interpreter startup and every import. The process age is
+	taken against the uptime rather than the boot time in /proc/stat, which
+	is whole seconds and drifts with clock adjustments. Falls back to now
+	where /proc is not available.
+	"""
+	try:
+		with open("/proc/self/stat") as f:
+			start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+		with open("/proc/uptime") as f:
+			uptime = float(f.read().split()[0])
+		return time.time() - (uptime - start_ticks/os.sysconf("SC_CLK_TCK"))
+	except (IOError, OSError, IndexError, ValueError):
+		return time.time()
+
+class StartupProfiler(object):
+	"""
+	Durations of named startup phases. Phases may run on other threads
+	(e.g. a background warm-up), so adding them is thread-safe.
+	"""
+
+	def __init__(self, name, start=None):
+		self.name = name
+		self.start = process_start_time() if start is None else start
+		self.phases = []
+		self.lock = threading.Lock()
+
+	def add(self, phase, duration, ended=None):
+		"""
+		Records a phase that took duration (s) and ended at wall time ended
+		(default now).
+		"""
+		ended = time.time() if ended is None else ended
+		with self.lock:
+			self.phases.append((phase, duration, ended - self.start))
+
+	@contextlib.contextmanager
+	def phase(self, phase):
+		"""
+		Times the body of a with statement as one phase.
+		"""
+		began = time.time()
+		try:
+			yield
+		finally:
+			self.add(phase, time.time() - began)
+
+	def since_start(self):
+		return time.time() - self.start
+
+	def report(self):
+		"""
+		One line per phase: its duration and when it ended after the process
+		started.
+		"""
+		with self.lock:
+			phases = list(self.phases)
+		lines = ["----- Startup of %s -----" % self.name]
+		for phase, duration, ended in phases:
+			lines.append("	- %-22s %8.1f ms  (done at %.2f s)" % (phase, duration*1e3, ended))
+		return "\n".join(lines)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import os
+import numpy as np
+
+"""
+Precomputed potential fields over the experimental space. Goals and static
+obstacles never move, so their gradients are sampled once on a grid and
+looked up with bilinear interpolation, making the cost of a simulation step
+independent of how many goals and obstacles there are. Static obstacles
+(furniture, walls) can be read from a map image.
+"""
+
+class GridField(object):
+	"""
+	One or more layers of C-channel values sampled on a regular grid.
+	values is (L x H x W x C): cell [l, row, col] is at
+	lower + res*[col, row] (x along the columns, y along the rows).
+	Lookups outside the grid use the values on its edge.
+	"""
+
+	def __init__(self, values, lower, res):
+		values = np.asarray(values, dtype=float)
+		if values.ndim == 3:
+			values = values[None]
+		self.values = values
+		self.lower = np.array(lower[:2], dtype=float)
+		self.res = res
+
+	def lookup(self, points, layers=None):
+		"""
+		Bilinearly interpolated values (M x C) at the (M x 2) points, on the
+		given layer of every point (layer 0 for all if None).
+		"""
+		points = np.asarray(points, dtype=float).reshape(-1, 2)
+		height, width = self.values.shape[1:3]
+		layers = np.zeros(len(points), dtype=int) if layers is None else np.asarray(layers).ravel()
+
+		coords = (points - self.lower)/self.res
+		cols = np.clip(coords[:, 0], 0, width - 1)
+		rows = np.clip(coords[:, 1], 0, height - 1)
+		c0 = np.minimum(cols.astype(int), max(width - 2, 0))
+		r0 = np.minimum(rows.astype(int), max(height - 2, 0))
+		c1 = np.minimum(c0 + 1, width - 1)
+		r1 = np.minimum(r0 + 1, height - 1)
+		fc = (cols - c0)[:, None]
+		fr = (rows - r0)[:, None]
+
+		v = self.values
+		return ((1 - fr)*((1 - fc)*v[layers, r0, c0] + fc*v[layers, r0, c1]) +
+			fr*((1 - fc)*v[layers, r1, c0] + fc*v[layers, r1, c1]))
+
+def grid_points(lower, upper, res, margin=0.0):
+	"""
+	Returns (lower corner, H x W x 2 cell positions) of a grid covering
+	[lower - margin, upper + margin] in x, y.
+	"""
+	low = np.array(lower[:2], dtype=float) - margin
+	up = np.array(upper[:2], dtype=float) + margin
+	width = int(np.ceil((up[0] - low[0])/res)) + 1
+	height = int(np.ceil((up[1] - low[1])/res)) + 1
+	xs = low[0] + res*np.arange(width)
+	ys = low[1] + res*np.arange(height)
+	grid_x, grid_y = np.meshgrid(xs, ys)
+	return low, np.dstack([grid_x, grid_y])
+
+def goal_field(goals, lower, upper, res, alpha, goal_s, goal_r, margin=1.0):
+	"""
+	Attractive gradient of every goal (G x 2) sampled on the grid, one
+	layer per goal. Same field as PotentialFieldHuman: zero inside the goal,
+	proportional to the distance within the spread, maximal outside of it.
+	Without goals the field is a single layer of zeros.
+	"""
+	low, points = grid_points(lower, upper, res, margin)
+	goals = np.asarray(goals, dtype=float).reshape(-1, 2)
+	if len(goals) == 0:
+		return GridField(np.zeros((1,) + points.shape), low, res)
+
+	diff = goals[:, None, None, :] - points[None]
+	dist = np.linalg.norm(diff, axis=3)
+	unit = diff/np.maximum(dist, 1e-12)[..., None]
+	mag = np.where(dist < goal_r, 0.0,
+		np.where(dist <= goal_r + goal_s, alpha*(dist - goal_r), alpha*goal_s))
+
+	return GridField(mag[..., None]*unit, low, res)
+
+def nearest_cells(targets, points, max_pairs=2**22):
+	"""
+	For every point (M x 2), the offset (M x 2) to the nearest target (K x 2).
+	Brute force in chunks, only used once when the field is built.
+	"""
+	offsets = np.zeros_like(points)
+	chunk = max(1, max_pairs//max(len(targets), 1))
+	for start in range(0, len(points), chunk):
+		diff = targets[None, :, :] - points[start:start+chunk, None, :]
+		nearest = (diff**2).sum(axis=2).argmin(axis=1)
+		offsets[start:start+chunk] = diff[np.arange(len(nearest)), nearest]
+	return offsets
+
+def boundary(mask):
+	"""
+	Cells of the mask with at least one 4-neighbour outside of it.
+	"""
+	padded = np.pad(mask, 1, mode="edge")
+	inner = padded[:-2, 1:-1] & padded[2:, 1:-1] & padded[1:-1, :-2] & padded[1:-1, 2:]
+	return mask & ~inner
+
+def obstacle_field(occupied, lower, res, beta, obstacle_s):
+	"""
+	Repulsive gradient of the static obstacles, given as a boolean (H x W)
+	occupancy grid with cell [row, col] at lower + res*[col, row]. The
+	gradient points away from the nearest obstacle and grows from zero (at
+	obstacle_s from its surface) to beta*obstacle_s (at the surface), and
+	keeps growing inside obstacles, pushing humans out along the shortest way.
+	Returns a GridField with channels (signed distance, grad x, grad y).
+	"""
+	occupied = np.asarray(occupied, dtype=bool)
+	low = np.array(lower[:2], dtype=float)
+	height, width = occupied.shape
+	values = np.zeros((height, width, 3))
+	values[..., 0] = np.inf
+
+	if occupied.any() and not occupied.all():
+		rows, cols = np.mgrid[0:height, 0:width]
+		points = res*np.dstack([cols, rows]).astype(float)
+
+		# free cells: distance to the nearest obstacle surface, pushed away from it
+		free = ~occupied
+		away = -nearest_cells(points[boundary(occupied)], points[free])
+		dist = np.linalg.norm(away, axis=1)
+		mag = np.where(dist <= obstacle_s, beta*(obstacle_s - dist), 0.0)
+		values[free, 0] = dist
+		values[free, 1:] = (mag/np.maximum(dist, 1e-12))[:, None]*away
+
+		# occupied cells: (negative) depth, pushed towards the nearest free cell
+		out = nearest_cells(points[boundary(free)], points[occupied])
+		depth = np.linalg.norm(out, axis=1)
+		values[occupied, 0] = -depth
+		values[occupied, 1:] = (beta*(obstacle_s + depth)/np.maximum(depth, 1e-12))[:, None]*out
+
+	return GridField(values, low, res)
+
+def occupancy_from_image(image_path, lower, upper, res, occupied_thresh=0.2,
+		pixel_scale=None, margin=1.0):
+	"""
+	Occupancy grid (same grid as grid_points) of a map image, placed in the
+	world the same way the background image marker is: centered on the
+	origin, pixel_scale m per pixel. Pixels darker than occupied_thresh
+	(and not transparent) are obstacles.
+	"""
+	import matplotlib.image as mpimg
+	import bg_image_utils
+
+	pixel_scale = pixel_scale or bg_image_utils.PIXEL_SCALE
+	image = mpimg.imread(image_path)
+	if np.issubdtype(image.dtype, np.integer):
+		image = image/255.0
+	if image.ndim == 2:
+		image = image[..., None]
+	img_height, img_width = image.shape[:2]
+
+	dark = image[..., :3].mean(axis=2) < occupied_thresh
+	if image.shape[2] == 4:
+		dark &= image[..., 3] > 0.5
+
+	low, points = grid_points(lower, upper, res, margin)
+	cols = np.round(points[..., 0]/pixel_scale + img_width/2.0).astype(int)
+	rows = np.round(img_height/2.0 - points[..., 1]/pixel_scale).astype(int)
+	inside = (rows >= 0) & (rows < img_height) & (cols >= 0) & (cols < img_width)
+
+	occupied = np.zeros(points.shape[:2], dtype=bool)
+	occupied[inside] = dark[rows[inside], cols[inside]]
+	return low, occupied
+
+def load_map_obstacles(image_path, lower, upper, res, beta, obstacle_s, occupied_thresh=0.2):
+	"""
+	Static obstacle field of a map image. Relative paths are relative to
+	the package.
+	"""
+	if not os.path.isabs(image_path):
+		image_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", image_path)
+	low, occupied = occupancy_from_image(image_path, lower, upper, res, occupied_thresh)
+	return obstacle_field(occupied, low, res, beta, obstacle_s)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python2.7
+import rospy
+
+class LatchedMarkerPublisher(object):
+	"""
+	Publishes a static visualization message (e.g. goal, start or world
+	markers) once on a latched topic. Late subscribers (like RVIZ) still get
+	the last message, so it is only republished when one of the ROS params
+	it is built from changes.
+	"""
+
+	def __init__(self, topic, msg_type, make_msg, param_names, check_period=1.0):
+		"""
+			- make_msg: function taking the current value of each param in
+						param_names (None if unset) and returning the message
+			- check_period: seconds between param change checks, <= 0 disables
+		"""
+		self.make_msg = make_msg
+		self.param_names = param_names
+		self.param_values = None
+
+		self.pub = rospy.Publisher(topic, msg_type, queue_size=1, latch=True)
+		self.check_params()
+
+		self.timer = None
+		if check_period > 0:
+			self.timer = rospy.Timer(rospy.Duration(check_period), self.check_params)
+
+	def current_params(self):
+		"""
+		Reads the params from the local cache, which the master keeps up to date,
+		so checking for changes does not cost a round trip.
+		"""
+		values = []
+		for name in self.param_names:
+			try:
+				values.append(rospy.get_param_cached(name))
+			except KeyError:
+				values.append(None)
+		return values
+
+	def check_params(self, event=None):
+		"""
+		(Re)publishes the message if any of its params changed.
+		"""
+		values = self.current_params()
+		if values != self.param_values:
+			self.param_values = values
+			self.pub.publish(self.make_msg(*values))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python2.7
+from __future__ import division
+import numpy as np
+
+class ConstantVelocityFilter(object):
+	"""
+	Kalman filter of a point moving in the plane with (nearly) constant
+	velocity. The state is [x, y, vx, vy] and only the position is measured.
+	Used to get a smoothed position and speed out of jittery mocap poses.
+	"""
+
+	def __init__(self, accel_std=2.0, meas_std=0.02, max_gap=1.0):
+		"""
+			- accel_std: std dev of the unmodeled acceleration (m/s^2)
+			- meas_std: std dev of the position measurements (m)
+			- max_gap: if no measurement arrives for this long (s), the
+						filter restarts from the next measurement
+		"""
+		self.accel_var = accel_std**2
+		self.meas_var = meas_std**2
+		self.max_gap = max_gap
+		self.reset()
+
+	def reset(self):
+		"""
+		Forgets everything, the next measurement re-initializes the filter.
+		"""
+		self.x = None
+		self.P = None
+		self.t = None
+
+	def predict(self, dt):
+		"""
+		Propagates the state dt seconds forward.
+		"""
+		F = np.eye(4)
+		F[0, 2] = F[1, 3] = dt
+
+		# white-noise acceleration process noise
+		q = self.accel_var
+		Q = np.zeros((4, 4))
+		Q[0, 0] = Q[1, 1] = q*dt**4/4.0
+		Q[0, 2] = Q[2, 0] = Q[1, 3] = Q[3, 1] = q*dt**3/2.0
+		Q[2, 2] = Q[3, 3] = q*dt**2
+
+		self.x = F.dot(self.x)
+		self.P = F.dot(self.P).dot(F.T) + Q
+
+	def update(self, xy, t):
+		"""
+		Fuses the position measurement xy taken at time t (seconds).
+		Returns the filtered [x, y, vx, vy] state.
+		"""
+		z = np.array(xy[:2], dtype=float)
+
+		if self.x is None or t - self.t > self.max_gap:
+			# start at the measurement, not moving, with a loose velocity
+			self.x = np.array([z[0], z[1], 0.0, 0.0])
+			self.P = np.diag([self.meas_var, self.meas_var, 1.0, 1.0])
+			self.t = t
+			return self.x
+
+		dt = t - self.t
+		if dt > 0:
+			self.predict(dt)
+			self.t = t
+
+		# measurement update, H = [I 0]
+		S = self.P[:2, :2] + self.meas_var*np.eye(2)
+		K = self.P[:, :2].dot(np.linalg.inv(S))
+		self.x = self.x + K.dot(z - self.x[:2])
+		self.P = (np.eye(4) - K.dot(np.hstack([np.eye(2), np.zeros((2, 2))]))).dot(self.P)
+
+		return self.x
+
+	def position(self):
+		return None if self.x is None else self.x[:2]
+
+	def velocity(self):
+		return None if self.x is None else self.x[2:]
+
+	def speed(self):
+		"""
+		Filtered speed (m/s), 0 before the first measurement.
+		"""
+		return 0.0 if self.x is None else float(np.linalg.norm(self.x[2:]))
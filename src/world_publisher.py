@@ -9,20 +9,19 @@ import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
 import numpy as np
 
+import static_markers
+
 """
-Displays an image pixel by pixel by creating a CubeList.
+Displays the bounds of the experimental space as a cube.
 """
 
-if __name__ == '__main__':
-	rospy.init_node('world_publisher')
-
-	# Setup the image publisher.
-	pub_topic = '/world_marker'
-	pose_pub = rospy.Publisher(pub_topic, Marker, queue_size=1)
-
+def make_world_marker(lower, upper):
+	"""
+	Makes a translucent cube spanning the experimental space.
+	"""
 	# get real-world measurements of experimental space
-	lower = [-2.0, -1.04, 0] 
-	upper = [1.66, 2.62, 2.0] 
+	lower = lower or [-2.0, -1.04, 0] 
+	upper = upper or [1.66, 2.62, 2.0] 
 	height = upper[1] - lower[1]
 	width = upper[0] - lower[0]
 
@@ -33,7 +32,6 @@ if __name__ == '__main__':
 	marker.type = marker.CUBE
 	marker.action = marker.ADD
 	marker.pose.orientation.w = 1
-	marker.pose.position.z = 1.0
 	marker.scale.x = width
 	marker.scale.y = height
 	marker.scale.z = 2.0
@@ -46,8 +44,15 @@ if __name__ == '__main__':
 	marker.pose.position.y = upper[1] - height/2.0
 	marker.pose.position.z = 1.0
 
-	# Publish the background image at 10 Hz
-	rate = rospy.Rate(10.0)
-	while not rospy.is_shutdown():
-		pose_pub.publish(marker)
-		rate.sleep()
+	return marker
+
+if __name__ == '__main__':
+	rospy.init_node('world_publisher')
+
+	# Publish the world marker once on a latched topic, and again only if
+	# the bounds of the experimental space change.
+	pub_topic = '/world_marker'
+	world_pub = static_markers.LatchedMarkerPublisher(pub_topic, Marker, 
+		make_world_marker, ["state/lower", "state/upper"])
+
+	rospy.spin()